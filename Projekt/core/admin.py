@@ -1,5 +1,83 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR, PAGE_VAR
 from .models import Profile, Tweet, Hashtag, Comment, Like, Follow, Notification
+from .pagination import EstimatedCountPaginator, InvalidCursor, keyset_page
+from . import export
+
+# Parametr changelistu s kurzorem dalsi stranky (stejny jako v API)
+CURSOR_VAR = 'before'
+
+
+def _export_action(format, gzip=False):
+    def action(modeladmin, request, queryset):
+        name = export.dataset_name(queryset.model)
+        return export.response([(name, export.DATASETS[name], queryset)], format, gzip, filename=name)
+    action.__name__ = f'export_{format}' + ('_gzip' if gzip else '')
+    action.short_description = f'Exportovat vybrané ({format.upper()}' + (', gzip)' if gzip else ')')
+    return action
+
+
+EXPORT_ACTIONS = [_export_action('ndjson'), _export_action('csv'), _export_action('ndjson', gzip=True)]
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist, který při výchozím řazení stránkuje kurzorem (created_at, id) místo OFFSET.
+
+    Další stránka je ?before=<kurzor>, takže i hluboké stránky stojí jeden dotaz po indexu.
+    Po kliknutí na sloupec (jiné řazení) se stránkuje klasicky po číslech stránek.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+        # odkazy na razeni a filtry zacinaji znovu od prvni stranky
+        self.params.pop(CURSOR_VAR, None)
+
+    @property
+    def cursor_mode(self):
+        return ORDER_VAR not in self.params and not self.show_all
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        if not self.cursor_mode:
+            return super().get_results(request)
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        try:
+            self.result_list, self.next_cursor = keyset_page(self.queryset, self.cursor, self.list_per_page)
+        except InvalidCursor:
+            raise IncorrectLookupParameters
+        self.result_count = paginator.count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = self.root_queryset.count() if self.show_full_result_count else None
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+        self.paginator = paginator
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[PAGE_VAR])
+
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}, [PAGE_VAR]) if self.next_cursor else None
+
+
+class LargeTableAdminMixin:
+    """
+    Changelist pro velké tabulky: odhadnutý počet řádků, bez druhého COUNT přes celou
+    tabulku a stránkování kurzorem (KeysetChangeList). Šablona je admin/core/pagination.html.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -9,22 +87,21 @@ class ProfileAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
 
 @admin.register(Tweet)
-class TweetAdmin(admin.ModelAdmin):
+class TweetAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    actions = EXPORT_ACTIONS
+    # likes_count a comments_count jsou ulozene citace, ne COUNT na radek
     list_display = ('author', 'content_preview', 'created_at', 'likes_count', 'comments_count')
+    list_select_related = ('author',)
     search_fields = ('author__username', 'content')
     list_filter = ('created_at',)
-    date_hierarchy = 'created_at'
     
     def content_preview(self, obj):
         return obj.content[:50] + ('...' if len(obj.content) > 50 else '')
     content_preview.short_description = 'Content'
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related('author')
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
+    actions = EXPORT_ACTIONS
     list_display = ('author', 'content_preview', 'tweet', 'created_at')
     search_fields = ('author__username', 'content', 'tweet__content')
     list_filter = ('created_at',)
@@ -39,10 +116,10 @@ class CommentAdmin(admin.ModelAdmin):
         return qs.select_related('author', 'tweet')
 
 @admin.register(Like)
-class LikeAdmin(admin.ModelAdmin):
+class LikeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'content_type', 'content_owner', 'content_preview', 'created_at')
+    list_select_related = ('user', 'tweet__author', 'comment__author')
     list_filter = ('created_at',)
-    date_hierarchy = 'created_at'
     
     def content_type(self, obj):
         return 'Tweet' if obj.tweet else 'Comment'
@@ -57,15 +134,12 @@ class LikeAdmin(admin.ModelAdmin):
     def content_preview(self, obj):
         if obj.tweet:
             return obj.tweet.content[:50] + ('...' if len(obj.tweet.content) > 50 else '')
-        return obj.comment.content[:50] + ('...' if len(obj.content) > 50 else '')
+        return obj.comment.content[:50] + ('...' if len(obj.comment.content) > 50 else '')
     content_preview.short_description = 'Content'
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related('user', 'tweet', 'comment')
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
+    actions = EXPORT_ACTIONS
     list_display = ('follower', 'following', 'created_at')
     search_fields = ('follower__username', 'following__username')
     list_filter = ('created_at',)
@@ -1,14 +1,24 @@
-from typing import List
-from ninja import NinjaAPI, Schema
-from ninja.errors import HttpError
+import os
+from typing import Dict, List, Literal, Optional
+from ninja import NinjaAPI, Router, Schema, Query
+from ninja.decorators import decorate_view
+from ninja.errors import HttpError, ValidationError
+from ninja.pagination import paginate
 from django.contrib.auth.models import User
 from django.contrib.auth import login as django_login, logout as django_logout
-from .models import Tweet, Comment, Hashtag, Profile, Like, Notification
-from django.shortcuts import get_object_or_404
+from .models import Tweet, Comment, Hashtag, Profile, Notification
+from django.shortcuts import get_object_or_404, aget_object_or_404
 from django.http import JsonResponse
+from .pagination import CursorPagination
+from . import batch, cache, export, graph, http, metrics, tasks, toggles, trending
+from . import notifications as notification_store
+from . import search as search_index
 
 api = NinjaAPI(csrf=True)
 
+# Synchronni varianty hlavnich cteni (/api/sync/...) pro WSGI a srovnani s async
+sync = Router(tags=["sync"])
+
 class ProfileSchema(Schema):
     username: str
     bio: str
@@ -38,16 +48,22 @@ class TweetSchema(Schema):
     created_at: str
     likes_count: int
     comments_count: int
+    liked_by_me: bool = False
 
     @staticmethod
     def resolve_author(obj: Tweet):
-        user = User.objects.get(id=obj.author.id)
-        return Profile.objects.get(user=user)
+        # profil je nacteny pres select_related('author__profile')
+        return obj.author.profile
 
     @staticmethod
     def resolve_created_at(obj: Tweet):
         return obj.created_at.isoformat()
 
+    @staticmethod
+    def resolve_liked_by_me(obj: Tweet):
+        # anotace z TweetQuerySet.with_liked_by
+        return getattr(obj, 'liked_by_me', False)
+
 
 class CommentSchema(Schema):
     id: int
@@ -58,12 +74,7 @@ class CommentSchema(Schema):
 
     @staticmethod
     def resolve_author(obj: Comment):
-        user = User.objects.get(id=obj.author.id)
-        return Profile.objects.get(user=user)
-
-    @staticmethod
-    def resolve_tweet_id(obj: Comment):
-        return obj.tweet.id
+        return obj.author.profile
 
     @staticmethod
     def resolve_created_at(obj: Comment):
@@ -74,16 +85,43 @@ class HashtagSchema(Schema):
     name: str
     tweets_count: int
 
+class TrendingHashtagSchema(HashtagSchema):
+    score: float
+
 class TweetInSchema(Schema):
     content: str
 
 class CommentInSchema(Schema):
     content: str
 
+class LikeBatchSchema(Schema):
+    like: List[int] = []
+    unlike: List[int] = []
+
+class LikeBatchResultSchema(Schema):
+    likes_count: Dict[int, int]
+
+class FollowBatchSchema(Schema):
+    follow: List[str] = []
+    unfollow: List[str] = []
+
+class FollowBatchResultSchema(Schema):
+    following: List[str]
+
+class RecommendationSchema(Schema):
+    user: ProfileSchema
+    followed_by_count: int
+
 class LoginSchema(Schema):
     username: str
     password: str
 
+class SearchResultsSchema(Schema):
+    tweets: List[TweetSchema] = []
+    users: List[ProfileSchema] = []
+    hashtags: List[HashtagSchema] = []
+    next_offset: Optional[int] = None
+
 @api.get("/auth", auth=None)
 def auth(request):
     if request.user.is_authenticated:
@@ -107,18 +145,45 @@ def logout(request):
 
 # Tweets
 @api.get("/tweets", response=List[TweetSchema])
-def list_tweets(request):
+@paginate(CursorPagination)
+async def list_tweets(request):
     """
-    Returns a list of all tweets.
+    Returns a page of tweets, newest first. Use ?before=<next> for the following page.
+    """
+    return Tweet.objects.for_display().with_liked_by(await request.auser())
+
+@api.post("/tweets/import")
+def import_tweets(request):
     """
-    return Tweet.objects.all()
+    Imports tweets from an NDJSON body, one {"author", "content", "created_at"} object per line. Staff only.
+
+    The whole body is validated first, an invalid line means nothing is imported.
+    A valid body is imported in the background, the response is 202 with the number of queued tweets.
+    """
+    if not request.user.is_staff:
+        raise HttpError(403, "Staff only")
+    # telo se cte po radcich a odklada na disk, validace ani import ho nenacitaji do pameti
+    spool = batch.import_spool()
+    try:
+        with spool:
+            def lines():
+                for line in request:
+                    spool.write(line)
+                    yield line
+            count, authors = batch.validate_import(lines())
+    except batch.BatchError as e:
+        os.remove(spool.name)
+        raise ValidationError(e.errors)
+    tasks.enqueue('tweets.import', path=spool.name, author_ids=authors)
+    return JsonResponse({"queued": count}, status=202)
 
 @api.get("/tweets/{tweet_id}", response=TweetSchema)
-def get_tweet(request, tweet_id: int):
+@decorate_view(http.conditional(http.tweet))
+async def get_tweet(request, tweet_id: int):
     """
     Returns a single tweet by its ID.
     """
-    return get_object_or_404(Tweet, id=tweet_id)
+    return await aget_object_or_404(Tweet.objects.for_display().with_liked_by(await request.auser()), id=tweet_id)
 
 @api.post("/tweets", response=TweetSchema)
 def create_tweet(request, payload: TweetInSchema):
@@ -146,12 +211,14 @@ def delete_tweet(request, tweet_id: int):
 
 # Comments
 @api.get("/tweets/{tweet_id}/comments", response=List[CommentSchema])
-def list_tweet_comments(request, tweet_id: int):
+@decorate_view(http.conditional(http.tweet_comments, http.PUBLIC, vary=None))
+async def list_tweet_comments(request, tweet_id: int):
     """
     Returns a list of comments for a specific tweet.
     """
-    tweet = get_object_or_404(Tweet, id=tweet_id)
-    return tweet.comments.all()
+    tweet = await aget_object_or_404(Tweet.objects.only('pk'), id=tweet_id)
+    # serializace bezi v event loopu, queryset se musi nacist uz tady
+    return [comment async for comment in tweet.comments.for_display()]
 
 @api.post("/tweets/{tweet_id}/comments", response=CommentSchema)
 def create_comment(request, tweet_id: int, payload: CommentInSchema):
@@ -185,12 +252,9 @@ def like_tweet_toggle(request, tweet_id: int):
     """
     if not request.user.is_authenticated:
         raise HttpError(401, "Not authenticated")
-    tweet = get_object_or_404(Tweet, id=tweet_id)
-    like = Like.objects.filter(user=request.user, tweet=tweet).first()
-    if like:
-        like.delete()
-    else:
-        Like.objects.create(user=request.user, tweet=tweet)
+    tweet = get_object_or_404(Tweet.objects.select_related('author__profile'), id=tweet_id)
+    # novy stav a pocet vraci primo DELETE/INSERT ... RETURNING, bez dalsiho cteni
+    tweet.liked_by_me, tweet.likes_count = toggles.toggle_like(request.user.pk, tweet_id=tweet.pk)
     return tweet
 
 @api.post("/comments/{comment_id}/like", response=CommentSchema)
@@ -200,45 +264,208 @@ def like_comment_toggle(request, comment_id: int):
     """
     if not request.user.is_authenticated:
         raise HttpError(401, "Not authenticated")
-    comment = get_object_or_404(Comment, id=comment_id)
-    like = Like.objects.filter(user=request.user, comment=comment).first()
-    if like:
-        like.delete()
-    else:
-        Like.objects.create(user=request.user, comment=comment)
+    comment = get_object_or_404(Comment.objects.for_display(), id=comment_id)
+    toggles.toggle_like(request.user.pk, comment_id=comment.pk)
     return comment
 
+@api.post("/likes/batch", response=LikeBatchResultSchema)
+def like_batch(request, payload: LikeBatchSchema):
+    """
+    Sets the like state of many tweets at once. Already applied changes are skipped.
+
+    Returns the new like counts of all tweets in the batch.
+    """
+    if not request.user.is_authenticated:
+        raise HttpError(401, "Not authenticated")
+    try:
+        return {"likes_count": batch.set_likes(request.user.pk, payload.like, payload.unlike)}
+    except batch.BatchError as e:
+        raise ValidationError(e.errors)
+
+@api.post("/follows/batch", response=FollowBatchResultSchema)
+def follow_batch(request, payload: FollowBatchSchema):
+    """
+    Follows and unfollows many users (by username) at once.
+
+    Returns which of the listed users are followed afterwards.
+    """
+    if not request.user.is_authenticated:
+        raise HttpError(401, "Not authenticated")
+    try:
+        following = batch.set_follows(request.user.pk, payload.follow, payload.unfollow)
+    except batch.BatchError as e:
+        raise ValidationError(e.errors)
+    return {"following": sorted(following)}
+
 # Users
 @api.get("/users/@{username}", response=ProfileSchema)
-def get_user_profile(request, username: str):
+@decorate_view(http.conditional(http.user_profile, http.PUBLIC, vary=None))
+async def get_user_profile(request, username: str):
     """
     Returns the profile for a specific user.
     """
-    user = get_object_or_404(User, username=username)
-    return get_object_or_404(Profile, user=user)
+    return await aget_object_or_404(Profile.objects.select_related('user'), user__username=username)
 
 @api.get("/users/me", response=ProfileSchema)
-def get_current_user_profile(request):
+@decorate_view(http.conditional(http.current_user_profile))
+async def get_current_user_profile(request):
     """
     Returns the profile of the currently authenticated user.
     """
+    user = await request.auser()
+    if not user.is_authenticated:
+        raise HttpError(401, "Not authenticated")
+    return await aget_object_or_404(Profile.objects.select_related('user'), user=user)
+
+@api.get("/users/me/export")
+def export_current_user(
+    request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    include: List[Literal["tweets", "comments", "likes", "follows", "notifications"]] = Query(None),
+):
+    """
+    Streams all data of the current user (or only the `include`d kinds) as NDJSON or CSV, optionally gzipped.
+    """
     if not request.user.is_authenticated:
         raise HttpError(401, "Not authenticated")
-    user = request.user
-    return get_object_or_404(Profile, user=user)
+    parts = export.user_parts(request.user.pk, include)
+    return export.response(parts, format, gzip, filename=f"{request.user.username}-export")
 
+@api.get("/users/me/recommendations", response=List[RecommendationSchema])
+def user_recommendations(request, limit: int = Query(graph.RECOMMENDATION_LIMIT, ge=1, le=50)):
+    """
+    Who to follow: users followed by the people the current user follows, most shared first.
+    """
+    if not request.user.is_authenticated:
+        raise HttpError(401, "Not authenticated")
+    ranked = graph.recommendations(request.user.pk, limit)
+    profiles = Profile.objects.select_related('user').in_bulk([user_id for user_id, _ in ranked], field_name='user_id')
+    return [
+        {"user": profiles[user_id], "followed_by_count": count}
+        for user_id, count in ranked if user_id in profiles
+    ]
 
 @api.get("/hashtags", response=List[HashtagSchema])
+@decorate_view(http.conditional(http.hashtags, http.PUBLIC, vary=None))
 def list_hashtags(request):
     """
     Returns a list of all hashtags.
     """
     return Hashtag.objects.all()
 
+@api.get("/hashtags/trending", response=List[TrendingHashtagSchema])
+def trending_hashtags(request, limit: int = Query(None, ge=1, le=100)):
+    """
+    Returns the currently trending hashtags ranked by time-decayed score.
+    """
+    return trending.top(limit)
+
 @api.get("/hashtags/{hashtag_name}", response=List[TweetSchema])
-def get_hashtag_tweets(request, hashtag_name: str):
+@paginate(CursorPagination)
+async def get_hashtag_tweets(request, hashtag_name: str):
+    """
+    Returns a page of tweets associated with a specific hashtag.
+    """
+    hashtag = await aget_object_or_404(Hashtag, name=hashtag_name)
+    return hashtag.tweets.for_display().with_liked_by(await request.auser())
+
+# Notifications
+@api.get("/notifications/unread_count")
+def unread_notifications_count(request):
+    """
+    Returns the number of unread notifications of the current user (cached).
     """
-    Returns tweets associated with a specific hashtag.
+    if not request.user.is_authenticated:
+        raise HttpError(401, "Not authenticated")
+    return {"count": notification_store.unread_count(request.user.pk)}
+
+# Search
+@api.get("/search", response=SearchResultsSchema)
+def search(
+    request,
+    q: str,
+    type: Literal["tweets", "users", "hashtags"] = "tweets",
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Full-text search ranked by relevance. Every term matches as a prefix.
+    """
+    ids = search_index.search_ids(type, q, limit + 1, offset)
+    next_offset = offset + limit if len(ids) > limit else None
+    ids = ids[:limit]
+    if type == "tweets":
+        tweets = Tweet.objects.for_display().with_liked_by(request.user)
+        return {"tweets": search_index.in_rank_order(tweets, ids), "next_offset": next_offset}
+    if type == "users":
+        profiles = Profile.objects.select_related('user')
+        return {"users": search_index.in_rank_order(profiles, ids, field_name='user_id'), "next_offset": next_offset}
+    return {"hashtags": search_index.in_rank_order(Hashtag.objects.all(), ids), "next_offset": next_offset}
+
+# Cache
+@api.get("/cache/stats")
+def cache_stats(request):
+    """
+    Returns hit/miss counters of the fragment cache in this process.
+    """
+    if not request.user.is_staff:
+        raise HttpError(403, "Staff only")
+    return cache.stats()
+
+# Sync variants
+@sync.get("/tweets", response=List[TweetSchema])
+@paginate(CursorPagination)
+def list_tweets_sync(request):
+    """
+    Synchronous variant of GET /tweets.
+    """
+    return Tweet.objects.for_display().with_liked_by(request.user)
+
+@sync.get("/tweets/{tweet_id}", response=TweetSchema)
+@decorate_view(http.conditional(http.tweet))
+def get_tweet_sync(request, tweet_id: int):
+    """
+    Synchronous variant of GET /tweets/{tweet_id}.
+    """
+    return get_object_or_404(Tweet.objects.for_display().with_liked_by(request.user), id=tweet_id)
+
+@sync.get("/tweets/{tweet_id}/comments", response=List[CommentSchema])
+@decorate_view(http.conditional(http.tweet_comments, http.PUBLIC, vary=None))
+def list_tweet_comments_sync(request, tweet_id: int):
+    """
+    Synchronous variant of GET /tweets/{tweet_id}/comments.
+    """
+    tweet = get_object_or_404(Tweet.objects.only('pk'), id=tweet_id)
+    return tweet.comments.for_display()
+
+@sync.get("/hashtags/{hashtag_name}", response=List[TweetSchema])
+@paginate(CursorPagination)
+def get_hashtag_tweets_sync(request, hashtag_name: str):
+    """
+    Synchronous variant of GET /hashtags/{hashtag_name}.
     """
     hashtag = get_object_or_404(Hashtag, name=hashtag_name)
-    return hashtag.tweets.all()
+    return hashtag.tweets.for_display().with_liked_by(request.user)
+
+@sync.get("/users/@{username}", response=ProfileSchema)
+@decorate_view(http.conditional(http.user_profile, http.PUBLIC, vary=None))
+def get_user_profile_sync(request, username: str):
+    """
+    Synchronous variant of GET /users/@{username}.
+    """
+    return get_object_or_404(Profile.objects.select_related('user'), user__username=username)
+
+@sync.get("/users/me", response=ProfileSchema)
+@decorate_view(http.conditional(http.current_user_profile))
+def get_current_user_profile_sync(request):
+    """
+    Synchronous variant of GET /users/me.
+    """
+    if not request.user.is_authenticated:
+        raise HttpError(401, "Not authenticated")
+    return get_object_or_404(Profile.objects.select_related('user'), user=request.user)
+
+api.add_router("/sync", sync)
+
+metrics.instrument_api(api)
@@ -7,3 +7,6 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import core.signals
+        import core.jobs
+        import core.db
+        import core.metrics
@@ -0,0 +1,287 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from .counters import refresh
+from .models import Profile, Tweet, Like, Follow
+from . import cache, graph, hashtags, notifications, search, tasks, timeline
+
+# Kolik zmen se zapisuje v jedne transakci (lajky, sledovani)
+CHUNK_SIZE = 500
+# Kolik importovanych tweetu se zapisuje v jedne transakci
+IMPORT_CHUNK_SIZE = 5000
+# Kolik chyb importu se vraci klientovi
+MAX_REPORTED_ERRORS = 50
+
+CONTENT_MAX_LENGTH = Tweet._meta.get_field('content').max_length
+
+
+def max_items():
+    return getattr(settings, 'API_BATCH_MAX_ITEMS', 1000)
+
+
+def import_spool_dir():
+    return getattr(settings, 'API_IMPORT_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'y-imports'))
+
+
+class BatchError(Exception):
+    """
+    Dávka neprošla validací, nic se nezapsalo. `errors` jsou ve tvaru chyb Ninja ({loc, msg}).
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _delete(model, pks):
+    # bez QuerySet.delete(), ktery by kvuli signalum nacetl radky a citace menil po jednom
+    if pks:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} WHERE id IN ({", ".join(["%s"] * len(pks))})',
+                list(pks),
+            )
+
+
+def _insert(model, rows, returning):
+    """
+    Vloží řádky ({sloupec: hodnota}) jedním INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Vrací hodnoty sloupce `returning` jen u skutečně vložených řádků, ty vložené
+    mezitím souběžným requestem se vynechají.
+    """
+    if not rows:
+        return []
+    qn = connection.ops.quote_name
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = [{**row, 'created_at': created_at} for row in rows]
+    columns = list(rows[0])
+    placeholders = f'({", ".join(["%s"] * len(columns))})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(model._meta.db_table)} ({", ".join(qn(column) for column in columns)}) '
+            f'VALUES {", ".join([placeholders] * len(rows))} ON CONFLICT DO NOTHING RETURNING {qn(returning)}',
+            [row[column] for row in rows for column in columns],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _check_overlap(add, remove, add_name, remove_name):
+    if len(add) + len(remove) > max_items():
+        raise BatchError([{'loc': ['body'], 'msg': f'At most {max_items()} items per batch.'}])
+    both = sorted(set(add) & set(remove))
+    if both:
+        raise BatchError([{'loc': ['body', remove_name], 'msg': f'Also listed in {add_name}: {both[:20]}'}])
+
+
+def set_likes(user_id, like=(), unlike=()):
+    """
+    Nastaví lajky uživatele u tweetů: `like` přidá, `unlike` odebere. Už platný stav se přeskočí.
+
+    Nejdřív se ověří celá dávka (neexistující tweety = BatchError), pak se zapisuje
+    po CHUNK_SIZE v transakcích: jeden INSERT nových lajků, jeden DELETE odebraných,
+    přepočet čítačů dotčených tweetů a sloučená oznámení autorům.
+    Vrací {tweet_id: nový počet lajků}.
+    """
+    _check_overlap(like, unlike, 'like', 'unlike')
+    authors = dict(Tweet.objects.filter(pk__in=[*like, *unlike]).values_list('pk', 'author_id'))
+    missing = sorted((set(like) | set(unlike)) - authors.keys())
+    if missing:
+        raise BatchError([{'loc': ['body'], 'msg': f'Unknown tweets: {missing[:20]}'}])
+
+    changes = [(tweet_id, True) for tweet_id in dict.fromkeys(like)] + [(tweet_id, False) for tweet_id in dict.fromkeys(unlike)]
+    for chunk in _chunks(changes, CHUNK_SIZE):
+        with transaction.atomic(), notifications.batch():
+            tweet_ids = [tweet_id for tweet_id, _ in chunk]
+            existing = dict(Like.objects.filter(user_id=user_id, tweet_id__in=tweet_ids).values_list('tweet_id', 'pk'))
+            added = [tweet_id for tweet_id, liked in chunk if liked and tweet_id not in existing]
+            removed = [existing[tweet_id] for tweet_id, liked in chunk if not liked and tweet_id in existing]
+            # soubezny request mohl mezitim lajknout, konflikt se preskoci a oznameni se neposle
+            added = _insert(Like, [{'user_id': user_id, 'tweet_id': tweet_id} for tweet_id in added], 'tweet_id')
+            _delete(Like, removed)
+            refresh(Tweet.objects.filter(pk__in=tweet_ids), 'likes_count')
+            for tweet_id in added:
+                notifications.notify(authors[tweet_id], user_id, 'like', tweet_id=tweet_id)
+    return dict(Tweet.objects.filter(pk__in=authors).values_list('pk', 'likes_count'))
+
+
+def set_follows(follower_id, follow=(), unfollow=()):
+    """
+    Začne sledovat uživatele z `follow` a přestane sledovat ty z `unfollow` (uživatelská jména).
+
+    Ověření a zápis po dávkách jako set_likes. Noví sledovaní se doplní do timeline
+    na pozadí, odebraní se z ní odstraní hned jedním DELETE.
+    Vrací množinu uživatelských jmen, která uživatel po zápisu sleduje (z dávky).
+    """
+    _check_overlap(follow, unfollow, 'follow', 'unfollow')
+    ids = dict(User.objects.filter(username__in=[*follow, *unfollow]).values_list('username', 'pk'))
+    missing = sorted((set(follow) | set(unfollow)) - ids.keys())
+    if missing:
+        raise BatchError([{'loc': ['body'], 'msg': f'Unknown users: {missing[:20]}'}])
+    if follower_id in {ids[name] for name in follow}:
+        raise BatchError([{'loc': ['body', 'follow'], 'msg': 'You cannot follow yourself.'}])
+
+    changes = [(ids[name], True) for name in dict.fromkeys(follow)] + [(ids[name], False) for name in dict.fromkeys(unfollow)]
+    for chunk in _chunks(changes, CHUNK_SIZE):
+        with transaction.atomic(), notifications.batch():
+            user_ids = [user_id for user_id, _ in chunk]
+            existing = dict(
+                Follow.objects.filter(follower_id=follower_id, following_id__in=user_ids).values_list('following_id', 'pk')
+            )
+            added = [user_id for user_id, wanted in chunk if wanted and user_id not in existing]
+            removed = [user_id for user_id, wanted in chunk if not wanted and user_id in existing]
+            added = _insert(
+                Follow, [{'follower_id': follower_id, 'following_id': user_id} for user_id in added], 'following_id',
+            )
+            _delete(Follow, [existing[user_id] for user_id in removed])
+            refresh(Profile.objects.filter(user_id__in=user_ids), 'followers_count')
+            refresh(Profile.objects.filter(user_id=follower_id), 'following_count')
+            # _insert ani _delete neposilaji signaly
+            graph.invalidate(follower_id, [*added, *removed])
+            if removed:
+                timeline.evict_many(follower_id, removed)
+            for user_id in added:
+                notifications.notify(user_id, follower_id, 'follow')
+                tasks.enqueue('timeline.backfill', follower_id=follower_id, following_id=user_id)
+            for user_id in [*added, *removed]:
+                cache.invalidate('profile', user_id)
+        cache.invalidate('profile', follower_id)
+
+    following = set(Follow.objects.filter(follower_id=follower_id, following_id__in=ids.values()).values_list('following_id', flat=True))
+    return {name for name, pk in ids.items() if pk in following}
+
+
+def _parse_created_at(value):
+    moment = datetime.fromisoformat(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def validate_import(lines):
+    """
+    Zkontroluje NDJSON s tweety ({"author": "jméno", "content": "...", "created_at": "ISO 8601"}).
+
+    Vrací (počet tweetů, {jméno: id}), nebo BatchError se seznamem chyb podle řádků.
+    Řádky se jen čtou, zapisuje až import_tweets, takže vadný soubor nezapíše nic.
+    """
+    errors = []
+    authors = set()
+    count = 0
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        count += 1
+        try:
+            row = json.loads(line)
+            author, content = row['author'], row['content']
+            if not isinstance(author, str) or not isinstance(content, str):
+                raise ValueError('author and content must be strings')
+            if not content.strip() or len(content) > CONTENT_MAX_LENGTH:
+                raise ValueError(f'content must have 1 to {CONTENT_MAX_LENGTH} characters')
+            if row.get('created_at') is not None:
+                _parse_created_at(row['created_at'])
+            authors.add(author)
+        except (ValueError, KeyError, TypeError) as e:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'loc': ['body', number], 'msg': f'{type(e).__name__}: {e}'})
+    if not errors and not count:
+        errors.append({'loc': ['body'], 'msg': 'No tweets to import.'})
+
+    ids = {}
+    for chunk in _chunks(authors, CHUNK_SIZE):
+        ids.update(User.objects.filter(username__in=chunk).values_list('username', 'pk'))
+    unknown = sorted(authors - ids.keys())
+    if unknown:
+        errors.append({'loc': ['body'], 'msg': f'Unknown authors: {unknown[:20]}'})
+    if errors:
+        raise BatchError(errors)
+    return count, ids
+
+
+def import_spool():
+    """
+    Soubor, do kterého se odloží tělo importu, než ho zpracuje úloha tweets.import.
+    """
+    os.makedirs(import_spool_dir(), exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=import_spool_dir(), suffix='.ndjson', delete=False)
+
+
+def _set_created_at(tweets):
+    # auto_now_add prepise cas v bulk_create, historicke casy se dopisi jednim UPDATE ... FROM (VALUES ...)
+    qn = connection.ops.quote_name
+    table = qn(Tweet._meta.db_table)
+    field = Tweet._meta.get_field('created_at')
+    for chunk in _chunks(tweets, CHUNK_SIZE):
+        params = []
+        for tweet in chunk:
+            params += [tweet.pk, field.get_db_prep_value(tweet.created_at, connection)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET {qn(field.column)} = v.column2 '
+                f'FROM (VALUES {", ".join(["(%s, %s)"] * len(chunk))}) AS v WHERE {table}.id = v.column1',
+                params,
+            )
+
+
+def _read_chunk(rows, author_ids):
+    # (tweety, historicke casy nebo None) pro dalsich IMPORT_CHUNK_SIZE radku
+    chunk, created = [], []
+    for row in rows:
+        chunk.append(Tweet(author_id=author_ids[row['author']], content=row['content']))
+        created.append(_parse_created_at(row['created_at']) if row.get('created_at') else None)
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            break
+    return chunk, created
+
+
+def import_tweets(lines, author_ids, log=None):
+    """
+    Importuje tweety z NDJSON ověřeného přes validate_import.
+
+    Po IMPORT_CHUNK_SIZE v transakci: bulk_create, historické časy, hashtagy,
+    fulltext a zápis do timeline (timeline.BulkFanOut). Na konci se přepočítají
+    čítače autorů. Oznámení ani signály se neposílají.
+    Vrací počet importovaných tweetů.
+    """
+    log = log or (lambda message: None)
+    imported = 0
+    authors = set()
+    rows = (json.loads(line) for line in lines if line.strip())
+    backend = search.backend()
+    with timeline.BulkFanOut() as fan_out:
+        while True:
+            chunk, created = _read_chunk(rows, author_ids)
+            if not chunk:
+                break
+            with transaction.atomic():
+                Tweet.objects.bulk_create(chunk)
+                historical = []
+                for tweet, created_at in zip(chunk, created):
+                    if created_at is not None:
+                        tweet.created_at = created_at
+                        historical.append(tweet)
+                _set_created_at(historical)
+                hashtags.link_hashtags(chunk)
+                backend.index_many('tweets', [(tweet.pk, (tweet.content,)) for tweet in chunk])
+                fan_out.add([tweet.pk for tweet in chunk])
+            authors.update(tweet.author_id for tweet in chunk)
+            imported += len(chunk)
+            log(f'importováno {imported}')
+
+    for chunk in _chunks(authors, CHUNK_SIZE):
+        refresh(Profile.objects.filter(user_id__in=chunk), 'tweets_count')
+        for user_id in chunk:
+            cache.invalidate('profile', user_id)
+    return imported
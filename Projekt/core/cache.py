@@ -0,0 +1,78 @@
+import threading
+import time
+from django.core.cache import caches
+
+# Alias cache z settings.CACHES pro vykreslene fragmenty
+FRAGMENT_CACHE = 'fragments'
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def fragment_cache():
+    return caches[FRAGMENT_CACHE]
+
+
+def _version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def _new_version():
+    # casove razitko misto citace - kdyz LRU vyhodi klic s verzi, nova verze
+    # nemuze omylem trefit nektery stary fragment
+    return time.time_ns()
+
+
+def versions(dependencies):
+    """
+    Vrátí aktuální verze závislostí [(druh, pk), ...] jedním get_many.
+    """
+    cache = fragment_cache()
+    keys = {_version_key(kind, pk): (kind, pk) for kind, pk in dependencies}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def invalidate(kind, pk):
+    """
+    Zneplatní všechny fragmenty, které závisí na objektu (druh, pk).
+    """
+    fragment_cache().set(_version_key(kind, pk), _new_version(), timeout=None)
+
+
+def fragment_key(name, dependencies):
+    parts = [f'{kind}={pk}@{version}' for (kind, pk), version in zip(dependencies, versions(dependencies))]
+    return f'fragment:{name}:' + ':'.join(parts)
+
+
+def get_fragment(key):
+    value = fragment_cache().get(key)
+    with _stats_lock:
+        _stats['hits' if value is not None else 'misses'] += 1
+    return value
+
+
+def set_fragment(key, value, timeout=None):
+    cache = fragment_cache()
+    if timeout is None:
+        cache.set(key, value)
+    else:
+        cache.set(key, value, timeout)
+
+
+def stats():
+    """
+    Počty zásahů a minutí fragmentové cache v tomto procesu.
+    """
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
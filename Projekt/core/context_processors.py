@@ -0,0 +1,10 @@
+from . import notifications
+
+
+def unread_notifications(request):
+    """
+    Přidá do šablon počet nepřečtených oznámení pro odznak v navigaci.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications_count': notifications.unread_count(request.user.pk)}
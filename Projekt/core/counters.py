@@ -0,0 +1,76 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import Profile, Tweet, Comment, Like, Hashtag, Follow
+
+
+def count_subquery(model, field, outer='pk'):
+    """
+    Korelovaný COUNT(*) řádků modelu, jejichž `field` ukazuje na vnější řádek.
+    """
+    counts = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def increment(queryset, field, delta=1):
+    """
+    Atomicky změní čítač jedním UPDATE bez načtení řádku.
+    """
+    return queryset.update(**{field: F(field) + delta})
+
+
+def _counters():
+    # (model, pole s citacem, vyraz se skutecnym poctem)
+    return [
+        (Tweet, 'likes_count', count_subquery(Like, 'tweet')),
+        (Tweet, 'comments_count', count_subquery(Comment, 'tweet')),
+        (Comment, 'likes_count', count_subquery(Like, 'comment')),
+        (Profile, 'followers_count', count_subquery(Follow, 'following', outer='user_id')),
+        (Profile, 'following_count', count_subquery(Follow, 'follower', outer='user_id')),
+        (Profile, 'tweets_count', count_subquery(Tweet, 'author', outer='user_id')),
+        (Hashtag, 'tweets_count', count_subquery(Hashtag.tweets.through, 'hashtag')),
+    ]
+
+
+def refresh(queryset, field):
+    """
+    Nastaví čítač vybraných řádků na skutečný počet jedním UPDATE s korelovaným poddotazem.
+
+    Pro dávkové zápisy, kde by jednotlivé přírůstky nesouhlasily při souběhu.
+    """
+    model = queryset.model
+    actual = next(expression for counter_model, name, expression in _counters() if (counter_model, name) == (model, field))
+    return queryset.update(**{field: actual})
+
+
+def recount(batch_size=10000):
+    """
+    Přepočítá všechny denormalizované čítače po dávkách podle pk.
+
+    Aktualizují se jen řádky, kde se čítač liší od skutečnosti.
+    Vrací seznam (model, pole, počet opravených řádků).
+    """
+    results = []
+    for model, field, actual in _counters():
+        fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            fixed += (
+                model.objects.filter(pk__gte=pks[0], pk__lte=last_pk)
+                .alias(actual=actual)
+                .exclude(**{field: F('actual')})
+                .update(**{field: actual})
+            )
+        results.append((model, field, fixed))
+    return results
@@ -0,0 +1,97 @@
+import contextvars
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# True, pokud aktualni request/blok jen cte a smi pouzit read-only spojeni
+_read_only = contextvars.ContextVar('read_only', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_alias():
+    return getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Nastaví PRAGMA ze SQLITE_PRAGMAS na každém novém SQLite spojení.
+
+    Read-only spojení navíc dostane query_only, aby zápis skončil chybou.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.alias == replica_alias():
+        # journal_mode je vlastnost souboru, nastavuje ho zapisujici spojeni
+        pragmas.pop('journal_mode', None)
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def read_only():
+    """
+    Čtení uvnitř bloku půjdou na read-only spojení (pokud je nakonfigurované).
+    """
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Čtení v read-only blocích posílá na DATABASE_REPLICA_ALIAS, vše ostatní na default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _read_only.get() or replica_alias() not in connections.settings:
+            return None
+        # uvnitr transakce musi cteni videt vlastni neulozene zapisy
+        if connections['default'].in_atomic_block:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+class ReadOnlyRequestMiddleware:
+    """
+    GET/HEAD/OPTIONS requesty čtou přes read-only spojení, zápisy v nich jdou dál na default.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if request.method not in SAFE_METHODS:
+            return self.get_response(request)
+        with read_only():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method not in SAFE_METHODS:
+            return await self.get_response(request)
+        with read_only():
+            return await self.get_response(request)
@@ -0,0 +1,150 @@
+import csv
+import json
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from .models import Tweet, Comment, Like, Follow, Notification
+
+# Kolik radku se nacita z databaze najednou
+CHUNK_SIZE = 2000
+# Velikost kusu odpovedi, radky se slepuji, aby se neposilal kazdy zvlast
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+
+class Dataset:
+    """
+    Jedna exportovaná tabulka: sloupce pro values_list a filtr na data uživatele.
+    """
+
+    def __init__(self, model, fields, owner):
+        self.model = model
+        self.fields = fields
+        self.owner = owner
+
+    @property
+    def columns(self):
+        return [field.replace('__', '_') for field in self.fields]
+
+    def for_user(self, user_id):
+        return self.model.objects.filter(self.owner(user_id))
+
+    def rows(self, queryset):
+        # values_list + iterator: po CHUNK_SIZE n-tic, bez instanci modelu a bez cache querysetu
+        return queryset.order_by('pk').values_list(*self.fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+DATASETS = {
+    'tweets': Dataset(
+        Tweet,
+        ('id', 'author__username', 'content', 'created_at', 'updated_at', 'likes_count', 'comments_count'),
+        lambda user_id: Q(author_id=user_id),
+    ),
+    'comments': Dataset(
+        Comment,
+        ('id', 'tweet_id', 'author__username', 'content', 'created_at', 'updated_at', 'likes_count'),
+        lambda user_id: Q(author_id=user_id),
+    ),
+    'likes': Dataset(
+        Like,
+        ('id', 'user__username', 'tweet_id', 'comment_id', 'created_at'),
+        lambda user_id: Q(user_id=user_id),
+    ),
+    'follows': Dataset(
+        Follow,
+        ('id', 'follower__username', 'following__username', 'created_at'),
+        lambda user_id: Q(follower_id=user_id) | Q(following_id=user_id),
+    ),
+    'notifications': Dataset(
+        Notification,
+        ('id', 'sender__username', 'notification_type', 'tweet_id', 'comment_id', 'actor_count', 'is_read', 'created_at'),
+        lambda user_id: Q(recipient_id=user_id),
+    ),
+}
+
+
+def dataset_name(model):
+    return next(name for name, dataset in DATASETS.items() if dataset.model is model)
+
+
+def user_parts(user_id, names=None):
+    """
+    Části exportu dat uživatele: [(název, Dataset, queryset)] pro zadané (nebo všechny) tabulky.
+    """
+    return [(name, dataset, dataset.for_user(user_id)) for name, dataset in DATASETS.items() if not names or name in names]
+
+
+def _ndjson(parts):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for name, dataset, queryset in parts:
+        columns = dataset.columns
+        for row in dataset.rows(queryset):
+            yield encoder.encode({'type': name, **dict(zip(columns, row))}) + '\n'
+
+
+class _Echo:
+    # csv.writer zapisuje do "souboru", ktery radek jen vrati
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _csv(parts):
+    # jedna tabulka: sloupec type a sjednoceni sloupcu vsech casti, chybejici hodnoty jsou prazdne
+    header = list(dict.fromkeys(column for _, dataset, _ in parts for column in dataset.columns))
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['type', *header])
+    for name, dataset, queryset in parts:
+        positions = [header.index(column) for column in dataset.columns]
+        for row in dataset.rows(queryset):
+            values = [''] * len(header)
+            for position, value in zip(positions, row):
+                values[position] = _csv_value(value)
+            yield writer.writerow([name, *values])
+
+
+def _buffered(pieces):
+    buffer, size = [], 0
+    for piece in pieces:
+        data = piece.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def response(parts, format='ndjson', gzip=False, filename='export'):
+    """
+    StreamingHttpResponse s exportem částí [(název, Dataset, queryset)] jako NDJSON nebo CSV.
+
+    Řádky se čtou po CHUNK_SIZE a posílají po kusech, paměť nezávisí na množství dat.
+    S `gzip` se výstup průběžně komprimuje a posílá jako soubor .gz.
+    """
+    content_type, extension = FORMATS[format]
+    chunks = _buffered(_ndjson(parts) if format == 'ndjson' else _csv(parts))
+    filename = f'{filename}.{extension}'
+    if gzip:
+        chunks, content_type, filename = _gzip(chunks), 'application/gzip', f'{filename}.gz'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
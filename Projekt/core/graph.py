@@ -0,0 +1,140 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from django.core.cache import cache
+from django.db import transaction
+from .models import Follow
+
+# Jak dlouho muze byt seznam sousedu v cache, kdyby se nekde minula invalidace
+ADJACENCY_TIMEOUT = 60 * 60
+# Kolik sledovanych se prochazi pri hledani pratel pratel
+RECOMMENDATION_SOURCES = 200
+RECOMMENDATION_LIMIT = 10
+
+# smer -> (sloupec s uzivatelem, sloupec se sousedem)
+_COLUMNS = {
+    'following': ('follower_id', 'following_id'),
+    'followers': ('following_id', 'follower_id'),
+}
+
+
+def _key(direction, user_id):
+    return f'graph:{direction}:{user_id}'
+
+
+def _from_bytes(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids
+
+
+def adjacency_rows(direction, user_ids):
+    """
+    Dotaz na dvojice (uživatel, soused) pro seznamy sousedů, seřazené podle obou id.
+    """
+    column, other = _COLUMNS[direction]
+    return Follow.objects.filter(**{f'{column}__in': user_ids}).order_by(column, other).values_list(column, other)
+
+
+def _load(direction, user_ids):
+    """
+    Načte seznamy sousedů uživatelů jedním dotazem, seřazené podle id.
+    """
+    adjacency = {user_id: array('q') for user_id in user_ids}
+    for user_id, neighbour in adjacency_rows(direction, user_ids).iterator(chunk_size=5000):
+        adjacency[user_id].append(neighbour)
+    cache.set_many({_key(direction, user_id): ids.tobytes() for user_id, ids in adjacency.items()}, ADJACENCY_TIMEOUT)
+    return adjacency
+
+
+def adjacency_many(direction, user_ids):
+    """
+    Vrátí {user_id: seřazené array('q') sousedů} pro 'following' nebo 'followers'.
+
+    Seznamy se drží v cache jako bajty (8 B na hranu), chybějící se načtou jedním dotazem.
+    """
+    keys = {_key(direction, user_id): user_id for user_id in user_ids}
+    found = {keys[key]: _from_bytes(data) for key, data in cache.get_many(keys).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in found]
+    if missing:
+        found.update(_load(direction, missing))
+    return found
+
+
+def following(user_id):
+    """
+    Seřazené id uživatelů, které `user_id` sleduje.
+    """
+    return adjacency_many('following', [user_id])[user_id]
+
+
+def followers(user_id):
+    """
+    Seřazené id uživatelů, kteří sledují `user_id`.
+    """
+    return adjacency_many('followers', [user_id])[user_id]
+
+
+def contains(ids, value):
+    """
+    Binární vyhledání v seřazeném poli, O(log n).
+    """
+    i = bisect_left(ids, value)
+    return i < len(ids) and ids[i] == value
+
+
+def intersection(a, b):
+    """
+    Průnik dvou seřazených polí jako seřazený seznam.
+
+    Prochází se kratší pole a v delším se hledá binárně, O(m log n) pro m <= n.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    return [value for value in a if contains(b, value)]
+
+
+def is_following(follower_id, following_id):
+    if follower_id is None:
+        return False
+    return contains(following(follower_id), following_id)
+
+
+def mutual_follows(user_id):
+    """
+    Uživatelé, se kterými se `user_id` sleduje navzájem.
+    """
+    return intersection(following(user_id), followers(user_id))
+
+
+def recommendations(user_id, limit=RECOMMENDATION_LIMIT):
+    """
+    Koho sledovat: uživatelé, které sledují sledovaní `user_id` (přátelé přátel).
+
+    Vrací [(user_id, počet společných sledovaných)] od nejvíce společných.
+    Prochází se nejvýš RECOMMENDATION_SOURCES naposledy registrovaných sledovaných,
+    jejich seznamy se načtou z cache jedním get_many.
+    """
+    mine = following(user_id)
+    sources = mine[-RECOMMENDATION_SOURCES:]
+    counts = Counter()
+    for ids in adjacency_many('following', sources).values():
+        counts.update(ids)
+    candidates = [
+        (candidate, count) for candidate, count in counts.items()
+        if candidate != user_id and not contains(mine, candidate)
+    ]
+    candidates.sort(key=lambda item: (-item[1], item[0]))
+    return candidates[:limit]
+
+
+def invalidate(follower_id, following_ids):
+    """
+    Zahodí seznamy sousedů dotčené změnou sledování (hned i po commitu).
+
+    Druhé smazání po commitu zahodí seznam, který si mezitím načetl
+    jiný request ještě podle nezapsaného stavu.
+    """
+    keys = [_key('following', follower_id), *(_key('followers', user_id) for user_id in following_ids)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,74 @@
+import re
+from collections import Counter, defaultdict
+from .models import Tweet, Hashtag
+from .counters import increment
+from . import search, trending
+
+HASHTAG_RE = re.compile(r'#(\w+)')
+NAME_MAX_LENGTH = Hashtag._meta.get_field('name').max_length
+
+TweetHashtag = Tweet.hashtags.through
+
+
+def parse(content):
+    """
+    Vrátí unikátní názvy hashtagů z textu (malými písmeny, v pořadí výskytu).
+    """
+    return list(dict.fromkeys(tag.lower()[:NAME_MAX_LENGTH] for tag in HASHTAG_RE.findall(content)))
+
+
+def upsert(names):
+    """
+    Založí chybějící hashtagy jedním bulk INSERT a vrátí mapu název -> id.
+    """
+    ids = dict(Hashtag.objects.filter(name__in=names).values_list('name', 'pk'))
+    missing = [name for name in names if name not in ids]
+    if missing:
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in missing], ignore_conflicts=True)
+        created = dict(Hashtag.objects.filter(name__in=missing).values_list('name', 'pk'))
+        ids.update(created)
+        # bulk_create neposila post_save, index se doplni rucne
+        search.backend().index_many('hashtags', [(pk, (name,)) for name, pk in created.items()])
+    return ids
+
+
+def link_hashtags(tweets):
+    """
+    Propojí dávku tweetů s jejich hashtagy.
+
+    Počet dotazů nezávisí na počtu hashtagů ani tweetů: načtení existujících
+    hashtagů a vazeb, bulk INSERT chybějících hashtagů a vazeb a UPDATE čítačů
+    a oken trendů.
+    Vrací seznam nově vytvořených vazeb (tweet_id, hashtag_id).
+    """
+    names_by_tweet = {tweet.pk: parse(tweet.content) for tweet in tweets}
+    names = list(dict.fromkeys(name for tweet_names in names_by_tweet.values() for name in tweet_names))
+    if not names:
+        return []
+
+    ids = upsert(names)
+    existing = set(
+        TweetHashtag.objects.filter(tweet_id__in=names_by_tweet.keys()).values_list('tweet_id', 'hashtag_id')
+    )
+    links = [
+        (tweet_id, ids[name])
+        for tweet_id, tweet_names in names_by_tweet.items()
+        for name in tweet_names
+        if (tweet_id, ids[name]) not in existing
+    ]
+    TweetHashtag.objects.bulk_create(
+        [TweetHashtag(tweet_id=tweet_id, hashtag_id=hashtag_id) for tweet_id, hashtag_id in links],
+        ignore_conflicts=True,
+    )
+
+    # bulk_create neposila m2m_changed, citace se zvysi jednim UPDATE na kazdou velikost prirustku
+    per_hashtag = Counter(hashtag_id for _, hashtag_id in links)
+    by_delta = defaultdict(list)
+    for hashtag_id, delta in per_hashtag.items():
+        by_delta[delta].append(hashtag_id)
+    for delta, hashtag_ids in by_delta.items():
+        increment(Hashtag.objects.filter(pk__in=hashtag_ids), 'tweets_count', delta)
+
+    created_at = {tweet.pk: tweet.created_at for tweet in tweets}
+    trending.record((hashtag_id, created_at[tweet_id]) for tweet_id, hashtag_id in links)
+    return links
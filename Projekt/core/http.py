@@ -0,0 +1,115 @@
+import hashlib
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .models import Tweet, Comment, Hashtag, Profile
+
+# Odpoved zavisi na prihlasenem uzivateli (liked_by_me, /users/me)
+PRIVATE = 'private, no-cache'
+# Stejna pro vsechny, proxy ji muze drzet, ale pred pouzitim overi
+PUBLIC = 'public, no-cache'
+
+
+class Validators:
+    """
+    Validátory jedné reprezentace: ETag z hodnot, na kterých odpověď závisí, a případně Last-Modified.
+    """
+
+    def __init__(self, parts, last_modified=None):
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+        self.etag = quote_etag(digest)
+        self.last_modified = last_modified
+
+    def conditional_response(self, request):
+        # 304 pro If-None-Match / If-Modified-Since, 412 pro If-Match / If-Unmodified-Since
+        timestamp = int(self.last_modified.timestamp()) if self.last_modified else None
+        return get_conditional_response(request, etag=self.etag, last_modified=timestamp)
+
+    def add_headers(self, response):
+        response.headers.setdefault('ETag', self.etag)
+        if self.last_modified:
+            response.headers.setdefault('Last-Modified', http_date(self.last_modified.timestamp()))
+
+
+def conditional(validator, cache_control=PRIVATE, vary=('Cookie',)):
+    """
+    Dekorátor operace Ninja API (přes ninja.decorators.decorate_view) pro podmíněný GET.
+
+    `validator(request, **path_params)` levným dotazem vrátí Validators, nebo None,
+    když objekt neexistuje (pak se rovnou zavolá endpoint, který vrátí 404).
+    Při shodě If-None-Match se odpoví 304 ještě před načtením dat a serializací.
+    Funguje pro synchronní i async operace, v async se validátor spustí v threadpoolu.
+    """
+    def decorator(run):
+        def finish(response, validators):
+            if validators is not None and response.status_code in (200, 304):
+                validators.add_headers(response)
+            response.headers.setdefault('Cache-Control', cache_control)
+            if vary:
+                patch_vary_headers(response, vary)
+            return response
+
+        if iscoroutinefunction(run):
+            async_validator = sync_to_async(validator)
+
+            async def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await run(request, *args, **kwargs)
+                validators = await async_validator(request, **kwargs)
+                response = validators and validators.conditional_response(request)
+                if not response:
+                    response = await run(request, *args, **kwargs)
+                return finish(response, validators)
+        else:
+            def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return run(request, *args, **kwargs)
+                validators = validator(request, **kwargs)
+                response = validators and validators.conditional_response(request)
+                if not response:
+                    response = run(request, *args, **kwargs)
+                return finish(response, validators)
+        return wrapper
+    return decorator
+
+
+# Validatory endpointu v core.api. Citace se meni pres F() bez updated_at, proto jsou v ETagu
+# a Last-Modified se posila jen tam, kde updated_at pokryva celou odpoved.
+
+def tweet(request, tweet_id):
+    row = (
+        Tweet.objects.filter(pk=tweet_id).with_liked_by(request.user)
+        .values_list('updated_at', 'likes_count', 'comments_count', 'liked_by_me', 'author__username', 'author__profile__updated_at')
+        .first()
+    )
+    return Validators(row) if row else None
+
+
+def tweet_comments(request, tweet_id):
+    if not Tweet.objects.filter(pk=tweet_id).exists():
+        return None
+    row = Comment.objects.filter(tweet_id=tweet_id).aggregate(
+        count=Count('id'), last_id=Max('id'), updated=Max('updated_at'), authors=Max('author__profile__updated_at'),
+    )
+    return Validators(tuple(row.values()))
+
+
+def _profile(**lookup):
+    row = Profile.objects.filter(**lookup).values_list('user_id', 'user__username', 'updated_at').first()
+    return Validators(row, last_modified=row[2]) if row else None
+
+
+def user_profile(request, username):
+    return _profile(user__username=username)
+
+
+def current_user_profile(request):
+    if not request.user.is_authenticated:
+        return None
+    return _profile(user_id=request.user.pk)
+
+
+def hashtags(request):
+    # jen dva celociselne sloupce, bez sestaveni objektu a serializace
+    return Validators(list(Hashtag.objects.order_by('pk').values_list('pk', 'tweets_count')))
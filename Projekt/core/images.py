@@ -0,0 +1,181 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from . import cache
+
+# Druh obrazku -> (sirky variant v px, oriznout na ctverec)
+KINDS = {
+    'avatar': ((64, 128, 256), True),
+    'tweet': ((320, 640, 1280), False),
+}
+
+# Pole s obrazkem -> (druh, pole s vygenerovanymi variantami)
+FIELDS = {
+    ('core.profile', 'profile_picture'): ('avatar', 'profile_picture_variants'),
+    ('core.tweet', 'image'): ('tweet', 'image_variants'),
+}
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def webp_quality():
+    return getattr(settings, 'IMAGE_WEBP_QUALITY', 80)
+
+
+def jpeg_quality():
+    return getattr(settings, 'IMAGE_JPEG_QUALITY', 82)
+
+
+def resize_cache_dir():
+    return Path(getattr(settings, 'IMAGE_RESIZE_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'cache' / 'resized'))
+
+
+def field_info(field_file):
+    """
+    Vrátí (druh, název pole s variantami) pro obrázek modelu, nebo None.
+    """
+    return FIELDS.get((field_file.instance._meta.label_lower, field_file.field.name))
+
+
+def needs_variants(instance, field_name):
+    """
+    True, pokud obrázek instance nemá varianty vygenerované z aktuálního souboru.
+
+    Výchozí obrázek pole se nezpracovává, obslouží ho resize endpoint.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file.name == field_file.field.get_default():
+        return False
+    _, variants_field = field_info(field_file)
+    return getattr(instance, variants_field).get('source') != field_file.name
+
+
+def render(image, width, crop, fmt):
+    """
+    Zmenší obrázek na šířku `width` (u ořezu na čtverec) a vrátí bajty ve formátu `fmt`.
+    """
+    # fotky z telefonu jsou casto otocene jen v EXIF
+    image = ImageOps.exif_transpose(image)
+    if crop:
+        size = min(width, image.width, image.height)
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    elif image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+    pil_format, _ = FORMATS[fmt]
+    output = BytesIO()
+    if fmt == 'jpeg':
+        if image.mode != 'RGB':
+            # pruhlednost se prokresli na bile pozadi
+            background = Image.new('RGB', image.size, 'white')
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        image.save(output, pil_format, quality=jpeg_quality(), optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        image.save(output, pil_format, quality=webp_quality(), method=4)
+    return output.getvalue()
+
+
+def variant_name(digest, kind, width, fmt):
+    # nazev podle obsahu originalu - stejny soubor se generuje jen jednou a URL se nikdy nemeni
+    return f'variants/{digest[:2]}/{digest[:20]}-{kind}-{width}.{fmt}'
+
+
+def generate(field_file, kind):
+    """
+    Vygeneruje WebP a JPEG varianty obrázku ve všech šířkách druhu.
+
+    Vrací {'source': název originálu, 'webp': {šířka: název}, 'jpeg': {...}}.
+    Šířky větší než originál se vynechají (kromě nejmenší).
+    """
+    widths, crop = KINDS[kind]
+    with field_file.open('rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    with Image.open(BytesIO(data)) as original:
+        original.load()
+        largest = min(original.width, original.height) if crop else original.width
+        usable = [width for width in widths if width <= largest] or [widths[0]]
+        variants = {'source': field_file.name}
+        for fmt in FORMATS:
+            variants[fmt] = {}
+            for width in usable:
+                name = variant_name(digest, kind, width, fmt)
+                if not default_storage.exists(name):
+                    name = default_storage.save(name, ContentFile(render(original, width, crop, fmt)))
+                variants[fmt][str(width)] = name
+    return variants
+
+
+def build_variants(model, pk, field_name):
+    """
+    Vygeneruje varianty obrázku řádku a uloží je k němu.
+
+    Pokud se obrázek mezitím změnil, výsledek se zahodí (novou verzi zpracuje další úloha).
+    """
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_variants(instance, field_name):
+        return
+    field_file = getattr(instance, field_name)
+    kind, variants_field = field_info(field_file)
+    variants = generate(field_file, kind)
+    updated = model.objects.filter(pk=pk, **{field_name: field_file.name}).update(**{variants_field: variants})
+    # update() neposila signaly, karty s obrazkem se musi zneplatnit rucne
+    if updated:
+        if model._meta.label_lower == 'core.profile':
+            cache.invalidate('profile', instance.user_id)
+        else:
+            cache.invalidate('tweet', pk)
+
+
+def allowed_widths(kind):
+    return KINDS[kind][0]
+
+
+def is_source(name):
+    """
+    True pro soubory, které smí zmenšovat resize endpoint: nahrané obrázky polí z FIELDS
+    a jejich výchozí obrázky. Vygenerované varianty ani nic jiného z MEDIA_ROOT ne.
+    """
+    if '..' in name.split('/') or name.startswith('/'):
+        return False
+    for label, field_name in FIELDS:
+        field = apps.get_model(label)._meta.get_field(field_name)
+        if name.startswith(field.upload_to.rstrip('/') + '/') or name == field.get_default():
+            return True
+    return False
+
+
+def resized(name, kind, width, fmt):
+    """
+    Vrátí cestu ke zmenšené kopii souboru z úložiště, vytvoří ji při prvním požadavku.
+
+    Kopie leží v IMAGE_RESIZE_CACHE_DIR a obnoví se, když je originál novější.
+    """
+    key = hashlib.sha256(f'{name}\0{kind}\0{width}'.encode()).hexdigest()
+    path = resize_cache_dir() / key[:2] / f'{key}.{fmt}'
+    source_mtime = default_storage.get_modified_time(name).timestamp()
+    if path.exists() and path.stat().st_mtime >= source_mtime:
+        return path
+    _, crop = KINDS[kind]
+    with default_storage.open(name, 'rb') as f, Image.open(f) as original:
+        data = render(original, width, crop, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # zapis do docasneho souboru a prejmenovani - soubezny request nikdy neuvidi pulku souboru
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,53 @@
+import os
+from django.apps import apps
+from django.db import transaction
+from .models import Tweet, Follow
+from .tasks import task
+from . import batch, hashtags, images, notifications, timeline, trending
+
+# Ulohy fronty na pozadi. Dostavaji jen ID, radky si nacitaji samy
+# a musi pocitat s tim, ze mezitim mohly zmizet.
+
+
+@task('timeline.fan_out')
+def fan_out(tweet_id):
+    tweet = Tweet.objects.filter(pk=tweet_id).only('pk', 'author_id', 'created_at').first()
+    if tweet is not None:
+        timeline.fan_out(tweet)
+
+
+@task('timeline.backfill')
+def backfill(follower_id, following_id):
+    # sledovani mezitim mohlo skoncit, evict uz probehl hned
+    if Follow.objects.filter(follower_id=follower_id, following_id=following_id).exists():
+        timeline.backfill(follower_id, following_id)
+
+
+@task('hashtags.link')
+def link_hashtags(tweet_ids):
+    hashtags.link_hashtags(list(Tweet.objects.filter(pk__in=tweet_ids).order_by().only('pk', 'content', 'created_at')))
+
+
+@task('trending.prune')
+def prune_trending():
+    trending.prune()
+
+
+@task('notifications.write')
+def write_notifications(events):
+    notifications.write([tuple(event) for event in events])
+
+
+@task('images.variants')
+def build_image_variants(model, pk, field):
+    images.build_variants(apps.get_model(model), pk, field)
+
+
+@task('tweets.import', max_attempts=3)
+def import_tweets(path, author_ids):
+    # soubor z POST /api/tweets/import, smaze se az po commitu (nepovedeny pokus ho nechava pro dalsi)
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        batch.import_tweets(f, author_ids)
+    transaction.on_commit(lambda: os.remove(path))
@@ -0,0 +1,97 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+
+
+def _summary(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'errors': errors,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Porovná propustnost synchronních (/api/sync/...) a asynchronních (/api/...) endpointů při souběžných requestech.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/tweets', help='Cesta endpointu bez prefixu /api, např. /tweets/1/comments.')
+        parser.add_argument('--requests', type=int, default=500, help='Počet requestů v každém režimu.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Počet souběžných klientů.')
+        parser.add_argument('--username', help='Přihlásit klienty jako tento uživatel (jinak anonymně).')
+
+    def handle(self, *args, **options):
+        self.user = None
+        if options['username']:
+            try:
+                self.user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f'Uživatel {options["username"]} neexistuje.')
+        path, total, concurrency = options['path'], options['requests'], options['concurrency']
+        per_client = max(1, total // concurrency)
+
+        modes = [
+            ('WSGI, sync view', lambda: self.run_threads(f'/api/sync{path}', concurrency, per_client)),
+            ('ASGI, sync view', lambda: asyncio.run(self.run_async(f'/api/sync{path}', concurrency, per_client))),
+            ('ASGI, async view', lambda: asyncio.run(self.run_async(f'/api{path}', concurrency, per_client))),
+        ]
+        self.stdout.write(f'{path}: {concurrency} klientů x {per_client} requestů')
+        self.stdout.write(f'{"režim":<18} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"chyby":>6}')
+        for name, run in modes:
+            # testovaci klienti posilaji Host: testserver
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                result = run()
+            self.stdout.write(
+                f'{name:<18} {result["rps"]:>9.1f} {result["p50"]:>9.2f} {result["p95"]:>9.2f} {result["errors"]:>6}'
+            )
+
+    def run_threads(self, url, concurrency, per_client):
+        def client_loop(_):
+            client = Client()
+            if self.user:
+                client.force_login(self.user)
+            client.get(url)  # zahrati
+            latencies, errors = [], 0
+            for _ in range(per_client):
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+            connection.close()
+            return latencies, errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(client_loop, range(concurrency)))
+        return self._collect(results, time.perf_counter() - start)
+
+    async def run_async(self, url, concurrency, per_client):
+        async def client_loop():
+            client = AsyncClient()
+            if self.user:
+                await client.aforce_login(self.user)
+            await client.get(url)  # zahrati
+            latencies, errors = [], 0
+            for _ in range(per_client):
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+            return latencies, errors
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        return self._collect(results, time.perf_counter() - start)
+
+    def _collect(self, results, elapsed):
+        latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+        return _summary(latencies, sum(errors for _, errors in results), elapsed)
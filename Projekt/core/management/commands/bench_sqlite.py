@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Vychozi chovani Django + sqlite3: rollback journal, synchronous=FULL, BEGIN DEFERRED
+BASELINE = {
+    'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    'begin': 'BEGIN',
+}
+
+
+def tuned_profile():
+    """
+    PRAGMA z produkčního profilu (nebo z aktuálních settings) a BEGIN IMMEDIATE.
+    """
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    return {'pragmas': pragmas, 'begin': 'BEGIN IMMEDIATE'}
+
+
+def _connect(path, profile):
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for name, value in profile['pragmas'].items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def _prepare(path, rows):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('CREATE TABLE tweet (id INTEGER PRIMARY KEY, author_id INTEGER, content TEXT, created_at REAL)')
+    conn.execute('CREATE INDEX tweet_author_created ON tweet (author_id, created_at DESC)')
+    now = time.time()
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO tweet (author_id, content, created_at) VALUES (?, ?, ?)',
+        ((random.randrange(1000), 'x' * 140, now - i) for i in range(rows)),
+    )
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def _client(path, profile, duration, write_ratio, queue):
+    """
+    Jeden proces: po dobu `duration` střídá zápisy (tweet + update) a čtení stránky timeline.
+    """
+    conn = _connect(path, profile)
+    stats = {'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        author = random.randrange(1000)
+        start = time.perf_counter()
+        try:
+            if random.random() < write_ratio:
+                conn.execute(profile['begin'])
+                conn.execute(
+                    'INSERT INTO tweet (author_id, content, created_at) VALUES (?, ?, ?)',
+                    (author, 'y' * 140, time.time()),
+                )
+                conn.execute('UPDATE tweet SET content = content WHERE id = last_insert_rowid()')
+                conn.execute('COMMIT')
+                stats['writes'] += 1
+            else:
+                conn.execute(
+                    'SELECT id, content FROM tweet WHERE author_id = ? ORDER BY created_at DESC LIMIT 20', (author,)
+                ).fetchall()
+                stats['reads'] += 1
+        except sqlite3.OperationalError:
+            # typicky "database is locked"
+            stats['errors'] += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            continue
+        stats['latencies'].append(time.perf_counter() - start)
+    conn.close()
+    queue.put(stats)
+
+
+def run(profile, processes, duration, write_ratio, rows):
+    """
+    Spustí benchmark nad novou dočasnou databází a vrátí souhrnné výsledky.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite3')
+        _prepare(path, rows)
+        _connect(path, profile).close()  # journal_mode se ulozi do souboru
+        queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_client, args=(path, profile, duration, write_ratio, queue))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) > 1 else 0.0
+    return {
+        'reads': sum(result['reads'] for result in results) / duration,
+        'writes': sum(result['writes'] for result in results) / duration,
+        'errors': sum(result['errors'] for result in results),
+        'p99': p99,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Změří propustnost souběžných zápisů a čtení v SQLite s výchozím a s produkčním nastavením.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Počet souběžných procesů.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Délka běhu každé varianty v sekundách.')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Podíl zápisů (0-1).')
+        parser.add_argument('--rows', type=int, default=50000, help='Počet řádků předvyplněné tabulky.')
+
+    def handle(self, *args, **options):
+        params = (options['processes'], options['duration'], options['write_ratio'], options['rows'])
+        self.stdout.write(
+            f'{options["processes"]} procesů, {options["duration"]} s, zápisy {options["write_ratio"]:.0%}'
+        )
+        self.stdout.write(f'{"nastavení":<12} {"čtení/s":>10} {"zápisy/s":>10} {"p99 ms":>9} {"locked":>7}')
+        for name, profile in (('výchozí', BASELINE), ('produkční', tuned_profile())):
+            result = run(profile, *params)
+            self.stdout.write(
+                f'{name:<12} {result["reads"]:>10.0f} {result["writes"]:>10.0f} {result["p99"]:>9.2f} {result["errors"]:>7}'
+            )
@@ -0,0 +1,250 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.utils import timezone
+from core import trending
+from core.api import api
+from core.models import Tweet, Comment, Hashtag
+from core.seed import seed_graph
+
+# Operace API, ktere benchmark nespousti (meni session prihlaseneho klienta)
+SKIPPED_OPERATIONS = {'login', 'logout'}
+
+
+def _percentile(sorted_values, q):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method='inclusive')[q - 1]
+
+
+def sample_targets(user):
+    """
+    Vybere data, na kterých se endpointy měří: nejlajkovanější tweet, jeho komentář,
+    nejpoužívanější hashtag a nejsledovanějšího uživatele.
+    """
+    tweet = Tweet.objects.order_by('-likes_count', '-comments_count').first()
+    comment = Comment.objects.filter(tweet=tweet).first() or Comment.objects.first()
+    hashtag = Hashtag.objects.order_by('-tweets_count').first()
+    celebrity = User.objects.order_by('-profile__followers_count').first()
+    word = tweet.content.split()[0]
+    return {
+        'tweet_id': tweet.pk,
+        'comment_id': comment.pk if comment else None,
+        'hashtag_name': hashtag.name if hashtag else 'tag0',
+        'username': celebrity.username,
+        'word': word,
+        'user': user,
+    }
+
+
+def _fixed(url):
+    return lambda i: url
+
+
+def _per_request(url, param, ids):
+    return lambda i: url.replace('{' + param + '}', str(ids[i]))
+
+
+def endpoints(targets, requests):
+    """
+    Vrátí [(název, metoda, funkce i -> cesta, payload)] pro HTML views a všechny operace API.
+
+    Mazací operace dostanou pro každý request (i zahřívací) vlastní předem vytvořený řádek.
+    """
+    user = targets['user']
+    result = [
+        ('timeline', 'GET', _fixed('/'), None),
+        ('profile', 'GET', _fixed(f'/profile/@{targets["username"]}/'), None),
+        ('following_list', 'GET', _fixed(f'/profile/@{targets["username"]}/following/'), None),
+        ('followers_list', 'GET', _fixed(f'/profile/@{targets["username"]}/followers/'), None),
+        ('tweet_detail', 'GET', _fixed(f'/tweet/{targets["tweet_id"]}/'), None),
+        ('search', 'GET', _fixed(f'/search/?query={targets["word"]}&search_type=tweets'), None),
+        ('hashtag_tweets', 'GET', _fixed(f'/hashtag/{targets["hashtag_name"]}/'), None),
+        ('notifications', 'GET', _fixed('/notifications/'), None),
+    ]
+    query = {'search': f'?q={targets["word"]}'}
+    payloads = {
+        'create_tweet': {'content': 'benchmark #bench'},
+        'create_comment': {'content': 'benchmark'},
+        'like_batch': {'like': [targets['tweet_id']]},
+        'follow_batch': {'follow': [targets['username']]} if targets['username'] != user.username else {},
+    }
+    for prefix, router in api._routers:
+        for path, path_view in router.path_operations.items():
+            url = f'/api{prefix}{path}'
+            for operation in path_view.operations:
+                name = operation.view_func.__name__
+                if name in SKIPPED_OPERATIONS:
+                    continue
+                for method in operation.methods:
+                    if method != 'DELETE':
+                        build = _fixed(url.format(**targets) + query.get(name, ''))
+                    elif '{tweet_id}' in url:
+                        ids = [Tweet.objects.create(author=user, content=f'ke smazání {i}').pk for i in range(requests + 1)]
+                        build = _per_request(url, 'tweet_id', ids)
+                    else:
+                        ids = [
+                            Comment.objects.create(tweet_id=targets['tweet_id'], author=user, content=f'ke smazání {i}').pk
+                            for i in range(requests + 1)
+                        ]
+                        build = _per_request(url, 'comment_id', ids)
+                    result.append((f'api:{name}', method, build, payloads.get(name)))
+    return result
+
+
+def measure(client, method, build, payload, requests):
+    """
+    Spustí endpoint `requests`krát (plus jednou na zahřátí) a vrátí latence a počty dotazů.
+    """
+    def call(i):
+        url = build(i)
+        if payload is None:
+            response = client.generic(method, url)
+        else:
+            response = client.generic(method, url, json.dumps(payload), content_type='application/json')
+        if response.streaming:
+            # StreamingHttpResponse (export) dela dotazy az pri cteni tela
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    call(requests)
+    latencies, queries, statuses = [], [], set()
+    for i in range(requests):
+        with ExitStack() as stack:
+            # vsechna pouzita spojeni - cteni mohou jit pres read-only repliku (zahrati je otevre)
+            captured = [
+                stack.enter_context(CaptureQueriesContext(conn))
+                for conn in connections.all(initialized_only=True) if conn.connection is not None
+            ]
+            start = time.perf_counter()
+            response = call(i)
+            latencies.append(time.perf_counter() - start)
+        queries.append(sum(len(capture) for capture in captured))
+        statuses.add(response.status_code)
+    latencies.sort()
+    return {
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'queries': statistics.median_low(queries),
+        'queries_max': max(queries),
+        'statuses': sorted(statuses),
+    }
+
+
+def run_endpoints(user, requests):
+    """
+    Změří všechna HTML views a operace API nad aktuální databází jako přihlášený `user`.
+    """
+    client = Client()
+    client.force_login(user)
+    targets = sample_targets(user)
+    results = {}
+    for name, method, build, payload in endpoints(targets, requests):
+        result = measure(client, method, build, payload, requests)
+        result['method'] = method
+        result['path'] = build(0)
+        results[name] = result
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Změří latence (p50/p95/p99) a počty dotazů HTML views a všech endpointů API '
+        'na syntetických grafech různé velikosti a zapíše je do JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='100,1000', help='Počty uživatelů oddělené čárkou, pro každý se vytvoří nová testovací DB.')
+        parser.add_argument('--requests', type=int, default=50, help='Počet měřených requestů na endpoint.')
+        parser.add_argument('--seed', type=int, default=0, help='Semínko generátoru grafu.')
+        parser.add_argument('--output', default='bench.json', help='Kam zapsat výsledky.')
+        parser.add_argument('--compare', help='Předchozí JSON výsledků, vypíše se změna p95 a počtu dotazů.')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales musí být čísla oddělená čárkou.')
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = {scale['users']: scale['endpoints'] for scale in json.load(f)['scales']}
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'settings': settings.SETTINGS_MODULE,
+            'python': platform.python_version(),
+            'requests': options['requests'],
+            'scales': [],
+        }
+        # testovaci klient posila Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for scale in scales:
+                report['scales'].append(self.run_scale(scale, options))
+                if previous and scale in previous:
+                    self.print_comparison(report['scales'][-1]['endpoints'], previous[scale])
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'Výsledky zapsány do {options["output"]}'))
+
+    def run_scale(self, scale, options):
+        # kazda velikost ve vlastni prazdne testovaci databazi, skutecna data se nemeni
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            for cache in caches.all():
+                cache.clear()
+            trending.invalidate()
+            start = time.perf_counter()
+            rows = seed_graph(users=scale, seed=options['seed'])
+            seed_seconds = time.perf_counter() - start
+            # typicky uzivatel: median poctu sledovanych
+            users = list(User.objects.annotate(n=Count('following')).order_by('n').values_list('pk', flat=True))
+            user = User.objects.get(pk=users[len(users) // 2])
+            self.stdout.write(f'\n{scale} uživatelů ({", ".join(f"{k} {v}" for k, v in rows.items())}), seed {seed_seconds:.1f} s')
+            results = run_endpoints(user, options['requests'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(f'{"endpoint":<32} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"dotazy":>7}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<32} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} {result["queries"]:>7}'
+            )
+        return {'users': scale, 'rows': rows, 'seed_seconds': round(seed_seconds, 2), 'endpoints': results}
+
+    def print_comparison(self, current, previous):
+        self.stdout.write(f'\n{"endpoint":<32} {"p95 ms":>20} {"dotazy":>12}')
+        for name, result in current.items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            self.stdout.write(
+                f'{name:<32} {before["p95_ms"]:>8.2f} -> {result["p95_ms"]:>7.2f} ({change:+.0f} %)'
+                f' {before["queries"]:>4} -> {result["queries"]:<4}'
+            )
@@ -0,0 +1,79 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from core import graph, tasks, timeline, trending
+from core.models import Tweet, Follow, Hashtag, Notification, Task
+from core.pagination import keyset_queryset, encode_cursor, DEFAULT_LIMIT
+
+
+def hot_queries(user, tweet, hashtag):
+    """
+    Dotazy horkých cest (views, API, signály, fronta) tak, jak je sestavuje aplikace.
+    """
+    page = slice(0, DEFAULT_LIMIT + 1)
+    cursor = encode_cursor(Tweet(pk=1, created_at=timezone.now()))
+    return [
+        ('domovská timeline', keyset_queryset(timeline.home_timeline(user).for_display().with_liked_by(user))[page]),
+        ('domovská timeline, další stránka', keyset_queryset(timeline.home_timeline(user), cursor)[page]),
+        ('tweety na profilu', keyset_queryset(user.tweets.for_display().with_liked_by(user))[page]),
+        ('tweety s hashtagem', keyset_queryset(hashtag.tweets.for_display().with_liked_by(user))[page]),
+        ('detail tweetu', Tweet.objects.for_display().with_liked_by(user).filter(pk=tweet.pk)),
+        ('komentáře tweetu', tweet.comments.for_display().with_liked_by(user).order_by('created_at')),
+        ('komentáře tweetu v API', tweet.comments.for_display()),
+        ('sledující', user.followers.select_related('follower').order_by('-created_at')),
+        ('sledovaní', user.following.select_related('following').order_by('-created_at')),
+        ('počet nepřečtených oznámení', Notification.objects.filter(recipient=user, is_read=False)),
+        ('historie oznámení', keyset_queryset(user.notifications.select_related('sender__profile', 'comment'))[page]),
+        ('graf: sledovaní', graph.adjacency_rows('following', [user.pk, tweet.author_id])),
+        ('graf: sledující', graph.adjacency_rows('followers', [user.pk, tweet.author_id])),
+        ('celebrity pro fan-out', timeline.celebrity_ids()),
+        ('fan-out: sledující autora', Follow.objects.filter(following=user).values('follower_id')),
+        ('okna trendů', trending.HashtagBucket.objects.filter(bucket_start__gte=timezone.now() - trending.window())),
+        ('fronta úloh: připravené', Task.objects.filter(tasks.ready(timezone.now())).order_by('run_after', 'id')[:10]),
+    ]
+
+
+def problems(plan):
+    """
+    Vrátí řádky plánu, které znamenají čtení celé tabulky bez indexu.
+    """
+    # SCAN bez USING INDEX prochazi celou tabulku; "USING INDEX" je prochod indexem v poradi (s LIMIT v poradku)
+    return [
+        detail for detail in plan
+        if detail.startswith('SCAN ') and 'USING' not in detail and not detail.startswith('SCAN CONSTANT ROW')
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Spustí EXPLAIN QUERY PLAN na dotazech horkých cest a selže, pokud některý čte celou tabulku.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Vypíše celý plán každého dotazu.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN je jen pro SQLite.')
+
+        # na konkretnich radcich nezalezi, planovac pracuje se schematem a statistikami
+        user = User.objects.first() or User(pk=1)
+        tweet = Tweet.objects.first() or Tweet(pk=1, author_id=user.pk)
+        hashtag = Hashtag.objects.first() or Hashtag(pk=1)
+
+        failed = []
+        for name, queryset in hot_queries(user, tweet, hashtag):
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            scans = problems(plan)
+            status = self.style.ERROR('SCAN') if scans else self.style.SUCCESS('OK')
+            self.stdout.write(f'{status:<4} {name}')
+            for detail in plan if options['verbose_plans'] else scans:
+                self.stdout.write(f'       {detail}')
+            if scans:
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f'Celou tabulku čte {len(failed)} dotazů: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('Žádný horký dotaz nečte celou tabulku.'))
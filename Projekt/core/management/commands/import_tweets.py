@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import batch
+
+
+class Command(BaseCommand):
+    help = 'Importuje tweety z NDJSON souboru (stejný formát jako POST /api/tweets/import).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON soubor, na každém řádku {"author", "content", "created_at"}.')
+
+    def handle(self, *args, **options):
+        with open(options['path'], 'rb') as f:
+            try:
+                count, authors = batch.validate_import(f)
+            except batch.BatchError as e:
+                raise CommandError('\n'.join(f'{error["loc"]}: {error["msg"]}' for error in e.errors))
+            self.stdout.write(f'Soubor je v pořádku, tweetů: {count}.')
+            f.seek(0)
+            imported = batch.import_tweets(f, authors, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Importováno {imported} tweetů.'))
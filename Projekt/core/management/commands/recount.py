@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from core.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Přepočítá denormalizované čítače (lajky, komentáře, sledující, tweety, hashtagy).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Počet řádků v jedné dávce UPDATE.')
+
+    def handle(self, *args, **options):
+        for model, field, fixed in recount(batch_size=options['batch_size']):
+            self.stdout.write(f'{model.__name__}.{field}: opraveno {fixed}')
+        self.stdout.write(self.style.SUCCESS('Čítače jsou přepočítané.'))
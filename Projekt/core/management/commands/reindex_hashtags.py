@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Tweet, Hashtag, HashtagBucket
+from core.hashtags import link_hashtags, TweetHashtag
+
+
+class Command(BaseCommand):
+    help = 'Znovu extrahuje hashtagy z existujících tweetů po dávkách.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Počet tweetů v jedné transakci.')
+        parser.add_argument('--rebuild', action='store_true', help='Nejdřív smaže všechny vazby tweet <-> hashtag.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['rebuild']:
+            with transaction.atomic():
+                TweetHashtag.objects.all().delete()
+                Hashtag.objects.update(tweets_count=0)
+                HashtagBucket.objects.all().delete()
+
+        tweets = Tweet.objects.only('pk', 'content', 'created_at').order_by('pk').iterator(chunk_size=batch_size)
+        processed = linked = 0
+        batch = []
+        for tweet in tweets:
+            batch.append(tweet)
+            if len(batch) >= batch_size:
+                linked += self.link(batch)
+                processed += len(batch)
+                batch = []
+        if batch:
+            linked += self.link(batch)
+            processed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Zpracováno {processed} tweetů, nových vazeb {linked}.'))
+
+    def link(self, tweets):
+        with transaction.atomic():
+            return len(link_hashtags(tweets))
@@ -0,0 +1,60 @@
+import multiprocessing
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from core import tasks
+
+
+def _worker(poll_interval, batch_size, stop):
+    import django
+    django.setup()
+    # o ukonceni rozhoduje rodic pres `stop`, worker jen dokonci rozpracovanou ulohu
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    tasks.work(poll_interval=poll_interval, batch_size=batch_size, stop=stop)
+
+
+class Command(BaseCommand):
+    help = 'Spustí procesy, které zpracovávají frontu úloh na pozadí.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Počet procesů workerů.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Sekundy čekání, když fronta je prázdná.')
+        parser.add_argument('--batch-size', type=int, default=10, help='Kolik úloh si worker zamkne najednou.')
+        parser.add_argument('--once', action='store_true', help='Zpracuje připravené úlohy v tomto procesu a skončí.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            tasks.work(batch_size=options['batch_size'], once=True)
+            return
+
+        stop = multiprocessing.Event()
+        signal.signal(signal.SIGTERM, self.terminate)
+        # spojeni k databazi se nesmi sdilet s detmi
+        connections.close_all()
+        args = (options['poll_interval'], options['batch_size'], stop)
+        workers = [multiprocessing.Process(target=_worker, args=args) for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Spuštěno {len(workers)} workerů, ukončení Ctrl+C.')
+
+        try:
+            while True:
+                time.sleep(1.0)
+                # spadly worker se nahradi novym
+                for i, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        self.stderr.write(f'Worker {worker.pid} skončil ({worker.exitcode}), spouštím nový.')
+                        workers[i] = multiprocessing.Process(target=_worker, args=args)
+                        workers[i].start()
+        except KeyboardInterrupt:
+            pass
+        stop.set()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS('Workery ukončeny.'))
+
+    def terminate(self, signum, frame):
+        # SIGTERM konci stejne jako Ctrl+C
+        raise KeyboardInterrupt
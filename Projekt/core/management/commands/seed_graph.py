@@ -0,0 +1,42 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.seed import seed_graph
+
+
+class Command(BaseCommand):
+    help = 'Vygeneruje syntetický sociální graf s mocninným rozdělením popularity (uživatelé, sledování, tweety, lajky, komentáře).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Počet uživatelů.')
+        parser.add_argument('--follows', type=int, default=20, help='Průměrný počet sledovaných na uživatele.')
+        parser.add_argument('--tweets', type=int, default=10, help='Průměrný počet tweetů na uživatele.')
+        parser.add_argument('--likes', type=int, default=3, help='Průměrný počet lajků na tweet.')
+        parser.add_argument('--comments', type=int, default=1, help='Průměrný počet komentářů na tweet.')
+        parser.add_argument('--hashtags', type=int, default=200, help='Velikost slovníku hashtagů.')
+        parser.add_argument('--alpha', type=float, default=1.1, help='Exponent Zipfova rozdělení popularity.')
+        parser.add_argument('--days', type=int, default=7, help='Tweety se rozloží do posledních N dní.')
+        parser.add_argument('--seed', type=int, default=0, help='Semínko generátoru (stejné semínko = stejný graf).')
+        parser.add_argument('--prefix', default='seed', help='Prefix uživatelských jmen (heslo je "heslo").')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Počet řádků v jednom bulk INSERT.')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'Uživatelé s prefixem "{options["prefix"]}" už existují, zvolte jiný --prefix.')
+        start = time.perf_counter()
+        counts = seed_graph(
+            users=options['users'],
+            follows=options['follows'],
+            tweets=options['tweets'],
+            likes=options['likes'],
+            comments=options['comments'],
+            hashtag_count=options['hashtags'],
+            alpha=options['alpha'],
+            days=options['days'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(f'{name} {count}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Hotovo za {time.perf_counter() - start:.1f} s: {summary}'))
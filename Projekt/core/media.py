@@ -0,0 +1,192 @@
+import hashlib
+import mimetypes
+import os
+import re
+from pathlib import PurePosixPath
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+# Delka hashe obsahu v nazvu souboru (hex znaky)
+HASH_LENGTH = 12
+# Soubory s hashem obsahu v nazvu se nikdy nemeni, prohlizec je nemusi overovat
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Ostatni (vychozi avatar, starsi nahravky) se overuji pres ETag a vraci 304
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+# Po kolika bajtech se streamuje cast souboru pri Range
+CHUNK_SIZE = 64 * 1024
+
+_hashed_name_re = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}\.\w+$')
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accel_redirect_prefix():
+    return getattr(settings, 'MEDIA_X_ACCEL_REDIRECT_PREFIX', None)
+
+
+def x_sendfile():
+    return getattr(settings, 'MEDIA_X_SENDFILE', False)
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Úložiště médií, které do názvu souboru přidá hash obsahu (fotka.3f2a9c1b0d4e.jpg).
+
+    Soubor s daným názvem se tak nikdy nezmění a může se cachovat navždy.
+    Stejný obsah nahraný znovu se neukládá podruhé. Názvy pod `content_addressed_prefixes`
+    už jsou odvozené z obsahu (varianty obrázků) a nechávají se beze změny.
+    """
+    content_addressed_prefixes = ('variants/',)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = str(name).replace('\\', '/')
+        # nazev od uzivatele se hashuje vzdy, i kdyz uz hash obsahu pripomina
+        if name.startswith(self.content_addressed_prefixes):
+            return super().save(name, content, max_length)
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        path = PurePosixPath(self.generate_filename(name))
+        suffix = f'.{digest.hexdigest()[:HASH_LENGTH]}{path.suffix}'
+        stem = path.stem
+        if max_length and len(str(path.with_name(stem + suffix))) > max_length:
+            # zkracuje se puvodni nazev, hash musi zustat cely
+            stem = stem[:max(len(stem) - (len(str(path.with_name(stem + suffix))) - max_length), 1)]
+        hashed = str(path.with_name(stem + suffix))
+        if self.exists(hashed):
+            return hashed
+        return super().save(hashed, content, max_length)
+
+
+def is_immutable(name):
+    """
+    True pro soubory, jejichž název je odvozený z obsahu.
+
+    Hash v názvu mohl vytvořit jen HashedMediaStorage.save, který hashuje každý nahraný soubor.
+    """
+    return name.startswith(HashedMediaStorage.content_addressed_prefixes) or bool(_hashed_name_re.search(name))
+
+
+def etag_for(stat):
+    # stejny tvar jako nginx: velikost a cas zmeny, bez cteni obsahu
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+
+def parse_range(header, size):
+    """
+    Vrátí (začátek, konec včetně) z hlavičky Range, None pro celý soubor,
+    nebo ValueError, když rozsah leží mimo soubor.
+
+    Podporuje jen jeden rozsah. Více rozsahů (multipart) se obslouží celým souborem.
+    """
+    match = _range_re.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-500 je poslednich 500 bajtu
+        length = int(end)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, name, content_type=None, immutable=None):
+    """
+    Odpověď se souborem z disku: ETag, Last-Modified, 304, Range (206/416)
+    a Cache-Control podle toho, jestli je název odvozený z obsahu.
+
+    S MEDIA_X_ACCEL_REDIRECT_PREFIX (nginx) nebo MEDIA_X_SENDFILE (Apache, lighttpd)
+    se tělo nechá poslat webovému serveru.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+    if immutable is None:
+        immutable = is_immutable(name)
+    etag = etag_for(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        # 304 Not Modified nebo 412 Precondition Failed
+        for header, value in headers.items():
+            response.headers.setdefault(header, value)
+        return response
+
+    content_type = content_type or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if accel_redirect_prefix():
+        # Range, sendfile i samotne cteni zaridi nginx
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = accel_redirect_prefix().rstrip('/') + '/' + name
+        return response
+    if x_sendfile():
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Sendfile'] = str(path)
+        return response
+
+    # If-Range: cast souboru jen pokud se od minula nezmenil, jinak cely
+    byte_range = None
+    if 'If-Range' not in request.headers or request.headers['If-Range'] == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416, content_type=content_type, headers=headers)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range is None:
+        # FileResponse pouzije wsgi.file_wrapper (sendfile), pokud ho server nabizi
+        return FileResponse(open(path, 'rb'), content_type=content_type, headers=headers)
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        _read_range(path, start, end - start + 1), status=206, content_type=content_type, headers=headers,
+    )
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Soubory z MEDIA_ROOT s podmíněnými requesty a dlouhou cache pro názvy s hashem obsahu.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return serve_file(request, full_path, path)
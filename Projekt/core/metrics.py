@@ -0,0 +1,350 @@
+import bisect
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Statistiky rozpracovaneho requestu (RequestStats), nastavuje MetricsMiddleware
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def slow_request_seconds():
+    return getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', 0.5)
+
+
+def slow_query_log_limit():
+    return getattr(settings, 'METRICS_SLOW_QUERY_LOG_LIMIT', 100)
+
+
+def token():
+    return getattr(settings, 'METRICS_TOKEN', None)
+
+
+class Histogram:
+    """
+    Histogram s logaritmicko-lineárními koši jako HDR histogram.
+
+    Každý interval [2^k, 2^(k+1)) je rozdělený na `sub_buckets` stejně širokých
+    košů, relativní chyba kvantilu je tedy nejvýš 1/sub_buckets v celém rozsahu.
+    Hodnoty pod `lowest` padnou do prvního koše, nad `highest` do +Inf.
+    """
+
+    def __init__(self, lowest, highest, sub_buckets=4):
+        self.bounds = []
+        octave = lowest
+        while octave < highest:
+            self.bounds.extend(octave * (1 + j / sub_buckets) for j in range(1, sub_buckets + 1))
+            octave *= 2
+        self.bounds.insert(0, lowest)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        """
+        Horní hranice koše, ve kterém leží kvantil `q` (0..1).
+        """
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.bounds, counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+# nazev -> (popis, nejmensi a nejvetsi hranice kosu)
+HISTOGRAMS = {
+    'y_request_duration_seconds': ('Celková doba zpracování requestu.', 2 ** -14, 2 ** 7),
+    'y_request_db_queries': ('Počet SQL dotazů na request.', 1, 2 ** 12),
+    'y_request_db_duration_seconds': ('Čas strávený v SQL dotazech na request.', 2 ** -14, 2 ** 7),
+    'y_request_template_seconds': ('Čas vykreslování šablon na request.', 2 ** -14, 2 ** 7),
+    'y_response_size_bytes': ('Velikost těla odpovědi.', 2 ** 6, 2 ** 26),
+}
+
+_lock = threading.Lock()
+# (nazev, endpoint, metoda) -> Histogram
+_histograms = {}
+# (endpoint, metoda, status) -> pocet
+_requests = {}
+
+
+def histogram(name, endpoint, method):
+    key = (name, endpoint, method)
+    found = _histograms.get(key)
+    if found is None:
+        with _lock:
+            found = _histograms.get(key)
+            if found is None:
+                _, lowest, highest = HISTOGRAMS[name]
+                found = _histograms[key] = Histogram(lowest, highest)
+    return found
+
+
+def reset():
+    """
+    Zahodí všechna nasbíraná data (testy, benchmarky).
+    """
+    with _lock:
+        _histograms.clear()
+        _requests.clear()
+
+
+class RequestStats:
+    """
+    Co se během jednoho requestu naměřilo: SQL dotazy, jejich čas a vykreslování šablon.
+    """
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        # (sql, doba) pro log pomalych requestu
+        self.statements = []
+
+    def add_query(self, sql, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if len(self.statements) < slow_query_log_limit():
+            self.statements.append((sql, elapsed))
+
+
+def measure_query(execute, sql, params, many, context):
+    """
+    Obal dotazů (execute_wrapper), který je přičte k aktuálnímu requestu.
+
+    Request se hledá v contextvar, protože async views spouští ORM
+    v jiném vlákně (a tedy s jiným spojením), než ve kterém běží middleware.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Přidá měření dotazů každému spojení, natrvalo (pod případné dočasné obaly).
+    """
+    if measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, measure_query)
+
+
+def set_endpoint(name):
+    """
+    Pojmenuje endpoint aktuálního requestu (Ninja operace jsou pod jedním URL vzorem).
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.endpoint = name
+
+
+def _response_size(response):
+    if response.streaming:
+        return int(response['Content-Length']) if response.has_header('Content-Length') else None
+    return len(response.content)
+
+
+def record(request, response, stats, elapsed):
+    """
+    Zapíše naměřené hodnoty requestu do histogramů a případně ho zaloguje jako pomalý.
+    """
+    match = request.resolver_match
+    endpoint = stats.endpoint or (match.view_name if match else 'unmatched')
+    method = request.method
+    histogram('y_request_duration_seconds', endpoint, method).observe(elapsed)
+    histogram('y_request_db_queries', endpoint, method).observe(stats.queries)
+    histogram('y_request_db_duration_seconds', endpoint, method).observe(stats.db_time)
+    histogram('y_request_template_seconds', endpoint, method).observe(stats.template_time)
+    size = _response_size(response)
+    if size is not None:
+        histogram('y_response_size_bytes', endpoint, method).observe(size)
+    key = (endpoint, method, response.status_code)
+    with _lock:
+        _requests[key] = _requests.get(key, 0) + 1
+
+    if elapsed >= slow_request_seconds():
+        statements = '\n'.join(f'  {duration * 1000:.1f} ms  {sql}' for sql, duration in stats.statements)
+        logger.warning(
+            'Slow request %s %s (%s): %.0f ms, %s queries in %.0f ms, templates %.0f ms\n%s',
+            method, request.get_full_path(), endpoint, elapsed * 1000,
+            stats.queries, stats.db_time * 1000, stats.template_time * 1000, statements,
+        )
+
+
+class MetricsMiddleware:
+    """
+    Měří každý request: celkový čas, počet a čas SQL dotazů, čas šablon a velikost odpovědi.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(request, response, stats, time.perf_counter() - start)
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Šablonový backend, který přičítá čas vykreslování do metrik requestu.
+
+    Měří se jen šablony vykreslené přes backend (render(), TemplateResponse),
+    {% include %} a {% extends %} jsou už v jejich čase.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def instrument_api(api):
+    """
+    Pojmenuje endpointy Ninja API podle operací (api:list_tweets), ne podle URL vzorů.
+    """
+    for _, router in api._routers:
+        for path_view in router.path_operations.values():
+            for operation in path_view.operations:
+                _label_operation(operation, f'api:{operation.view_func.__name__}')
+
+
+def _label_operation(operation, name):
+    run = operation.run
+    if iscoroutinefunction(run):
+        async def labelled(request, *args, **kwargs):
+            set_endpoint(name)
+            return await run(request, *args, **kwargs)
+    else:
+        def labelled(request, *args, **kwargs):
+            set_endpoint(name)
+            return run(request, *args, **kwargs)
+    operation.run = labelled
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus():
+    """
+    Nasbírané metriky v textovém formátu Prometheus (0.0.4).
+
+    Koše histogramu se vypisují jen do nejvyššího neprázdného, zbytek pokryje +Inf.
+    """
+    lines = [
+        '# HELP y_requests_total Počet zpracovaných requestů.',
+        '# TYPE y_requests_total counter',
+    ]
+    with _lock:
+        requests = sorted(_requests.items())
+        histograms = sorted(_histograms.items())
+    for (endpoint, method, status), count in requests:
+        lines.append(f'y_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    for name, (description, _, _) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for (hist_name, endpoint, method), hist in histograms:
+            if hist_name != name:
+                continue
+            counts, total, count = hist.snapshot()
+            last = max((i for i, n in enumerate(counts[:-1]) if n), default=-1)
+            cumulative = 0
+            for bound, n in zip(hist.bounds[:last + 1], counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(endpoint=endpoint, method=method, le=repr(float(bound)))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(endpoint=endpoint, method=method, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{_labels(endpoint=endpoint, method=method)} {total!r}')
+            lines.append(f'{name}_count{_labels(endpoint=endpoint, method=method)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _has_token(request):
+    expected = token()
+    scheme, _, value = request.headers.get('Authorization', '').partition(' ')
+    return bool(expected) and scheme.lower() == 'bearer' and hmac.compare_digest(value.encode(), expected.encode())
+
+
+def metrics_view(request):
+    """
+    /metrics pro Prometheus. Data jsou za aktuální proces (každý worker má vlastní).
+
+    Přístup má přihlášený člen týmu nebo scraper s hlavičkou
+    `Authorization: Bearer <METRICS_TOKEN>`. Adresa klienta se nekontroluje,
+    za reverzní proxy je to vždy 127.0.0.1.
+    """
+    if not (request.user.is_staff or _has_token(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
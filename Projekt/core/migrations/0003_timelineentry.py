@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    """
+    Naplni timeline existujicich uzivatelu jejich tweety a tweety sledovanych.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Tweet = apps.get_model('core', 'Tweet')
+    Follow = apps.get_model('core', 'Follow')
+    TimelineEntry = apps.get_model('core', 'TimelineEntry')
+    max_length = getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+    for user_id in User.objects.values_list('pk', flat=True).iterator():
+        author_ids = list(Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True))
+        author_ids.append(user_id)
+        tweets = Tweet.objects.filter(author_id__in=author_ids).order_by('-created_at').values_list('pk', 'created_at')
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, tweet_id=pk, created_at=created_at) for pk, created_at in tweets[:max_length]],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_notification_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='core.tweet')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='timeline_user_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'tweet'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
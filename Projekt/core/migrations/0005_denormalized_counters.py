@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """
+    Spocita puvodni hodnoty citacu z existujicich dat.
+    """
+    Profile = apps.get_model('core', 'Profile')
+    Tweet = apps.get_model('core', 'Tweet')
+    Comment = apps.get_model('core', 'Comment')
+    Like = apps.get_model('core', 'Like')
+    Follow = apps.get_model('core', 'Follow')
+    Hashtag = apps.get_model('core', 'Hashtag')
+
+    def count(model, field, outer='pk'):
+        counts = (
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(n=Count('*'))
+            .values('n')
+        )
+        return Coalesce(Subquery(counts), 0)
+
+    Tweet.objects.update(likes_count=count(Like, 'tweet'), comments_count=count(Comment, 'tweet'))
+    Comment.objects.update(likes_count=count(Like, 'comment'))
+    Profile.objects.update(
+        followers_count=count(Follow, 'following', outer='user_id'),
+        following_count=count(Follow, 'follower', outer='user_id'),
+        tweets_count=count(Tweet, 'author', outer='user_id'),
+    )
+    Hashtag.objects.update(tweets_count=count(Hashtag.tweets.through, 'hashtag'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_tweet_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hashtag',
+            name='tweets_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='tweets_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tweet',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tweet',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
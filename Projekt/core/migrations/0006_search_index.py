@@ -0,0 +1,66 @@
+from django.db import migrations, OperationalError
+
+TABLES = {
+    'core_tweet_fts': ('content',),
+    'core_user_fts': ('username', 'bio', 'location'),
+    'core_hashtag_fts': ('name',),
+}
+
+
+def create_fts_tables(apps, schema_editor):
+    """
+    Vytvori FTS5 tabulky a naplni je existujicimi daty.
+
+    Bez SQLite/FTS5 se nic nevytvori a core.search pouzije index v pameti.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    Tweet = apps.get_model('core', 'Tweet')
+    Profile = apps.get_model('core', 'Profile')
+    Hashtag = apps.get_model('core', 'Hashtag')
+
+    with connection.cursor() as cursor:
+        try:
+            for table, columns in TABLES.items():
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(columns)}, "
+                    f"tokenize = 'unicode61 remove_diacritics 2')"
+                )
+        except OperationalError:
+            # SQLite bez FTS5
+            for table in TABLES:
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+            return
+
+        cursor.executemany(
+            'INSERT INTO core_tweet_fts (rowid, content) VALUES (%s, %s)',
+            list(Tweet.objects.values_list('pk', 'content')),
+        )
+        cursor.executemany(
+            'INSERT INTO core_user_fts (rowid, username, bio, location) VALUES (%s, %s, %s, %s)',
+            list(Profile.objects.values_list('user_id', 'user__username', 'bio', 'location')),
+        )
+        cursor.executemany(
+            'INSERT INTO core_hashtag_fts (rowid, name) VALUES (%s, %s)',
+            list(Hashtag.objects.values_list('pk', 'name')),
+        )
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
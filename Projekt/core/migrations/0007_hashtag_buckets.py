@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:39
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_buckets(apps, schema_editor):
+    """
+    Naplni okna trendu z tweetu, ktere jsou jeste v okne TRENDING_WINDOW_SECONDS.
+    """
+    TweetHashtag = apps.get_model('core', 'Hashtag').tweets.through
+    HashtagBucket = apps.get_model('core', 'HashtagBucket')
+    seconds = getattr(settings, 'TRENDING_BUCKET_SECONDS', 3600)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=getattr(settings, 'TRENDING_WINDOW_SECONDS', 48 * 3600))
+
+    counts = Counter()
+    uses = TweetHashtag.objects.filter(tweet__created_at__gte=cutoff).values_list('hashtag_id', 'tweet__created_at')
+    for hashtag_id, created_at in uses.iterator(chunk_size=2000):
+        timestamp = int(created_at.timestamp())
+        start = datetime.fromtimestamp(timestamp - timestamp % seconds, tz=timezone.utc)
+        counts[hashtag_id, start] += 1
+    HashtagBucket.objects.bulk_create(
+        [HashtagBucket(hashtag_id=hashtag_id, bucket_start=start, count=n) for (hashtag_id, start), n in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashtagBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='core.hashtag')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['bucket_start'], name='hashtag_bucket_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hashtag', 'bucket_start'), name='unique_hashtag_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_actors(apps, schema_editor):
+    """
+    Odesilatel kazdeho existujiciho oznameni se zapocita jako jeho akter.
+    """
+    Notification = apps.get_model('core', 'Notification')
+    NotificationActor = apps.get_model('core', 'NotificationActor')
+    qn = schema_editor.quote_name
+    schema_editor.execute(
+        f'INSERT INTO {qn(NotificationActor._meta.db_table)} (notification_id, user_id) '
+        f'SELECT id, sender_id FROM {qn(Notification._meta.db_table)}'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_like_created_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='core.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('notification', 'user'), name='unique_notification_actor')],
+            },
+        ),
+        migrations.RunPython(fill_actors, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,22 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
 
-class Profile(models.Model):
+class CounterFieldsMixin:
+    """
+    Denormalizovane citace meni jen core.signals pres F(), bezne ulozeni
+    instance je nesmi prepsat starou hodnotou z pameti
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+class Profile(CounterFieldsMixin, models.Model):
     """
     Rozsireni User modelu
     """
@@ -11,9 +26,17 @@ class Profile(models.Model):
     location = models.CharField(max_length=30, blank=True)
     birth_date = models.DateField(null=True, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', default='default.jpg')
+    # zmensene WebP/JPEG kopie, generuje core.images na pozadi
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     website = models.URLField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # denormalizovane pocty, udrzuje je core.signals (opravuje manage.py recount)
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    tweets_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('followers_count', 'following_count', 'tweets_count')
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
@@ -21,15 +44,30 @@ class Profile(models.Model):
     def get_absolute_url(self):
         return reverse('profile', kwargs={'username': self.user.username})
     
-    @property
-    def followers_count(self):
-        return self.user.followers.count()
-    
-    @property
-    def following_count(self):
-        return self.user.following.count()
-    
-class Tweet(models.Model):
+class LikedByQuerySetMixin:
+    # nazev FK v modelu Like, ktery ukazuje na tento model
+    like_field = None
+
+    def with_liked_by(self, user):
+        """
+        Prida priznak liked_by_me - indexovany EXISTS primo v dotazu na stranku,
+        misto nacitani vsech lajku kazdeho radku
+        """
+        if not user.is_authenticated:
+            return self.annotate(liked_by_me=models.Value(False))
+        likes = Like.objects.filter(user=user, **{self.like_field: models.OuterRef('pk')})
+        return self.annotate(liked_by_me=models.Exists(likes))
+
+class TweetQuerySet(LikedByQuerySetMixin, models.QuerySet):
+    like_field = 'tweet'
+
+    def for_display(self):
+        """
+        Autor s profilem v jednom joinu
+        """
+        return self.select_related('author__profile')
+
+class Tweet(CounterFieldsMixin, models.Model):
     """
     Model pro tweety
     """
@@ -38,9 +76,21 @@ class Tweet(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to='tweet_images', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('likes_count', 'comments_count')
+
+    objects = TweetQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # keyset strankovani podle (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='tweet_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='tweet_author_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author.username}: {self.content[:20]}..."
@@ -48,23 +98,20 @@ class Tweet(models.Model):
     def get_absolute_url(self):
         return reverse('tweet_detail', kwargs={'pk': self.pk})
     
-    @property
-    def likes_count(self):
-        return self.likes.count()
-    
-    @property
-    def comments_count(self):
-        return self.comments.count()
-    
     def extract_hashtags(self):
-        import re
-        hashtag_pattern = r'#(\w+)'
-        hashtags = re.findall(hashtag_pattern, self.content)
-        for tag in hashtags:
-            hashtag, created = Hashtag.objects.get_or_create(name=tag.lower())
-            self.hashtags.add(hashtag)
+        from .tasks import enqueue
+        enqueue('hashtags.link', tweet_ids=[self.pk])
     
-class Comment(models.Model):
+class CommentQuerySet(LikedByQuerySetMixin, models.QuerySet):
+    like_field = 'comment'
+
+    def for_display(self):
+        """
+        Autor s profilem v jednom joinu
+        """
+        return self.select_related('author__profile')
+
+class Comment(CounterFieldsMixin, models.Model):
     """
     Model pro komentare k tweetum
     """
@@ -73,9 +120,18 @@ class Comment(models.Model):
     content = models.TextField(max_length=128)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('likes_count',)
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # komentare k tweetu podle casu (detail i API, oba smery)
+            models.Index(fields=['tweet', 'created_at', 'id'], name='comment_tweet_created_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username}: {self.content[:20]}..."
@@ -111,6 +167,10 @@ class Like(models.Model):
                 condition=models.Q(comment__isnull=False)
             ),
         ]
+        indexes = [
+            # changelist v adminu strankovany kurzorem (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='like_created_idx'),
+        ]
 
     def __str__(self):
         if self.tweet:
@@ -118,13 +178,16 @@ class Like(models.Model):
         else:
             return f"{self.user.username} liked comment {self.comment.author.username}"
     
-class Hashtag(models.Model):
+class Hashtag(CounterFieldsMixin, models.Model):
     """
     Model pro hashtagy
     """
     name = models.CharField(max_length=30, unique=True)
     tweets = models.ManyToManyField(Tweet, related_name='hashtags', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    tweets_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('tweets_count',)
 
     def __str__(self):
         return f"#{self.name}"
@@ -132,10 +195,6 @@ class Hashtag(models.Model):
     def get_absolute_url(self):
         return reverse('hashtag_tweets', kwargs={'name': self.name})
     
-    @property
-    def tweets_count(self):
-        return self.tweets.count()
-    
 class Follow(models.Model):
     """
     Model pro sledovani uzivatelu
@@ -157,6 +216,11 @@ class Follow(models.Model):
                 name='no_self_follow'
             ),
         ]
+        indexes = [
+            # seznamy sledujicich a sledovanych, nejnovejsi prvni
+            models.Index(fields=['following', '-created_at'], name='follow_following_created_idx'),
+            models.Index(fields=['follower', '-created_at'], name='follow_follower_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
@@ -178,7 +242,23 @@ class Notification(models.Model):
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
-    
+    # pocet ruznych odesilatelu sloucenych udalosti ("X a 341 dalsich"), sender je posledni z nich;
+    # odesilatele samotne drzi NotificationActor
+    actor_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # pocet neprectenych (odznak), hromadne oznaceni jako prectene a slucovani;
+            # castecny index obsahuje jen neprectene radky, zustava maly
+            models.Index(
+                fields=['recipient', '-created_at'],
+                name='notification_unread_idx',
+                condition=models.Q(is_read=False),
+            ),
+            # strankovana historie
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recipient_idx'),
+        ]
+
     def __str__(self):
         if self.notification_type == 'like' and self.tweet:
             return f"{self.sender.username} liked your tweet"
@@ -190,3 +270,104 @@ class Notification(models.Model):
             return f"{self.sender.username} started following you"
         else:
             return "Notification"
+
+class NotificationActor(models.Model):
+    """
+    Odesilatel zapocitany do slouceneho oznameni (kazdy jen jednou)
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['notification', 'user'],
+                name='unique_notification_actor'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_id}: {self.user_id}"
+
+class TimelineEntry(models.Model):
+    """
+    Predpocitana polozka domovske timeline (fan-out on write)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name='timeline_entries')
+    # kopie Tweet.created_at, aby slo radit bez joinu
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'tweet'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='timeline_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.tweet_id}"
+
+
+class HashtagBucket(models.Model):
+    """
+    Pocet pouziti hashtagu v jednom casovem okne (pro trendy)
+    """
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='buckets')
+    # zacatek okna zaokrouhleny dolu na TRENDING_BUCKET_SECONDS
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hashtag', 'bucket_start'],
+                name='unique_hashtag_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['bucket_start'], name='hashtag_bucket_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.hashtag_id} @ {self.bucket_start}: {self.count}"
+
+
+class Task(models.Model):
+    """
+    Uloha fronty na pozadi (core.tasks), zpracovava ji manage.py run_workers
+    """
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    # stejny klic se zaradi jen jednou (idempotence)
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
@@ -0,0 +1,204 @@
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils import timezone
+from .models import Notification, NotificationActor, Tweet, Comment
+from . import tasks
+
+# Jak dlouho muze byt pocet neprectenych v cache, kdyby se nekde minula invalidace
+UNREAD_COUNT_TIMEOUT = 5 * 60
+# Kolik skupin udalosti se hleda jednim dotazem (kazda je jedna podminka v OR)
+LOOKUP_BATCH_SIZE = 200
+
+
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """
+    Počet nepřečtených oznámení uživatele, z cache nebo jedním COUNT přes index.
+    """
+    key = _unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_unread(user_id):
+    cache.delete(_unread_key(user_id))
+
+
+def mark_all_read(user_id):
+    """
+    Označí všechna oznámení uživatele jako přečtená jedním UPDATE.
+    """
+    updated = Notification.objects.filter(recipient_id=user_id, is_read=False).update(is_read=True)
+    cache.set(_unread_key(user_id), 0, UNREAD_COUNT_TIMEOUT)
+    return updated
+
+
+def coalesce_window():
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', 24 * 3600))
+
+
+# Rozpracovane udalosti aktualniho vlakna uvnitr batch()
+_local = threading.local()
+
+
+@contextmanager
+def batch():
+    """
+    Posbírá události uvnitř bloku a zapíše je najednou na jeho konci.
+
+    Bloky se mohou vnořovat, zapisuje až ten vnější. Při výjimce se události zahodí.
+    """
+    depth = getattr(_local, 'depth', 0)
+    if depth == 0:
+        _local.events = []
+    _local.depth = depth + 1
+    try:
+        yield
+    except BaseException:
+        if depth == 0:
+            _local.events = []
+        raise
+    finally:
+        _local.depth = depth
+    if depth == 0:
+        events, _local.events = _local.events, []
+        flush(events)
+
+
+def notify(recipient_id, sender_id, notification_type, tweet_id=None, comment_id=None):
+    """
+    Zaznamená událost pro oznámení. Události vlastního autora se ignorují.
+    """
+    if recipient_id == sender_id:
+        return
+    event = (recipient_id, sender_id, notification_type, tweet_id, comment_id)
+    if getattr(_local, 'depth', 0):
+        _local.events.append(event)
+    else:
+        flush([event])
+
+
+def _group_key(recipient_id, notification_type, tweet_id, comment_id):
+    # komentare se slucuji za cely tweet, lajky zvlast pro tweet a pro komentar
+    if notification_type == 'comment':
+        comment_id = None
+    return recipient_id, notification_type, tweet_id, comment_id
+
+
+def _group_filter(key):
+    recipient_id, notification_type, tweet_id, comment_id = key
+    condition = Q(recipient_id=recipient_id, notification_type=notification_type, tweet_id=tweet_id)
+    if notification_type != 'comment':
+        condition &= Q(comment_id=comment_id)
+    return condition
+
+
+def flush(events):
+    """
+    Předá události k zápisu jednou úlohou na pozadí.
+    """
+    if events:
+        tasks.enqueue('notifications.write', events=[list(event) for event in events])
+
+
+def _drop_missing_targets(events):
+    # tweet nebo komentar mohl byt mezitim smazan
+    tweet_ids = {event[3] for event in events if event[3]}
+    comment_ids = {event[4] for event in events if event[4]}
+    if tweet_ids:
+        tweet_ids = set(Tweet.objects.filter(pk__in=tweet_ids).values_list('pk', flat=True))
+    if comment_ids:
+        comment_ids = set(Comment.objects.filter(pk__in=comment_ids).values_list('pk', flat=True))
+    return [
+        event for event in events
+        if (not event[3] or event[3] in tweet_ids) and (not event[4] or event[4] in comment_ids)
+    ]
+
+
+def write(events):
+    """
+    Zapíše události sloučené podle (příjemce, typ, cíl).
+
+    Pokud má příjemce v okně NOTIFICATION_COALESCE_SECONDS nepřečtené oznámení
+    stejné skupiny, přidají se k němu odesílatelé a posune se čas ("X a 341 dalších").
+    Odesílatelé se drží v NotificationActor (každý jednou), actor_count je jejich
+    počet, takže opakovaná událost téhož uživatele se nezapočítá ani napříč zápisy.
+    Ostatní skupiny se vloží jedním bulk INSERT.
+    """
+    events = _drop_missing_targets(events)
+    if not events:
+        return
+    groups = {}
+    for recipient_id, sender_id, notification_type, tweet_id, comment_id in events:
+        key = _group_key(recipient_id, notification_type, tweet_id, comment_id)
+        senders, _ = groups.get(key, ({}, None))
+        # odesilatele bez opakovani, posledni je na konci; komentar z posledni udalosti
+        senders.pop(sender_id, None)
+        senders[sender_id] = None
+        groups[key] = (senders, comment_id)
+
+    now = timezone.now()
+    keys = list(groups)
+    existing = {}
+    for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        condition = Q()
+        for key in keys[i:i + LOOKUP_BATCH_SIZE]:
+            condition |= _group_filter(key)
+        candidates = (
+            Notification.objects.filter(condition, is_read=False, created_at__gte=now - coalesce_window())
+            .order_by('-created_at')
+            .values_list('pk', 'recipient_id', 'notification_type', 'tweet_id', 'comment_id')
+        )
+        for pk, *fields in candidates:
+            existing.setdefault(_group_key(*fields), pk)
+
+    new, merged = [], []
+    for key, (senders, comment_id) in groups.items():
+        recipient_id, notification_type, tweet_id, _ = key
+        sender_id = next(reversed(senders))
+        if key in existing:
+            merged.append((existing[key], senders, sender_id, comment_id))
+        else:
+            new.append((Notification(
+                recipient_id=recipient_id,
+                sender_id=sender_id,
+                notification_type=notification_type,
+                tweet_id=tweet_id,
+                comment_id=comment_id,
+                actor_count=len(senders),
+            ), senders))
+    Notification.objects.bulk_create([notification for notification, _ in new], batch_size=LOOKUP_BATCH_SIZE)
+
+    targets = [(notification.pk, senders) for notification, senders in new]
+    targets += [(pk, senders) for pk, senders, _, _ in merged]
+    # odesilatel, ktery uz u oznameni je, se preskoci
+    NotificationActor.objects.bulk_create(
+        [NotificationActor(notification_id=pk, user_id=user_id) for pk, senders in targets for user_id in senders],
+        batch_size=LOOKUP_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    actor_count = Subquery(
+        NotificationActor.objects.filter(notification_id=OuterRef('pk'))
+        .order_by().values('notification_id').annotate(count=Count('pk')).values('count')
+    )
+    for pk, _, sender_id, comment_id in merged:
+        Notification.objects.filter(pk=pk).update(
+            actor_count=actor_count,
+            sender_id=sender_id,
+            comment_id=comment_id,
+            created_at=now,
+        )
+
+    # update() ani bulk_create neposilaji signaly
+    for recipient_id in {key[0] for key in groups}:
+        invalidate_unread(recipient_id)
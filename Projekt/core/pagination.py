@@ -0,0 +1,134 @@
+import base64
+from datetime import datetime
+from typing import Any, List, Optional
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+from ninja import Field, Schema
+from ninja.errors import HttpError
+from ninja.pagination import AsyncPaginationBase
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def count_limit():
+    return getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(obj):
+    """
+    Zakóduje pozici (created_at, id) do neprůhledného kurzoru.
+    """
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Dekóduje kurzor zpět na dvojici (created_at, id).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def clamp_limit(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def keyset_queryset(queryset, before=None):
+    """
+    Seřadí queryset podle (created_at, id) sestupně a vynechá vše od kurzoru výš.
+    """
+    queryset = queryset.order_by('-created_at', '-pk')
+    if before:
+        created_at, pk = decode_cursor(before)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    return queryset
+
+
+def _split_page(rows, limit):
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def keyset_page(queryset, before=None, limit=DEFAULT_LIMIT):
+    """
+    Vrátí jednu stránku objektů a kurzor další stránky (nebo None).
+    """
+    limit = clamp_limit(limit)
+    rows = list(keyset_queryset(queryset, before)[:limit + 1])
+    return _split_page(rows, limit)
+
+
+async def akeyset_page(queryset, before=None, limit=DEFAULT_LIMIT):
+    """
+    Asynchronní keyset_page pro async views (načte stránku přes async ORM).
+    """
+    limit = clamp_limit(limit)
+    rows = [obj async for obj in keyset_queryset(queryset, before)[:limit + 1]]
+    return _split_page(rows, limit)
+
+
+class CursorPagination(AsyncPaginationBase):
+    """
+    Keyset pagination for the API: ?before=<cursor>&limit=<n>.
+    """
+    class Input(Schema):
+        before: Optional[str] = None
+        limit: int = Field(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT)
+
+    class Output(Schema):
+        items: List[Any]
+        next: Optional[str] = None
+
+    def paginate_queryset(self, queryset, pagination: Input, **params):
+        try:
+            items, next_cursor = keyset_page(queryset, pagination.before, pagination.limit)
+        except InvalidCursor:
+            raise HttpError(400, "Invalid cursor")
+        return {"items": items, "next": next_cursor}
+
+    async def apaginate_queryset(self, queryset, pagination: Input, **params):
+        try:
+            items, next_cursor = await akeyset_page(queryset, pagination.before, pagination.limit)
+        except InvalidCursor:
+            raise HttpError(400, "Invalid cursor")
+        return {"items": items, "next": next_cursor}
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator pro admin, který počítá řádky nejvýš do ADMIN_COUNT_LIMIT.
+
+    COUNT(*) přes celou tabulku je v SQLite lineární, proto se počítá jen v poddotazu
+    s LIMIT. Nad limitem je `estimated` True a počet je odhad: u nefiltrovaného querysetu
+    nejvyšší id (jeden krok v indexu), jinak samotný limit.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        limit = count_limit()
+        count = queryset[:limit + 1].count()
+        if count <= limit:
+            return count
+        self.estimated = True
+        if not queryset.query.has_filters():
+            return max(limit, queryset.aggregate(max_pk=Max('pk'))['max_pk'])
+        return limit
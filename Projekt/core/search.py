@@ -0,0 +1,246 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from django.db import connection, OperationalError, ProgrammingError
+from .models import Tweet, Profile, Hashtag
+
+TOKEN_RE = re.compile(r'\w+')
+
+# druh -> (FTS5 tabulka, sloupce)
+FTS_TABLES = {
+    'tweets': ('core_tweet_fts', ('content',)),
+    'users': ('core_user_fts', ('username', 'bio', 'location')),
+    'hashtags': ('core_hashtag_fts', ('name',)),
+}
+
+
+def normalize(text):
+    """
+    Malá písmena bez diakritiky - stejně jako tokenizer unicode61 remove_diacritics.
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def _documents(kind):
+    """
+    Vrátí dvojice (id, text) všech dokumentů daného druhu z databáze.
+    """
+    if kind == 'tweets':
+        return Tweet.objects.values_list('pk', 'content').iterator(chunk_size=2000)
+    if kind == 'users':
+        rows = Profile.objects.values_list('user_id', 'user__username', 'bio', 'location').iterator(chunk_size=2000)
+        return ((pk, ' '.join(parts)) for pk, *parts in rows)
+    return Hashtag.objects.values_list('pk', 'name').iterator(chunk_size=2000)
+
+
+def _user_columns(profile):
+    return (profile.user.username, profile.bio, profile.location)
+
+
+class FTS5Backend:
+    """
+    Index nad virtuálními tabulkami SQLite FTS5 (vytváří je migrace 0006).
+    """
+
+    def _replace(self, kind, pk, values):
+        table, columns = FTS_TABLES[kind]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES (%s, {", ".join(["%s"] * len(columns))})',
+                [pk, *values],
+            )
+
+    def remove(self, kind, pk):
+        table, _ = FTS_TABLES[kind]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+
+    def index_tweet(self, tweet):
+        self._replace('tweets', tweet.pk, (tweet.content,))
+
+    def index_profile(self, profile):
+        self._replace('users', profile.user_id, _user_columns(profile))
+
+    def index_hashtag(self, hashtag):
+        self._replace('hashtags', hashtag.pk, (hashtag.name,))
+
+    def index_many(self, kind, rows):
+        """
+        Zaindexuje dávku dvojic (id, hodnoty sloupců).
+        """
+        table, columns = FTS_TABLES[kind]
+        rows = list(rows)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [[pk] for pk, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES (%s, {", ".join(["%s"] * len(columns))})',
+                [[pk, *values] for pk, values in rows],
+            )
+
+    def search(self, kind, query, limit, offset=0):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # kazdy vyraz jako prefix, vsechny musi platit (AND), razeni podle bm25
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table, _ = FTS_TABLES[kind]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PythonIndex:
+    """
+    Invertovaný index v paměti procesu pro databáze bez FTS5.
+
+    Sestaví se líně při prvním hledání, pak ho aktualizují signály.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._tokens = {}
+        self._documents = {}
+
+    def _build(self, kind):
+        if kind in self._postings:
+            return
+        self._postings[kind] = defaultdict(dict)
+        self._tokens[kind] = []
+        self._documents[kind] = {}
+        for pk, text in _documents(kind):
+            self._add(kind, pk, text)
+
+    def _add(self, kind, pk, text):
+        postings, tokens = self._postings[kind], self._tokens[kind]
+        counts = defaultdict(int)
+        for token in tokenize(text):
+            counts[token] += 1
+        for token, tf in counts.items():
+            if token not in postings:
+                bisect.insort(tokens, token)
+            postings[token][pk] = tf
+        self._documents[kind][pk] = list(counts)
+
+    def _discard(self, kind, pk):
+        postings = self._postings[kind]
+        for token in self._documents[kind].pop(pk, ()):
+            docs = postings.get(token)
+            if docs is not None:
+                docs.pop(pk, None)
+                if not docs:
+                    del postings[token]
+                    tokens = self._tokens[kind]
+                    tokens.pop(bisect.bisect_left(tokens, token))
+
+    def _replace(self, kind, pk, text):
+        with self._lock:
+            if kind not in self._postings:
+                # index jeste neexistuje, postavi se cely pri prvnim hledani
+                return
+            self._discard(kind, pk)
+            self._add(kind, pk, text)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if kind in self._postings:
+                self._discard(kind, pk)
+
+    def index_tweet(self, tweet):
+        self._replace('tweets', tweet.pk, tweet.content)
+
+    def index_profile(self, profile):
+        self._replace('users', profile.user_id, ' '.join(_user_columns(profile)))
+
+    def index_hashtag(self, hashtag):
+        self._replace('hashtags', hashtag.pk, hashtag.name)
+
+    def index_many(self, kind, rows):
+        for pk, values in rows:
+            self._replace(kind, pk, ' '.join(values))
+
+    def _matches(self, kind, prefix):
+        # vsechny tokeny zacinajici prefixem, v serazenem seznamu lezi za sebou
+        tokens, postings = self._tokens[kind], self._postings[kind]
+        scores = defaultdict(float)
+        start = bisect.bisect_left(tokens, prefix)
+        for token in tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            for pk, tf in postings[token].items():
+                scores[pk] += tf
+        return scores
+
+    def search(self, kind, query, limit, offset=0):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._build(kind)
+            total = len(self._documents[kind]) or 1
+            scores = None
+            for term in terms:
+                matches = self._matches(kind, term)
+                idf = math.log(1 + total / (1 + len(matches)))
+                if scores is None:
+                    scores = {pk: tf * idf for pk, tf in matches.items()}
+                else:
+                    scores = {pk: score + matches[pk] * idf for pk, score in scores.items() if pk in matches}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [pk for pk, _ in ranked[offset:offset + limit]]
+
+
+_fallback = PythonIndex()
+_fts_available = None
+
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = False
+        if connection.vendor == 'sqlite':
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1 FROM core_tweet_fts LIMIT 0')
+                _fts_available = True
+            except (OperationalError, ProgrammingError):
+                pass
+    return _fts_available
+
+
+def backend():
+    """
+    FTS5, pokud ho databáze má, jinak index v paměti.
+    """
+    return FTS5Backend() if fts_available() else _fallback
+
+
+def search_ids(kind, query, limit, offset=0):
+    """
+    Vrátí ID výsledků seřazené podle relevance.
+    """
+    return backend().search(kind, query, limit, offset)
+
+
+def in_rank_order(queryset, ids, field_name='pk'):
+    """
+    Načte objekty podle ID jedním dotazem a zachová pořadí relevance.
+    """
+    objects = queryset.in_bulk(ids, field_name=field_name)
+    return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,209 @@
+import random
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import timedelta
+from itertools import accumulate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from .counters import recount
+from .models import Profile, Tweet, Comment, Like, Follow, Notification, TimelineEntry
+from . import hashtags, search, timeline
+
+# Vsichni vygenerovani uzivatele maji toto heslo
+PASSWORD = 'heslo'
+
+WORDS = (
+    'ahoj dnes zitra vcera kava prace skola vikend film hudba kniha vylet hory more mesto '
+    'praha brno vlak tramvaj pocasi dest slunce snih jaro leto podzim zima obed vecere '
+    'fotbal hokej beh kolo zapas vysledek novinky projekt python django databaze server '
+    'kod chyba oprava release test vykon cache index dotaz graf data model pes kocka'
+).split()
+
+LOCATIONS = ('Praha', 'Brno', 'Ostrava', 'Plzeň', 'Olomouc', 'Liberec', '')
+
+
+def _heavy_tailed(rng, mean, limit):
+    # Pareto s alfa 2 ma stredni hodnotu 2, vetsina hodnot je mala, par obrovskych
+    return min(int(mean / 2 * rng.paretovariate(2.0)), limit)
+
+
+def _sentence(rng, words, tags=()):
+    return ' '.join(rng.choices(WORDS, k=words) + [f'#{tag}' for tag in tags])
+
+
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def seed_graph(
+    users=1000, follows=20, tweets=10, likes=3, comments=1, hashtag_count=200,
+    alpha=1.1, days=7, seed=0, prefix='seed', batch_size=2000, log=None,
+):
+    """
+    Vygeneruje sociální graf s mocninným rozdělením popularity.
+
+    Koho uživatelé sledují, se losuje podle Zipfova rozdělení (váha 1/pořadí^alpha),
+    takže pár účtů má většinu sledujících. Počty sledovaných, tweetů, lajků
+    a komentářů mají těžký chvost kolem zadaných průměrů, hashtagy se losují
+    také podle Zipfa.
+
+    Vše se zapisuje přes bulk_create po dávkách bez signálů. Odvozená data
+    (timeline, vazby a trendy hashtagů, čítače, fulltext) se dopočítají na konci.
+    Vrací počty vytvořených řádků.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+    counts = {}
+
+    with transaction.atomic():
+        created = []
+        for batch in _batches(range(users), batch_size):
+            created += User.objects.bulk_create(
+                [User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=password) for i in batch]
+            )
+        user_ids = [user.pk for user in created]
+        Profile.objects.bulk_create(
+            [
+                Profile(user_id=pk, bio=_sentence(rng, rng.randint(0, 12)), location=rng.choice(LOCATIONS))
+                for pk in user_ids
+            ],
+            batch_size=batch_size,
+        )
+        counts['users'] = len(user_ids)
+        log(f'uživatelé: {len(user_ids)}')
+
+        # popularita: nahodne poradi, vaha 1/(poradi+1)^alpha
+        ranked = user_ids[:]
+        rng.shuffle(ranked)
+        popularity = list(accumulate(1 / (rank + 1) ** alpha for rank in range(len(ranked))))
+        followees = defaultdict(set)
+        for follower in user_ids:
+            wanted = _heavy_tailed(rng, follows, len(user_ids) - 1)
+            if not wanted:
+                continue
+            picked = followees[follower]
+            for following in rng.choices(ranked, cum_weights=popularity, k=wanted * 2):
+                if following != follower:
+                    picked.add(following)
+                    if len(picked) >= wanted:
+                        break
+        follow_rows = [
+            Follow(follower_id=follower, following_id=following)
+            for follower, picked in followees.items() for following in picked
+        ]
+        Follow.objects.bulk_create(follow_rows, batch_size=batch_size)
+        counts['follows'] = len(follow_rows)
+        log(f'sledování: {len(follow_rows)}')
+
+        # hashtagy: tag0 je nejcastejsi
+        tag_weights = list(accumulate(1 / (rank + 1) ** alpha for rank in range(hashtag_count)))
+        tweet_rows = []
+        for author in user_ids:
+            for _ in range(_heavy_tailed(rng, tweets, tweets * 50)):
+                tags = {f'tag{i}' for i in rng.choices(range(hashtag_count), cum_weights=tag_weights, k=rng.randint(0, 3))}
+                tweet_rows.append(Tweet(author_id=author, content=_sentence(rng, rng.randint(3, 12), sorted(tags))[:128]))
+        for tweet in tweet_rows:
+            tweet.created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        with explicit_timestamps(Tweet._meta.get_field('created_at')):
+            Tweet.objects.bulk_create(tweet_rows, batch_size=batch_size)
+        counts['tweets'] = len(tweet_rows)
+        log(f'tweety: {len(tweet_rows)}')
+
+        for batch in _batches(tweet_rows, batch_size):
+            hashtags.link_hashtags(batch)
+
+        like_rows, comment_rows = [], []
+        for tweet in tweet_rows:
+            for liker in set(rng.choices(user_ids, k=_heavy_tailed(rng, likes, len(user_ids)))):
+                like_rows.append(Like(user_id=liker, tweet_id=tweet.pk))
+            for _ in range(_heavy_tailed(rng, comments, 200)):
+                created_at = min(tweet.created_at + timedelta(minutes=rng.uniform(1, 600)), now)
+                comment_rows.append(Comment(
+                    tweet_id=tweet.pk, author_id=rng.choice(user_ids), content=_sentence(rng, rng.randint(2, 10)),
+                    created_at=created_at,
+                ))
+        Like.objects.bulk_create(like_rows, batch_size=batch_size)
+        with explicit_timestamps(Comment._meta.get_field('created_at')):
+            Comment.objects.bulk_create(comment_rows, batch_size=batch_size)
+        counts['likes'] = len(like_rows)
+        counts['comments'] = len(comment_rows)
+        log(f'lajky: {len(like_rows)}, komentáře: {len(comment_rows)}')
+
+        # jedno oznameni za kazde sledovani a komentar (bez slucovani)
+        author_of = {tweet.pk: tweet.author_id for tweet in tweet_rows}
+        notification_rows = [
+            Notification(recipient_id=row.following_id, sender_id=row.follower_id, notification_type='follow')
+            for row in follow_rows
+        ] + [
+            Notification(
+                recipient_id=author_of[comment.tweet_id], sender_id=comment.author_id, notification_type='comment',
+                tweet_id=comment.tweet_id, comment_id=comment.pk,
+            )
+            for comment in comment_rows if author_of[comment.tweet_id] != comment.author_id
+        ]
+        Notification.objects.bulk_create(notification_rows, batch_size=batch_size)
+        counts['notifications'] = len(notification_rows)
+
+        recount()
+        # bulk_create v jedne transakci dava souvisla ID
+        counts['timeline_entries'] = build_timelines(min(user_ids), max(user_ids)) if user_ids else 0
+        log(f'položky timeline: {counts["timeline_entries"]}')
+
+        backend = search.backend()
+        for batch in _batches(tweet_rows, batch_size):
+            backend.index_many('tweets', [(tweet.pk, (tweet.content,)) for tweet in batch])
+        profiles = Profile.objects.select_related('user').filter(user_id__in=user_ids)
+        backend.index_many('users', [(p.user_id, (p.user.username, p.bio, p.location)) for p in profiles])
+    return counts
+
+
+def build_timelines(first_user_id, last_user_id):
+    """
+    Naplní předpočítané timeline uživatelů v rozsahu ID, jako by každý tweet prošel fan-outem.
+
+    Jeden INSERT ... SELECT s oknem ROW_NUMBER, tweety celebrit se vynechají
+    (přimíchávají se až při čtení). Čítače sledujících už musí být přepočítané.
+    """
+    tables = {
+        name: connection.ops.quote_name(model._meta.db_table)
+        for name, model in (('entry', TimelineEntry), ('follow', Follow), ('profile', Profile), ('tweet', Tweet), ('user', User))
+    }
+    sql = f"""
+        INSERT INTO {tables['entry']} (user_id, tweet_id, created_at)
+        SELECT user_id, tweet_id, created_at FROM (
+            SELECT source.user_id, t.id AS tweet_id, t.created_at,
+                   ROW_NUMBER() OVER (PARTITION BY source.user_id ORDER BY t.created_at DESC, t.id DESC) AS position
+            FROM (
+                SELECT f.follower_id AS user_id, f.following_id AS author_id
+                FROM {tables['follow']} f JOIN {tables['profile']} p ON p.user_id = f.following_id
+                WHERE f.follower_id BETWEEN %s AND %s AND p.followers_count < %s
+                UNION ALL
+                SELECT id, id FROM {tables['user']} WHERE id BETWEEN %s AND %s
+            ) source
+            JOIN {tables['tweet']} t ON t.author_id = source.author_id
+        ) ranked
+        WHERE position <= %s
+    """
+    params = [first_user_id, last_user_id, timeline.celebrity_threshold(), first_user_id, last_user_id, timeline.max_length()]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """
+    Dočasně vypne auto_now_add, aby bulk_create zapsal časy z objektů.
+    """
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile, Follow, Notification, Like, Comment
+from .models import Profile, Follow, Notification, Like, Comment, Tweet, Hashtag
+from .counters import increment
+from . import cache, graph, images, notifications, search, tasks, timeline, trending
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
@@ -12,47 +14,247 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
+def save_profile(sender, instance, update_fields=None, **kwargs):
     """
     Uloží profil po aktualizaci uživatele.
     """
+    # prihlaseni uklada jen last_login, profil se nemeni
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
     instance.profile.save()
 
 @receiver(post_save, sender=Follow)
 def create_follow_notification(sender, instance, created, **kwargs):
     """
-    Vytvoří notifikaci o novém sledujícím.
+    Vytvoří (nebo sloučí) notifikaci o novém sledujícím.
     """
     if created:
-        Notification.objects.create(
-            recipient=instance.following,
-            sender=instance.follower,
-            notification_type='follow'
-        )
+        notifications.notify(instance.following_id, instance.follower_id, 'follow')
 
 @receiver(post_save, sender=Like)
 def create_like_notification(sender, instance, created, **kwargs):
     """
-    Vytvoří notifikaci o novém lajku.
+    Vytvoří (nebo sloučí) notifikaci o novém lajku.
     """
     if created:
-        Notification.objects.create(
-            recipient=instance.comment.author if instance.comment else instance.tweet.author,
-            sender=instance.user,
-            notification_type='like',
-            tweet=instance.tweet if instance.tweet else None,
-            comment=instance.comment if instance.comment else None
+        target = instance.comment if instance.comment_id else instance.tweet
+        notifications.notify(
+            target.author_id,
+            instance.user_id,
+            'like',
+            tweet_id=instance.tweet_id,
+            comment_id=instance.comment_id,
         )
 
 @receiver(post_save, sender=Comment)
 def create_comment_notification(sender, instance, created, **kwargs):
     """
-    Vytvoří notifikaci o novém komentáři.
+    Vytvoří (nebo sloučí) notifikaci o novém komentáři.
     """
     if created:
-        Notification.objects.create(
-            recipient=instance.tweet.author,
-            sender=instance.author,
-            notification_type='comment',
-            tweet=instance.tweet
-        )
\ No newline at end of file
+        notifications.notify(
+            instance.tweet.author_id,
+            instance.author_id,
+            'comment',
+            tweet_id=instance.tweet_id,
+            comment_id=instance.pk,
+        )
+
+@receiver(post_save, sender=Tweet)
+def fan_out_tweet(sender, instance, created, **kwargs):
+    """
+    Zapíše nový tweet do timeline autora a zařadí zápis do timeline sledujících.
+    """
+    if created:
+        timeline.add_own(instance)
+        tasks.enqueue('timeline.fan_out', key=f'timeline.fan_out:{instance.pk}', tweet_id=instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=Tweet)
+def generate_image_variants(sender, instance, **kwargs):
+    """
+    Zařadí vygenerování zmenšených variant nově nahraného obrázku.
+    """
+    field = 'profile_picture' if sender is Profile else 'image'
+    if images.needs_variants(instance, field):
+        label = sender._meta.label_lower
+        name = getattr(instance, field).name
+        tasks.enqueue(
+            'images.variants', key=f'images.variants:{label}:{instance.pk}:{name}',
+            model=label, pk=instance.pk, field=field,
+        )
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """
+    Zařadí doplnění tweetů nově sledovaného uživatele do timeline.
+    """
+    if created:
+        tasks.enqueue('timeline.backfill', follower_id=instance.follower_id, following_id=instance.following_id)
+
+@receiver(post_delete, sender=Follow)
+def evict_timeline(sender, instance, **kwargs):
+    """
+    Odstraní tweety už nesledovaného uživatele z timeline.
+    """
+    timeline.evict(instance.follower_id, instance.following_id)
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def update_like_counters(sender, instance, signal, created=False, counted=False, **kwargs):
+    """
+    Upraví počet lajků tweetu nebo komentáře.
+    """
+    if counted:
+        # citace uz upravil core.toggles ve stejne transakci
+        return
+    if signal is post_save and not created:
+        return
+    delta = 1 if created else -1
+    if instance.tweet_id:
+        increment(Tweet.objects.filter(pk=instance.tweet_id), 'likes_count', delta)
+    else:
+        increment(Comment.objects.filter(pk=instance.comment_id), 'likes_count', delta)
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_comment_counters(sender, instance, signal, created=False, **kwargs):
+    """
+    Upraví počet komentářů tweetu.
+    """
+    if signal is post_save and not created:
+        return
+    delta = 1 if created else -1
+    increment(Tweet.objects.filter(pk=instance.tweet_id), 'comments_count', delta)
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def update_follow_counters(sender, instance, signal, created=False, counted=False, **kwargs):
+    """
+    Upraví počty sledujících a sledovaných.
+    """
+    if counted:
+        # citace uz upravil core.toggles ve stejne transakci
+        return
+    if signal is post_save and not created:
+        return
+    delta = 1 if created else -1
+    increment(Profile.objects.filter(user_id=instance.following_id), 'followers_count', delta)
+    increment(Profile.objects.filter(user_id=instance.follower_id), 'following_count', delta)
+
+@receiver(post_save, sender=Tweet)
+@receiver(post_delete, sender=Tweet)
+def update_tweet_counters(sender, instance, signal, created=False, **kwargs):
+    """
+    Upraví počet tweetů autora.
+    """
+    if signal is post_save and not created:
+        return
+    delta = 1 if created else -1
+    increment(Profile.objects.filter(user_id=instance.author_id), 'tweets_count', delta)
+
+@receiver(pre_delete, sender=Tweet)
+def update_deleted_tweet_hashtags(sender, instance, **kwargs):
+    """
+    Vazby na hashtagy se při mazání tweetu smažou bez m2m_changed, proto se počty
+    (i okna trendů) snižují tady.
+    """
+    increment(Hashtag.objects.filter(tweets=instance), 'tweets_count', -1)
+    trending.forget(instance)
+
+@receiver(m2m_changed, sender=Hashtag.tweets.through)
+def update_hashtag_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Upraví počty tweetů hashtagů při změně vazeb tweet <-> hashtag.
+    """
+    if action == 'pre_clear':
+        # pri clear() neni pk_set znamy, vazby se musi zjistit pred smazanim
+        if reverse:
+            increment(Hashtag.objects.filter(tweets=instance), 'tweets_count', -1)
+        else:
+            increment(Hashtag.objects.filter(pk=instance.pk), 'tweets_count', -instance.tweets.count())
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        # instance je tweet, pk_set jsou hashtagy
+        increment(Hashtag.objects.filter(pk__in=pk_set), 'tweets_count', delta)
+    else:
+        # instance je hashtag, pk_set jsou tweety
+        increment(Hashtag.objects.filter(pk=instance.pk), 'tweets_count', delta * len(pk_set))
+
+@receiver(post_save, sender=Tweet)
+@receiver(post_delete, sender=Tweet)
+def invalidate_tweet_fragments(sender, instance, signal, created=False, **kwargs):
+    """
+    Zneplatní cache karty tweetu, při vzniku/smazání i hlavičku profilu autora (počet tweetů).
+    """
+    cache.invalidate('tweet', instance.pk)
+    if created or signal is post_delete:
+        cache.invalidate('profile', instance.author_id)
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_fragments(sender, instance, **kwargs):
+    """
+    Zneplatní cache hlavičky profilu a karet tweetů uživatele (avatar, jméno).
+    """
+    cache.invalidate('profile', instance.user_id)
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_fragments(sender, instance, **kwargs):
+    """
+    Zneplatní cache hlaviček profilů kvůli počtům sledujících.
+    """
+    cache.invalidate('profile', instance.follower_id)
+    cache.invalidate('profile', instance.following_id)
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_graph(sender, instance, **kwargs):
+    """
+    Zahodí seznamy sledovaných a sledujících z cache core.graph.
+    """
+    graph.invalidate(instance.follower_id, [instance.following_id])
+
+@receiver(post_save, sender=Tweet)
+def index_tweet(sender, instance, **kwargs):
+    """
+    Aktualizuje fulltextový index tweetů.
+    """
+    search.backend().index_tweet(instance)
+
+@receiver(post_delete, sender=Tweet)
+def unindex_tweet(sender, instance, **kwargs):
+    search.backend().remove('tweets', instance.pk)
+
+@receiver(post_save, sender=Profile)
+def index_profile(sender, instance, **kwargs):
+    """
+    Aktualizuje fulltextový index uživatelů (jméno, bio, lokace).
+    """
+    search.backend().index_profile(instance)
+
+@receiver(post_delete, sender=Profile)
+def unindex_profile(sender, instance, **kwargs):
+    search.backend().remove('users', instance.user_id)
+
+@receiver(post_save, sender=Hashtag)
+def index_hashtag(sender, instance, **kwargs):
+    """
+    Aktualizuje fulltextový index hashtagů.
+    """
+    search.backend().index_hashtag(instance)
+
+@receiver(post_delete, sender=Hashtag)
+def unindex_hashtag(sender, instance, **kwargs):
+    search.backend().remove('hashtags', instance.pk)
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_unread_notifications(sender, instance, **kwargs):
+    """
+    Zneplatní počet nepřečtených oznámení příjemce.
+    """
+    notifications.invalidate_unread(instance.recipient_id)
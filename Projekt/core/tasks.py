@@ -0,0 +1,171 @@
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# jmeno -> (funkce, max. pocet pokusu)
+_registry = {}
+
+# Jak casto worker bez prace maze stare hotove ulohy (sekundy)
+PURGE_INTERVAL = 600
+
+
+def always_eager():
+    return getattr(settings, 'TASKS_ALWAYS_EAGER', False)
+
+
+def retry_backoff():
+    return getattr(settings, 'TASKS_RETRY_BACKOFF_SECONDS', 2)
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, 'TASKS_LOCK_TIMEOUT_SECONDS', 300))
+
+
+def retention():
+    return timedelta(seconds=getattr(settings, 'TASKS_RETENTION_SECONDS', 24 * 3600))
+
+
+def task(name, max_attempts=5):
+    """
+    Zaregistruje funkci jako úlohu. Argumenty musí jít uložit do JSON.
+    """
+    def register(func):
+        _registry[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, key=None, delay=0, **kwargs):
+    """
+    Zařadí úlohu do fronty, ve stejné transakci jako zápis, který ji vyvolal.
+
+    Úloha se stejným `key` se zařadí jen jednou. S TASKS_ALWAYS_EAGER
+    se úloha rovnou provede.
+    """
+    func, max_attempts = _registry[name]
+    if always_eager():
+        func(**kwargs)
+        return
+    Task.objects.bulk_create(
+        [Task(
+            name=name,
+            kwargs=kwargs,
+            key=key,
+            max_attempts=max_attempts,
+            run_after=timezone.now() + timedelta(seconds=delay),
+        )],
+        ignore_conflicts=key is not None,
+    )
+
+
+def backoff(attempts):
+    """
+    Exponenciální čekání před dalším pokusem s náhodným rozptylem.
+    """
+    seconds = retry_backoff() * 2 ** (attempts - 1)
+    return timedelta(seconds=seconds * random.uniform(0.5, 1.5))
+
+
+def ready(now):
+    """
+    Podmínka na úlohy připravené ke spuštění (včetně zaseknutých ve stavu running).
+    """
+    return Q(status='queued', run_after__lte=now) | Q(status='running', locked_at__lt=now - lock_timeout())
+
+
+def claim(limit=10):
+    """
+    Zamkne až `limit` úloh připravených ke spuštění a vrátí je.
+
+    Úlohy zaseknuté ve stavu running déle než TASKS_LOCK_TIMEOUT_SECONDS
+    (spadlý worker) se berou jako znovu připravené.
+    """
+    now = timezone.now()
+    claimed = []
+    for pk, status in Task.objects.filter(ready(now)).order_by('run_after', 'id').values_list('pk', 'status')[:limit]:
+        # podmineny UPDATE: ulohu dostane jen jeden worker
+        if Task.objects.filter(pk=pk, status=status).filter(ready(now)).update(
+            status='running', locked_at=now, attempts=F('attempts') + 1
+        ):
+            claimed.append(pk)
+    return list(Task.objects.filter(pk__in=claimed))
+
+
+def run(task_row):
+    """
+    Provede jednu zamčenou úlohu a zapíše výsledek (hotovo, nový pokus, selhání).
+    """
+    try:
+        func, _ = _registry[task_row.name]
+        with transaction.atomic():
+            func(**task_row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if task_row.attempts < task_row.max_attempts:
+            logger.warning('Task %s #%s failed (attempt %s), retrying', task_row.name, task_row.pk, task_row.attempts)
+            Task.objects.filter(pk=task_row.pk).update(
+                status='queued', run_after=timezone.now() + backoff(task_row.attempts), last_error=error,
+            )
+        else:
+            logger.error('Task %s #%s failed permanently', task_row.name, task_row.pk)
+            Task.objects.filter(pk=task_row.pk).update(status='failed', finished_at=timezone.now(), last_error=error)
+        return False
+    Task.objects.filter(pk=task_row.pk).update(status='done', finished_at=timezone.now())
+    return True
+
+
+def run_pending(limit=100):
+    """
+    Zpracuje připravené úlohy v aktuálním procesu, vrací počet zpracovaných.
+    """
+    processed = 0
+    while processed < limit:
+        batch = claim(min(10, limit - processed))
+        if not batch:
+            break
+        for task_row in batch:
+            run(task_row)
+        processed += len(batch)
+    return processed
+
+
+def purge():
+    """
+    Smaže hotové úlohy starší než TASKS_RETENTION_SECONDS.
+
+    Klíče idempotence se tím uvolní, proto se drží déle než trvá opakování.
+    """
+    return Task.objects.filter(status='done', finished_at__lt=timezone.now() - retention()).delete()[0]
+
+
+def work(poll_interval=1.0, batch_size=10, stop=None, once=False):
+    """
+    Smyčka workeru: zpracovává úlohy, když nic nečeká, chvíli spí.
+
+    `stop` je událost (threading/multiprocessing.Event), která smyčku ukončí.
+    S `once` skončí, jakmile není co dělat.
+    """
+    last_purge = 0.0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        processed = run_pending(batch_size)
+        if once and not processed:
+            return
+        if processed:
+            continue
+        if time.monotonic() - last_purge > PURGE_INTERVAL:
+            purge()
+            last_purge = time.monotonic()
+        if stop is not None:
+            stop.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,46 @@
+from django import template
+from django.template.base import token_kwargs
+from django.utils.safestring import mark_safe
+from core import cache
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, dependencies):
+        self.nodelist = nodelist
+        self.name = name
+        self.dependencies = dependencies
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        dependencies = [(kind, value.resolve(context)) for kind, value in self.dependencies.items()]
+        key = cache.fragment_key(name, dependencies)
+        value = cache.get_fragment(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set_fragment(key, value)
+        return mark_safe(value)
+
+
+@register.tag('cachefragment')
+def do_cachefragment(parser, token):
+    """
+    Uloží vykreslený fragment do cache s klíčem podle verzí objektů, na kterých závisí.
+
+    {% cachefragment "tweet_card" tweet=tweet.pk profile=tweet.author_id %} ... {% endcachefragment %}
+
+    Verze zvyšují receivery v core.signals, takže fragment nemá pevnou expiraci.
+    Obsah nesmí záviset na přihlášeném uživateli (CSRF token, stav lajku).
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' vyžaduje název a alespoň jednu závislost.")
+    name = parser.compile_filter(bits[1])
+    remaining = bits[2:]
+    dependencies = token_kwargs(remaining, parser)
+    if remaining or not dependencies:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' očekává závislosti ve tvaru druh=hodnota.")
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return FragmentCacheNode(nodelist, name, dependencies)
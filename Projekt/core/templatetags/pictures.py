@@ -0,0 +1,58 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.urls import reverse
+from django.utils.html import format_html
+from core import images
+
+register = template.Library()
+
+
+def _srcset(candidates):
+    return ', '.join(f'{url} {width}w' for width, url in candidates)
+
+
+def _fallback(candidates, display_width):
+    # nejmensi varianta, ktera pokryje i 2x displej, jinak nejvetsi
+    for width, url in candidates:
+        if width >= display_width * 2:
+            return url
+    return candidates[-1][1]
+
+
+@register.simple_tag
+def picture(image, display_width, sizes=None, **attrs):
+    """
+    Vykreslí obrázek s WebP a JPEG variantami ve srcset.
+
+    {% picture tweet.author.profile.profile_picture 50 alt=tweet.author.username class="rounded-circle" width=50 %}
+
+    `display_width` je šířka na stránce v CSS px, bez `sizes` se použije přímo.
+    Obrázky bez vygenerovaných variant jdou přes resize endpoint.
+    """
+    if not image:
+        return ''
+    kind, variants_field = images.field_info(image)
+    variants = getattr(image.instance, variants_field)
+    sizes = sizes or f'{display_width}px'
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    if variants.get('source') != image.name:
+        candidates = [
+            (width, reverse('resized_image', args=[kind, width, image.name]))
+            for width in images.allowed_widths(kind)
+        ]
+        return format_html(
+            '<img src="{}" srcset="{}" sizes="{}"{}>',
+            _fallback(candidates, display_width), _srcset(candidates), sizes, flatatt(attrs),
+        )
+
+    def candidates(fmt):
+        return sorted((int(width), default_storage.url(name)) for width, name in variants[fmt].items())
+
+    jpeg = candidates('jpeg')
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(candidates('webp')), sizes, _fallback(jpeg, display_width), _srcset(jpeg), sizes, flatatt(attrs),
+    )
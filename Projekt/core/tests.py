@@ -1,3 +1,922 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import timedelta
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache as default_cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .management.commands import bench_suite
+from .models import Profile, Tweet, Comment, Like, Hashtag, HashtagBucket, Follow, Notification, TimelineEntry, Task
+from .seed import seed_graph
+from . import batch, export, graph, metrics, notifications, tasks, timeline, toggles, trending
+from . import cache as fragment_store
 
-# Create your tests here.
+
+@contextmanager
+def two_workers(alias):
+    """
+    Dvě instance téže souborové cache, jako by ji sdílely dva workery (settings_production).
+    """
+    location = tempfile.mkdtemp()
+    config = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+    try:
+        with override_settings(CACHES={**settings.CACHES, alias: config}):
+            yield caches.create_connection(alias), caches.create_connection(alias)
+    finally:
+        shutil.rmtree(location, ignore_errors=True)
+
+
+@contextmanager
+def file_database(alias='default'):
+    """
+    Přepne pamětovou testovací DB na její kopii v dočasném souboru.
+
+    Sdílená pamětová DB zamyká celé tabulky a na zámek nečeká, souběžné zápisy
+    z více vláken proto potřebují soubor. Ostatní testy zůstávají v paměti.
+    """
+    wrapper = connections[alias]
+    if wrapper.vendor != 'sqlite' or not wrapper.is_in_memory_db():
+        yield
+        return
+    directory = tempfile.mkdtemp()
+    path = f'{directory}/test.sqlite3'
+    wrapper.ensure_connection()
+    with sqlite3.connect(path) as target:
+        wrapper.connection.backup(target)
+    target.close()
+    # i zrcadla (TEST MIRROR) sdileji settings_dict, prepnou se spolu s hlavnim spojenim
+    wrappers = [connections[name] for name in connections if connections[name].settings_dict is wrapper.settings_dict]
+    # pametova spojeni se nezaviraji, jinak by DB zanikla, jen se odlozi
+    held = [(each, each.connection) for each in wrappers]
+    memory_name = wrapper.settings_dict['NAME']
+    for each in wrappers:
+        each.connection = None
+    wrapper.settings_dict['NAME'] = path
+    try:
+        yield
+    finally:
+        for each in wrappers:
+            each.close()
+        wrapper.settings_dict['NAME'] = memory_name
+        for each, held_connection in held:
+            each.connection = held_connection
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class ApiQueryCountTests(TestCase):
+    """
+    Seznamy v API musí mít konstantní počet dotazů bez ohledu na počet řádků.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='heslo')
+        cls.tweet = Tweet.objects.create(author=cls.user, content='prvni #test')
+        cls.tweet.extract_hashtags()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_activity(self, n):
+        for i in range(n):
+            author = User.objects.create(username=f'author{User.objects.count()}')
+            tweet = Tweet.objects.create(author=author, content=f'tweet {i} #test')
+            tweet.extract_hashtags()
+            Like.objects.create(user=self.user, tweet=tweet)
+            Comment.objects.create(tweet=self.tweet, author=author, content=f'komentar {i}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def assertConstantQueries(self, url):
+        few = self.count_queries(url)
+        self.add_activity(10)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_list_tweets(self):
+        # session + uzivatel (kvuli liked_by_me) + jeden dotaz na celou stranku tweetu
+        self.add_activity(10)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/tweets')
+        items = response.json()['items']
+        self.assertEqual(len(items), 11)
+        self.assertEqual(sum(item['liked_by_me'] for item in items), 10)
+
+    def test_list_tweets_constant(self):
+        self.assertConstantQueries('/api/tweets')
+
+    def test_hashtag_tweets_constant(self):
+        self.assertConstantQueries('/api/hashtags/test')
+
+    def test_tweet_comments_constant(self):
+        self.assertConstantQueries(f'/api/tweets/{self.tweet.pk}/comments')
+
+    def test_list_hashtags_constant(self):
+        self.assertConstantQueries('/api/hashtags')
+
+    def test_counts_are_correct(self):
+        self.add_activity(3)
+        item = self.client.get(f'/api/tweets/{self.tweet.pk}').json()
+        self.assertEqual(item['comments_count'], 3)
+        self.assertEqual(item['likes_count'], 0)
+        self.assertEqual(item['author']['username'], 'reader')
+        hashtag = self.client.get('/api/hashtags').json()[0]
+        self.assertEqual(hashtag['tweets_count'], Hashtag.objects.get(name='test').tweets.count())
+
+
+class HotQueryPlanTests(TestCase):
+    """
+    Dotazy horkých cest musí jít přes index, ne přes celou tabulku.
+    """
+    def test_no_full_scans(self):
+        user = User.objects.create_user('planner')
+        Tweet.objects.create(author=user, content='plan #test').extract_hashtags()
+        call_command('explain_hot_queries', stdout=StringIO())
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class ImageVariantTests(TestCase):
+    """
+    Nahrané obrázky dostanou zmenšené varianty, starší jdou přes resize endpoint.
+    """
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_RESIZE_CACHE_DIR=f'{self.media_root}/cache',
+            MEDIA_X_ACCEL_REDIRECT_PREFIX=None,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('painter')
+
+    def upload(self, size, name='photo.png'):
+        output = BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(output, 'PNG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+    def test_variants_generated_on_upload(self):
+        tweet = Tweet.objects.create(author=self.user, content='obrazek', image=self.upload((1000, 500)))
+        tweet.refresh_from_db()
+        self.assertEqual(tweet.image_variants['source'], tweet.image.name)
+        # sirka 1280 je vetsi nez original
+        self.assertEqual(sorted(tweet.image_variants['webp']), ['320', '640'])
+        with Image.open(f"{self.media_root}/{tweet.image_variants['jpeg']['320']}") as variant:
+            self.assertEqual((variant.format, variant.size), ('JPEG', (320, 160)))
+
+        html = Template('{% load pictures %}{% picture tweet.image 600 alt="x" %}').render(Context({'tweet': tweet}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-tweet-640.webp 640w', html)
+
+    def test_same_content_shares_variants(self):
+        first = Tweet.objects.create(author=self.user, content='a', image=self.upload((400, 400), 'a.png'))
+        second = Tweet.objects.create(author=self.user, content='b', image=self.upload((400, 400), 'b.png'))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants['webp'], second.image_variants['webp'])
+
+    def test_avatar_is_square(self):
+        profile = self.user.profile
+        profile.profile_picture = self.upload((300, 200))
+        profile.save()
+        profile.refresh_from_db()
+        with Image.open(f"{self.media_root}/{profile.profile_picture_variants['webp']['128']}") as variant:
+            self.assertEqual(variant.size, (128, 128))
+
+    def test_resize_endpoint(self):
+        name = Profile._meta.get_field('profile_picture').get_default()
+        with open(f'{self.media_root}/{name}', 'wb') as f:
+            Image.new('RGB', (500, 500), 'blue').save(f, 'JPEG')
+        html = Template('{% load pictures %}{% picture profile.profile_picture 50 %}').render(
+            Context({'profile': self.user.profile})
+        )
+        self.assertIn(f'/img/avatar/128/{name}', html)
+
+        response = self.client.get(f'/img/avatar/128/{name}', HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Vary'], 'Accept')
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as resized:
+            self.assertEqual(resized.size, (128, 128))
+
+        self.assertEqual(self.client.get(f'/img/avatar/100/{name}').status_code, 404)
+        self.assertEqual(self.client.get('/img/avatar/128/../y/settings.py').status_code, 404)
+
+    def test_resize_endpoint_rejects_decompression_bomb(self):
+        name = Profile._meta.get_field('profile_picture').get_default()
+        with open(f'{self.media_root}/{name}', 'wb') as f:
+            Image.new('RGB', (100, 100), 'blue').save(f, 'JPEG')
+        # 10 000 px je vic nez dvojnasobek limitu, Pillow vyhodi DecompressionBombError
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            response = self.client.get(f'/img/avatar/128/{name}')
+        self.assertEqual(response.status_code, 404)
+
+
+class MediaServingTests(TestCase):
+    """
+    Média s hashem obsahu v názvu, ETag/304 a Range.
+    """
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_X_ACCEL_REDIRECT_PREFIX=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_upload_name_contains_content_hash(self):
+        first = default_storage.save('tweet_images/a.txt', ContentFile(b'stejny obsah'))
+        second = default_storage.save('tweet_images/a.txt', ContentFile(b'stejny obsah'))
+        self.assertRegex(first, r'^tweet_images/a\.[0-9a-f]{12}\.txt$')
+        self.assertEqual(first, second)
+
+        response = self.client.get(f'/media/{first}')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content), b'stejny obsah')
+
+    def test_name_looking_hashed_is_hashed_again(self):
+        # nazev od uzivatele nesmi obejit hashovani, jinak by se jiny obsah posilal jako immutable
+        name = default_storage.save('tweet_images/a.0123456789ab.txt', ContentFile(b'obsah'))
+        self.assertRegex(name, r'^tweet_images/a\.0123456789ab\.[0-9a-f]{12}\.txt$')
+
+    def test_conditional_and_range(self):
+        with open(f'{self.media_root}/default.jpg', 'wb') as f:
+            f.write(bytes(range(100)))
+        response = self.client.get('/media/default.jpg')
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        etag = response['ETag']
+
+        response = self.client.get('/media/default.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get('/media/default.jpg', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+        response = self.client.get('/media/default.jpg', HTTP_RANGE='bytes=-5', HTTP_IF_RANGE='"jiny"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/media/default.jpg', HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+
+        with self.settings(MEDIA_X_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get('/media/default.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/default.jpg')
+        self.assertEqual(response.content, b'')
+
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+@override_settings(TASKS_ALWAYS_EAGER=False, TASKS_RETRY_BACKOFF_SECONDS=10)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        registry = {
+            'tests.ok': (lambda **kwargs: self.calls.append(kwargs), 5),
+            'tests.fail': (self.fail_task, 2),
+        }
+        patcher = mock.patch.dict(tasks._registry, registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fail_task(self, **kwargs):
+        raise RuntimeError('nejde to')
+
+    def test_enqueue_with_key_is_deduplicated(self):
+        tasks.enqueue('tests.ok', key='jednou', value=1)
+        tasks.enqueue('tests.ok', key='jednou', value=2)
+        tasks.enqueue('tests.ok', value=3)
+        tasks.enqueue('tests.ok', value=3)
+        self.assertEqual(Task.objects.filter(key='jednou').count(), 1)
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(tasks.run_pending(), 3)
+        self.assertEqual(self.calls, [{'value': 1}, {'value': 3}, {'value': 3}])
+        self.assertEqual(set(Task.objects.values_list('status', flat=True)), {'done'})
+        # dokud hotova uloha nezmizi (purge), klic ji nepusti znovu
+        tasks.enqueue('tests.ok', key='jednou', value=4)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_failure_is_retried_with_backoff(self):
+        tasks.enqueue('tests.fail')
+        before = timezone.now()
+        self.assertEqual(tasks.run_pending(), 1)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: nejde to', task.last_error)
+        # prvni opakovani za 10 s * nahodny rozptyl 0.5 az 1.5
+        self.assertGreaterEqual(task.run_after, before + timedelta(seconds=5))
+        self.assertLessEqual(task.run_after, timezone.now() + timedelta(seconds=15))
+        # pred run_after ji worker nevezme
+        self.assertEqual(tasks.run_pending(), 0)
+        with mock.patch('random.uniform', return_value=1.0):
+            self.assertEqual(tasks.backoff(3), timedelta(seconds=40))
+
+    def test_own_tweet_is_in_timeline_without_worker(self):
+        author = User.objects.create_user('pisatel')
+        tweet = Tweet.objects.create(author=author, content='hned videt')
+        self.assertTrue(TimelineEntry.objects.filter(user=author, tweet=tweet).exists())
+        self.assertTrue(Task.objects.filter(name='timeline.fan_out').exists())
+
+    def test_permanent_failure_after_max_attempts(self):
+        tasks.enqueue('tests.fail')
+        for _ in range(2):
+            Task.objects.update(run_after=timezone.now())
+            self.assertEqual(tasks.run_pending(), 1)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), ('failed', 2))
+        self.assertIsNotNone(task.finished_at)
+        Task.objects.update(run_after=timezone.now())
+        self.assertEqual(tasks.run_pending(), 0)
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class MetricsTests(TestCase):
+    """
+    Middleware a Ninja hook plní histogramy na /metrics.
+    """
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user('measured')
+        Tweet.objects.create(author=self.user, content='mereni #test')
+        self.client.force_login(self.user)
+
+    def test_views_and_api_are_measured(self):
+        self.client.get('/')
+        self.client.get('/api/tweets')
+        self.client.get('/api/sync/tweets')
+        self.assertGreater(metrics.histogram('y_request_db_queries', 'timeline', 'GET').quantile(0.5), 1)
+        self.assertGreater(metrics.histogram('y_request_template_seconds', 'timeline', 'GET').sum, 0)
+        for endpoint in ('api:list_tweets', 'api:list_tweets_sync'):
+            self.assertGreater(metrics.histogram('y_request_db_queries', endpoint, 'GET').quantile(0.5), 1)
+
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('y_requests_total{endpoint="timeline",method="GET",status="200"} 1', body)
+        self.assertIn('y_request_duration_seconds_count{endpoint="api:list_tweets",method="GET"} 1', body)
+        self.assertIn('y_response_size_bytes_bucket{endpoint="api:list_tweets",method="GET",le="+Inf"} 1', body)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_require_staff_or_token(self):
+        # testovaci klient chodi z 127.0.0.1 jako requesty pres reverzni proxy
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    async def test_async_client(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get('/api/tweets')
+        self.assertGreater(metrics.histogram('y_request_db_queries', 'api:list_tweets', 'GET').count, 0)
+        self.assertGreater(metrics.histogram('y_request_db_queries', 'api:list_tweets', 'GET').quantile(0.5), 1)
+
+    def test_slow_request_is_logged_with_sql(self):
+        with self.settings(METRICS_SLOW_REQUEST_SECONDS=0), self.assertLogs('core.metrics', 'WARNING') as logs:
+            self.client.get('/api/sync/tweets')
+        self.assertIn('api:list_tweets_sync', logs.output[0])
+        self.assertIn('FROM "core_tweet"', logs.output[0])
+
+    def test_histogram_quantiles(self):
+        hist = metrics.Histogram(2 ** -10, 2 ** 4)
+        for i in range(1, 1001):
+            hist.observe(i / 1000)
+        # relativni chyba nejvys 1/4
+        self.assertLessEqual(abs(hist.quantile(0.5) - 0.5) / 0.5, 0.25)
+        self.assertLessEqual(abs(hist.quantile(0.99) - 0.99) / 0.99, 0.25)
+
+
+class SeedGraphTests(TestCase):
+    """
+    Generátor grafu a benchmark nad malým grafem.
+    """
+    def setUp(self):
+        self.rows = seed_graph(users=40, follows=5, tweets=4, likes=2, hashtag_count=10, seed=1)
+
+    def test_graph_is_consistent(self):
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), self.rows['follows'])
+        for profile in Profile.objects.all():
+            self.assertEqual(profile.followers_count, Follow.objects.filter(following_id=profile.user_id).count())
+        tweet = Tweet.objects.order_by('-likes_count').first()
+        self.assertEqual(tweet.likes_count, Like.objects.filter(tweet=tweet).count())
+        self.assertEqual(TimelineEntry.objects.count(), self.rows['timeline_entries'])
+        self.assertGreater(self.rows['timeline_entries'], 0)
+        # casy jsou rozlozene, ne vsechny z jednoho okamziku
+        self.assertGreater(Tweet.objects.values('created_at').distinct().count(), self.rows['tweets'] // 2)
+
+    def test_bench_suite_covers_views_and_api(self):
+        results = bench_suite.run_endpoints(User.objects.get(username='seed0'), 2)
+        self.assertIn('timeline', results)
+        self.assertIn('api:list_tweets', results)
+        self.assertIn('api:delete_tweet', results)
+        for name, result in results.items():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertTrue(set(result['statuses']) <= {200, 204, 302, 403}, name)
+        self.assertGreater(results['timeline']['queries'], 0)
+        # export se streamuje, dotazy na kazdou tabulku probehnou az pri cteni tela
+        self.assertGreaterEqual(results['api:export_current_user']['queries'], len(export.DATASETS))
+
+
+class ConditionalApiTests(TestCase):
+    """
+    ETag a 304 pro čtecí endpointy API.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('cached')
+        self.tweet = Tweet.objects.create(author=self.user, content='podminene #etag')
+        self.client.force_login(self.user)
+
+    def test_not_modified_skips_serialization(self):
+        for url in (f'/api/tweets/{self.tweet.pk}', f'/api/sync/tweets/{self.tweet.pk}'):
+            response = self.client.get(url)
+            self.assertEqual(response['Cache-Control'], 'private, no-cache')
+            self.assertIn('Cookie', response['Vary'])
+            with CaptureQueriesContext(connection) as queries:
+                cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached['ETag'], response['ETag'])
+            # session, uzivatel a jeden dotaz na validatory, tweet se nenacita
+            self.assertFalse(any('"core_tweet"."content"' in query['sql'] for query in queries.captured_queries))
+
+    def test_etag_follows_counters_and_edits(self):
+        url = f'/api/tweets/{self.tweet.pk}'
+        etag = self.client.get(url)['ETag']
+        Like.objects.create(user=self.user, tweet=self.tweet)
+        liked = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(liked.status_code, 200)
+        self.assertNotEqual(liked['ETag'], etag)
+
+        profile_url = f'/api/users/@{self.user.username}'
+        response = self.client.get(profile_url)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        self.assertEqual(
+            self.client.get(profile_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304,
+        )
+        self.user.profile.bio = 'nové bio'
+        self.user.profile.save()
+        self.assertEqual(self.client.get(profile_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_hashtags_and_missing_objects(self):
+        Hashtag.objects.create(name='etag')
+        response = self.client.get('/api/hashtags')
+        self.assertEqual(self.client.get('/api/hashtags', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Hashtag.objects.filter(name='etag').update(tweets_count=5)
+        self.assertEqual(self.client.get('/api/hashtags', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/api/tweets/0').status_code, 404)
+
+
+# oznameni jen zarazena do fronty (nezavisle na DEBUG a Y_TASKS_EAGER)
+@override_settings(TASKS_ALWAYS_EAGER=False)
+class ToggleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('toggler')
+        self.author = User.objects.create_user('author')
+        self.tweet = Tweet.objects.create(author=self.author, content='prepinani')
+
+    def test_like_toggle_returns_state_and_count(self):
+        self.assertEqual(toggles.toggle_like(self.user.pk, tweet_id=self.tweet.pk), (True, 1))
+        # ostatni receivery (oznameni) bezi dal
+        self.assertTrue(Task.objects.filter(name='notifications.write').exists())
+        self.assertEqual(toggles.toggle_like(self.user.pk, tweet_id=self.tweet.pk), (False, 0))
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_follow_toggle_updates_both_profiles(self):
+        self.assertEqual(toggles.toggle_follow(self.user.pk, self.author.pk), (True, 1))
+        self.assertEqual(Profile.objects.get(user=self.user).following_count, 1)
+        self.assertEqual(toggles.toggle_follow(self.user.pk, self.author.pk), (False, 0))
+        self.assertEqual(Profile.objects.get(user=self.user).following_count, 0)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_api_like_uses_returned_count(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/api/tweets/{self.tweet.pk}/like')
+        self.assertEqual(response.json()['likes_count'], 1)
+        self.assertTrue(response.json()['liked_by_me'])
+        self.assertFalse(any(query['sql'].startswith('SELECT "core_tweet"."likes_count"') for query in queries.captured_queries))
+
+
+class ToggleConcurrencyTests(TransactionTestCase):
+    """
+    Souběžná přepnutí stejných dvojic nesmí skončit IntegrityError ani rozbít čítače.
+    """
+    threads = 8
+    rounds = 5
+
+    def setUp(self):
+        self.enterContext(file_database())
+
+    def test_concurrent_toggles_keep_counters_consistent(self):
+        author = User.objects.create_user('celebrity')
+        users = [User.objects.create_user(f'fan{i}') for i in range(self.threads)]
+        tweet = Tweet.objects.create(author=author, content='souběh')
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def work(user):
+            try:
+                barrier.wait()
+                for i in range(self.rounds):
+                    toggles.toggle_like(user.pk, tweet_id=tweet.pk)
+                    # dvojklik: stejny uzivatel dvakrat tesne po sobe z jineho vlakna
+                    toggles.toggle_like(users[(users.index(user) + i) % len(users)].pk, tweet_id=tweet.pk)
+                    toggles.toggle_follow(user.pk, author.pk)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        tweet.refresh_from_db()
+        self.assertEqual(tweet.likes_count, Like.objects.filter(tweet=tweet).count())
+        profile = Profile.objects.get(user=author)
+        self.assertEqual(profile.followers_count, Follow.objects.filter(following=author).count())
+        # kazdy sledovani prepnul lichy pocet krat
+        self.assertEqual(profile.followers_count, self.threads)
+        for user in users:
+            self.assertEqual(Profile.objects.get(user=user).following_count, 1)
+
+
+# oznameni jen zarazena do fronty (nezavisle na DEBUG a Y_TASKS_EAGER)
+@override_settings(TASKS_ALWAYS_EAGER=False)
+class BatchApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('syncer')
+        self.authors = [User.objects.create_user(f'writer{i}') for i in range(3)]
+        self.tweets = [Tweet.objects.create(author=author, content=f'tweet {i}') for i, author in enumerate(self.authors)]
+        self.client.force_login(self.user)
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+        settings_override = override_settings(API_IMPORT_SPOOL_DIR=self.spool_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def post(self, url, payload):
+        return self.client.post(url, payload, content_type='application/json')
+
+    def test_like_batch(self):
+        first, second, third = (tweet.pk for tweet in self.tweets)
+        Like.objects.create(user=self.user, tweet_id=third)
+        response = self.post('/api/likes/batch', {'like': [first, second, first], 'unlike': [third]})
+        self.assertEqual(response.json()['likes_count'], {str(first): 1, str(second): 1, str(third): 0})
+        # uz platny stav se preskoci
+        self.assertEqual(self.post('/api/likes/batch', {'like': [first]}).json()['likes_count'], {str(first): 1})
+        self.assertEqual(Like.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Task.objects.filter(name='notifications.write').exists())
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_concurrent_like_is_not_notified_twice(self):
+        first, second = self.tweets[0].pk, self.tweets[1].pk
+        insert = batch._insert
+
+        def racing(model, rows, returning):
+            # soubezny request lajkne prvni tweet mezi kontrolou a zapisem
+            Like.objects.bulk_create([Like(user=self.user, tweet_id=first)])
+            return insert(model, rows, returning)
+
+        with mock.patch.object(batch, '_insert', racing):
+            response = self.post('/api/likes/batch', {'like': [first, second]})
+        self.assertEqual(response.json()['likes_count'], {str(first): 1, str(second): 1})
+        self.assertEqual(
+            list(Notification.objects.values_list('recipient__username', flat=True)), ['writer1'],
+        )
+
+    def test_invalid_batch_writes_nothing(self):
+        response = self.post('/api/likes/batch', {'like': [self.tweets[0].pk, 0]})
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Like.objects.exists())
+        response = self.post('/api/likes/batch', {'like': [self.tweets[0].pk], 'unlike': [self.tweets[0].pk]})
+        self.assertEqual(response.status_code, 422)
+        response = self.post('/api/follows/batch', {'follow': ['writer0', 'nobody']})
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_batch(self):
+        Follow.objects.create(follower=self.user, following=self.authors[2])
+        response = self.post('/api/follows/batch', {'follow': ['writer0', 'writer1'], 'unfollow': ['writer2']})
+        self.assertEqual(response.json()['following'], ['writer0', 'writer1'])
+        self.assertEqual(Profile.objects.get(user=self.user).following_count, 2)
+        self.assertEqual(Profile.objects.get(user=self.authors[0]).followers_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.authors[2]).followers_count, 0)
+        self.assertEqual(self.post('/api/follows/batch', {'follow': ['syncer']}).status_code, 422)
+
+    def test_import_ndjson(self):
+        lines = [
+            '{"author": "writer0", "content": "stary tweet #import", "created_at": "2020-01-02T03:04:05Z"}',
+            '',
+            '{"author": "writer1", "content": "bez casu"}',
+        ]
+        Follow.objects.create(follower=self.user, following=self.authors[0])
+        self.assertEqual(self.client.post('/api/tweets/import', '\n'.join(lines), content_type='application/x-ndjson').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post('/api/tweets/import', '\n'.join(lines), content_type='application/x-ndjson')
+        self.assertEqual((response.status_code, response.json()), (202, {'queued': 2}))
+        self.assertFalse(Tweet.objects.filter(content='bez casu').exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.run_pending()
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        tweet = Tweet.objects.get(content='stary tweet #import')
+        self.assertEqual(tweet.created_at.year, 2020)
+        self.assertEqual(list(tweet.hashtags.values_list('name', flat=True)), ['import'])
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user, tweet=tweet).exists())
+        self.assertEqual(Profile.objects.get(user=self.authors[0]).tweets_count, 2)
+
+    def test_import_rejects_whole_file(self):
+        self.user.is_staff = True
+        self.user.save()
+        lines = '{"author": "writer0", "content": "ok"}\n{"author": "writer0"}\nnot json\n{"author": "ghost", "content": "x"}'
+        response = self.client.post('/api/tweets/import', lines, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual([error['loc'] for error in response.json()['detail']], [['body', 2], ['body', 3], ['body']])
+        self.assertEqual(Tweet.objects.count(), 3)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        self.assertFalse(Task.objects.filter(name='tweets.import').exists())
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', is_staff=True, is_superuser=True)
+        self.other = User.objects.create_user('friend')
+        self.tweet = Tweet.objects.create(author=self.user, content='můj tweet')
+        Comment.objects.create(tweet=self.tweet, author=self.user, content='komentar')
+        Like.objects.create(user=self.user, tweet=Tweet.objects.create(author=self.other, content='cizi'))
+        Follow.objects.create(follower=self.other, following=self.user)
+        self.client.force_login(self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_contains_all_user_data(self):
+        response = self.client.get('/api/users/me/export')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['type'] for row in rows], ['tweets', 'comments', 'likes', 'follows', 'notifications'])
+        self.assertEqual(rows[0]['content'], 'můj tweet')
+        self.assertEqual(rows[3]['follower_username'], 'friend')
+        self.assertEqual(rows[4]['notification_type'], 'follow')
+
+    def test_csv_gzip_and_include(self):
+        response = self.client.get('/api/users/me/export?format=csv&gzip=true&include=tweets&include=likes')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="exporter-export.csv.gz"')
+        rows = list(csv.reader(gzip.decompress(self.read(response)).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['type', 'id', 'author_username'])
+        self.assertEqual([row[0] for row in rows[1:]], ['tweets', 'likes'])
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/users/me/export').status_code, 401)
+
+    def test_one_streamed_query_per_dataset(self):
+        Tweet.objects.bulk_create([Tweet(author=self.user, content=f't{i}') for i in range(30)])
+        with CaptureQueriesContext(connection) as queries:
+            lines = self.read(export.response(export.user_parts(self.user.pk, ['tweets']))).splitlines()
+        self.assertEqual(len(lines), 31)
+        self.assertEqual(len(queries), 1)
+
+    def test_admin_action(self):
+        response = self.client.post('/admin/core/follow/', {
+            'action': 'export_csv', '_selected_action': Follow.objects.values_list('pk', flat=True),
+        })
+        rows = list(csv.reader(self.read(response).decode().splitlines()))
+        self.assertEqual(rows[1][2:4], ['friend', 'exporter'])
+
+
+# sablony adminu odkazuji na static, v settings_production by chybel manifest
+@override_settings(STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+
+    def add_likes(self, n):
+        for _ in range(n):
+            author = User.objects.create_user(f'author{User.objects.count()}')
+            tweet = Tweet.objects.create(author=author, content='tweet')
+            comment = Comment.objects.create(tweet=tweet, author=author, content='komentar')
+            Like.objects.create(user=self.admin, tweet=tweet)
+            Like.objects.create(user=self.admin, comment=comment)
+
+    def queries(self, url):
+        self.client.get(url)  # zahreje cache citace neprectenych oznameni
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_constant_queries(self):
+        for url in ('/admin/core/like/', '/admin/core/tweet/'):
+            self.add_likes(2)
+            before = self.queries(url)
+            self.add_likes(5)
+            self.assertEqual(self.queries(url), before, url)
+
+    @override_settings(ADMIN_COUNT_LIMIT=3)
+    def test_estimated_count(self):
+        self.add_likes(4)
+        max_pk = Like.objects.order_by('-pk').first().pk
+        self.assertContains(self.client.get('/admin/core/like/'), f'≈ {max_pk} ')
+        self.assertContains(self.client.get('/admin/core/tweet/?q=tweet'), '≈ 3 ')
+        self.assertContains(self.client.get('/admin/core/tweet/?q=nic'), '0 tweets')
+
+    def test_cursor_pages(self):
+        self.add_likes(3)
+        expected = list(Tweet.objects.values_list('pk', flat=True))
+        with mock.patch.object(admin.site._registry[Tweet], 'list_per_page', 2):
+            first = self.client.get('/admin/core/tweet/').context['cl']
+            second = self.client.get('/admin/core/tweet/' + first.next_page_url()).context['cl']
+        self.assertEqual([tweet.pk for tweet in [*first.result_list, *second.result_list]], expected)
+        self.assertIsNone(second.next_cursor)
+        self.assertEqual(self.client.get('/admin/core/tweet/?before=nesmysl').status_code, 302)
+
+
+class GraphTests(TestCase):
+    def setUp(self):
+        # seznamy sousedu v locmem cache by jinak prezily rollback predchozich testu
+        default_cache.clear()
+        self.users = {name: User.objects.create_user(name) for name in ('ada', 'bob', 'cyril', 'dana', 'eva')}
+
+    def follow(self, *pairs):
+        for follower, following in pairs:
+            Follow.objects.create(follower=self.users[follower], following=self.users[following])
+
+    def ids(self, *names):
+        return sorted(self.users[name].pk for name in names)
+
+    def test_cached_sorted_adjacency_and_invalidation(self):
+        ada, bob = self.users['ada'].pk, self.users['bob'].pk
+        self.follow(('ada', 'cyril'), ('ada', 'bob'))
+        self.assertEqual(list(graph.following(ada)), self.ids('bob', 'cyril'))
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(ada, bob))
+            self.assertFalse(graph.is_following(ada, self.users['eva'].pk))
+        self.assertEqual(list(graph.followers(bob)), self.ids('ada'))
+
+        toggles.toggle_follow(ada, bob)
+        self.assertFalse(graph.is_following(ada, bob))
+        self.assertEqual(list(graph.followers(bob)), [])
+        batch.set_follows(ada, follow=['bob', 'dana'], unfollow=['cyril'])
+        self.assertEqual(list(graph.following(ada)), self.ids('bob', 'dana'))
+        Follow.objects.filter(follower_id=ada, following_id=bob).delete()
+        self.assertEqual(list(graph.following(ada)), self.ids('dana'))
+
+    def test_follow_is_seen_by_other_worker(self):
+        ada, bob = self.users['ada'].pk, self.users['bob'].pk
+        with two_workers('default') as (first, second):
+            with mock.patch.object(graph, 'cache', second):
+                self.assertFalse(graph.is_following(ada, bob))
+            with mock.patch.object(graph, 'cache', first):
+                toggles.toggle_follow(ada, bob)
+            with mock.patch.object(graph, 'cache', second), self.assertNumQueries(1):
+                self.assertTrue(graph.is_following(ada, bob))
+
+    def test_production_caches_are_shared(self):
+        from y import settings_production
+        for alias, config in settings_production.CACHES.items():
+            self.assertNotIn('locmem', config['BACKEND'], alias)
+
+    def test_mutuals_and_recommendations(self):
+        self.follow(('ada', 'bob'), ('ada', 'cyril'), ('bob', 'dana'), ('bob', 'eva'), ('cyril', 'dana'), ('cyril', 'ada'))
+        ada = self.users['ada'].pk
+        self.assertEqual(graph.mutual_follows(ada), self.ids('cyril'))
+        self.assertEqual(graph.recommendations(ada), [(self.users['dana'].pk, 2), (self.users['eva'].pk, 1)])
+
+        self.client.force_login(self.users['ada'])
+        response = self.client.get('/api/users/me/recommendations?limit=1')
+        self.assertEqual(response.json(), [{'user': response.json()[0]['user'], 'followed_by_count': 2}])
+        self.assertEqual(response.json()[0]['user']['username'], 'dana')
+
+    def test_profile_and_timeline_use_graph(self):
+        self.follow(('bob', 'ada'), ('ada', 'cyril'))
+        self.client.force_login(self.users['ada'])
+        response = self.client.get('/profile/@bob/')
+        self.assertFalse(response.context['is_following'])
+        self.assertTrue(response.context['follows_you'])
+        self.assertContains(response, 'Sleduje vás')
+
+        tweet = Tweet.objects.create(author=self.users['cyril'], content='celebrita')
+        TimelineEntry.objects.filter(tweet=tweet).delete()
+        with self.settings(TIMELINE_CELEBRITY_THRESHOLD=1):
+            self.assertIn(tweet, timeline.home_timeline(self.users['ada']))
+        self.assertNotIn(tweet, timeline.home_timeline(self.users['ada']))
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('autor')
+        self.fans = [User.objects.create_user(f'fanousek{i}') for i in range(2)]
+        self.tweet = Tweet.objects.create(author=self.author, content='oznameni')
+
+    def test_unread_count_is_shared_between_workers(self):
+        with two_workers('default') as (first, second):
+            with mock.patch.object(notifications, 'cache', second):
+                self.assertEqual(notifications.unread_count(self.author.pk), 0)
+            with mock.patch.object(notifications, 'cache', first):
+                notifications.write([(self.author.pk, self.fans[0].pk, 'like', self.tweet.pk, None)])
+            with mock.patch.object(notifications, 'cache', second):
+                self.assertEqual(notifications.unread_count(self.author.pk), 1)
+
+    def like(self, fan):
+        return (self.author.pk, fan.pk, 'like', self.tweet.pk, None)
+
+    def test_likes_in_window_coalesce(self):
+        notifications.write([self.like(self.fans[0])])
+        notifications.write([self.like(self.fans[1])])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.sender, self.fans[1])
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get('/notifications/'), 'a 1 další')
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_repeated_events_of_one_actor_count_once(self):
+        fan = self.fans[0]
+        for _ in range(3):
+            toggles.toggle_like(fan.pk, tweet_id=self.tweet.pk)
+            toggles.toggle_follow(fan.pk, self.author.pk)
+        notifications.write([self.like(fan), self.like(fan)])
+        self.assertEqual(
+            sorted(Notification.objects.values_list('notification_type', 'actor_count')),
+            [('follow', 1), ('like', 1)],
+        )
+        # jiny odesilatel mezi tim: A, B, A ve stejne davce jsou dva ruzni
+        notifications.write([self.like(self.fans[1]), self.like(fan)])
+        self.assertEqual(Notification.objects.get(notification_type='like').actor_count, 2)
+
+    def test_alternating_actors_in_separate_writes_count_once(self):
+        first, second = self.fans[:2]
+        for fan in (first, second, first, second, first):
+            notifications.write([self.like(fan)])
+        notification = Notification.objects.get()
+        self.assertEqual((notification.actor_count, notification.sender), (2, first))
+        self.assertEqual(sorted(notification.actors.values_list('user_id', flat=True)), [first.pk, second.pk])
+
+
+@override_settings(TASKS_ALWAYS_EAGER=False)
+class TrendingTests(TestCase):
+    def test_refresh_is_read_only_and_pruning_is_queued(self):
+        hashtag = Hashtag.objects.create(name='stary')
+        HashtagBucket.objects.create(hashtag=hashtag, bucket_start=timezone.now() - trending.window() - timedelta(hours=1), count=3)
+        with CaptureQueriesContext(connection) as queries:
+            trending.refresh()
+        self.assertEqual([query['sql'] for query in queries if not query['sql'].startswith('SELECT')], [])
+        self.assertEqual(HashtagBucket.objects.count(), 1)
+
+        # zapisy trendu zaradi uklid jen jednou za okno
+        trending.record([(hashtag.pk, timezone.now())])
+        trending.record([(hashtag.pk, timezone.now())])
+        self.assertEqual(Task.objects.filter(name='trending.prune').count(), 1)
+        tasks.run_pending()
+        self.assertEqual(list(HashtagBucket.objects.values_list('count', flat=True)), [2])
+
+
+class FragmentCacheTests(TestCase):
+    def test_invalidation_is_shared_between_workers(self):
+        dependencies = [('tweet', 1), ('profile', 2)]
+        with two_workers('fragments') as (first, second):
+            with mock.patch.object(fragment_store, 'fragment_cache', lambda: second):
+                key = fragment_store.fragment_key('tweet_card', dependencies)
+                fragment_store.set_fragment(key, 'stara karta')
+            with mock.patch.object(fragment_store, 'fragment_cache', lambda: first):
+                fragment_store.invalidate('profile', 2)
+            with mock.patch.object(fragment_store, 'fragment_cache', lambda: second):
+                new_key = fragment_store.fragment_key('tweet_card', dependencies)
+                self.assertNotEqual(new_key, key)
+                self.assertIsNone(fragment_store.get_fragment(new_key))
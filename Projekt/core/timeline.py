@@ -0,0 +1,229 @@
+from array import array
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from .models import Profile, Tweet, Follow, TimelineEntry
+from . import graph
+
+# Kolik tweetu se zapisuje najednou pri fan-outu
+FAN_OUT_BATCH_SIZE = 1000
+# Jak dlouho se drzi seznam celebrit; kdo prave prekrocil hranici, ma tweety
+# v cizich timeline nejvys o tuto dobu pozdeji
+CELEBRITIES_TIMEOUT = 60
+
+
+def max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+def celebrity_threshold():
+    return getattr(settings, 'TIMELINE_CELEBRITY_THRESHOLD', 10000)
+
+
+def is_celebrity(user_id):
+    """
+    Uživatelé s velkým počtem sledujících se do timeline nezapisují,
+    jejich tweety se přimíchávají až při čtení.
+    """
+    return Profile.objects.filter(user_id=user_id, followers_count__gte=celebrity_threshold()).exists()
+
+
+def celebrity_ids():
+    """
+    Dotaz na ID uživatelů nad hranicí pro fan-out, seřazená.
+    """
+    return Profile.objects.filter(followers_count__gte=celebrity_threshold()).order_by('user_id').values_list('user_id', flat=True)
+
+
+def celebrities():
+    """
+    Seřazené ID všech uživatelů nad hranicí pro fan-out (krátce v cache, je jich málo).
+    """
+    key = f'timeline:celebrities:{celebrity_threshold()}'
+    data = cache.get(key)
+    if data is None:
+        ids = array('q', celebrity_ids())
+        cache.set(key, ids.tobytes(), CELEBRITIES_TIMEOUT)
+        return ids
+    ids = array('q')
+    ids.frombytes(data)
+    return ids
+
+
+def celebrity_followees(user_id):
+    """
+    Vrátí ID sledovaných uživatelů, kteří jsou nad hranicí pro fan-out.
+
+    Průnik sledovaných z core.graph se seznamem celebrit, bez dotazu do databáze.
+    """
+    return graph.intersection(graph.following(user_id), celebrities())
+
+
+def trim(user_ids):
+    """
+    Ořízne timeline zadaných uživatelů na TIMELINE_MAX_LENGTH nejnovějších položek.
+    """
+    overflow = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=F('user_id'),
+            order_by=F('created_at').desc(),
+        ))
+        .filter(position__gt=max_length())
+        .values_list('pk', flat=True)
+    )
+    ids = list(overflow)
+    # po hromadnem importu muze byt radku k smazani vic, nez SQLite dovoli parametru v jednom dotazu
+    for i in range(0, len(ids), FAN_OUT_BATCH_SIZE):
+        TimelineEntry.objects.filter(pk__in=ids[i:i + FAN_OUT_BATCH_SIZE]).delete()
+
+
+def add_own(tweet):
+    """
+    Zapíše tweet hned do timeline autora, aby ho viděl ještě před doběhnutím fan-outu.
+    """
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=tweet.author_id, tweet=tweet, created_at=tweet.created_at)], ignore_conflicts=True,
+    )
+
+
+def fan_out(tweet):
+    """
+    Zapíše nový tweet do timeline autora a všech jeho sledujících.
+    """
+    recipients = [tweet.author_id]
+    if not is_celebrity(tweet.author_id):
+        recipients += list(
+            Follow.objects.filter(following_id=tweet.author_id).values_list('follower_id', flat=True)
+        )
+
+    for i in range(0, len(recipients), FAN_OUT_BATCH_SIZE):
+        batch = recipients[i:i + FAN_OUT_BATCH_SIZE]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, tweet=tweet, created_at=tweet.created_at) for user_id in batch],
+            ignore_conflicts=True,
+        )
+        trim(batch)
+
+
+def backfill(follower_id, following_id):
+    """
+    Po začátku sledování doplní do timeline poslední tweety sledovaného uživatele.
+    """
+    if is_celebrity(following_id):
+        return
+    tweets = Tweet.objects.filter(author_id=following_id).order_by('-created_at').values_list('pk', 'created_at')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=follower_id, tweet_id=pk, created_at=created_at)
+            for pk, created_at in tweets[:max_length()]
+        ],
+        ignore_conflicts=True,
+    )
+    trim([follower_id])
+
+
+def evict(follower_id, following_id):
+    """
+    Po zrušení sledování odstraní tweety sledovaného uživatele z timeline.
+    """
+    evict_many(follower_id, [following_id])
+
+
+def evict_many(follower_id, following_ids):
+    TimelineEntry.objects.filter(user_id=follower_id, tweet__author_id__in=following_ids).delete()
+
+
+class BulkFanOut:
+    """
+    Fan-out dávek tweetů pro hromadný import, jeden INSERT ... SELECT na dávku.
+
+    Na začátku se do dočasné tabulky uloží čas nejstarší ponechané položky
+    každé plné timeline. Starší tweety by trim() hned smazal, takže se do ní
+    vůbec nezapisují (u historických importů je to většina zápisů).
+    Při ukončení se ořežou timeline všech příjemců.
+
+        with timeline.BulkFanOut() as fan_out:
+            fan_out.add(tweet_ids)
+    """
+    cutoff_table = 'timeline_import_cutoff'
+    trim_batch_size = 500
+
+    def __enter__(self):
+        self.recipients = set()
+        entry = connection.ops.quote_name(TimelineEntry._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.cutoff_table}')
+            cursor.execute(
+                f"""
+                CREATE TEMPORARY TABLE {self.cutoff_table} AS
+                SELECT filled.user_id, (
+                    SELECT e.created_at FROM {entry} e WHERE e.user_id = filled.user_id
+                    ORDER BY e.created_at DESC LIMIT 1 OFFSET %s
+                ) AS created_at
+                FROM (SELECT user_id FROM {entry} GROUP BY user_id HAVING COUNT(*) >= %s) filled
+                """,
+                [max_length() - 1, max_length()],
+            )
+            cursor.execute(f'CREATE INDEX {self.cutoff_table}_user ON {self.cutoff_table} (user_id)')
+        return self
+
+    def add(self, tweet_ids):
+        if not tweet_ids:
+            return
+        qn = connection.ops.quote_name
+        entry, follow, profile, tweet = (qn(model._meta.db_table) for model in (TimelineEntry, Follow, Profile, Tweet))
+        ids = ', '.join(['%s'] * len(tweet_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {entry} (user_id, tweet_id, created_at)
+                SELECT source.user_id, t.id, t.created_at
+                FROM (
+                    SELECT f.follower_id AS user_id, t.id AS tweet_id
+                    FROM {tweet} t
+                    JOIN {profile} p ON p.user_id = t.author_id
+                    JOIN {follow} f ON f.following_id = t.author_id
+                    WHERE t.id IN ({ids}) AND p.followers_count < %s
+                    UNION ALL
+                    SELECT author_id, id FROM {tweet} WHERE id IN ({ids})
+                ) source
+                JOIN {tweet} t ON t.id = source.tweet_id
+                LEFT JOIN {self.cutoff_table} c ON c.user_id = source.user_id
+                WHERE c.created_at IS NULL OR t.created_at > c.created_at
+                ON CONFLICT DO NOTHING
+                """,
+                [*tweet_ids, celebrity_threshold(), *tweet_ids],
+            )
+        authors = set(Tweet.objects.filter(pk__in=tweet_ids).values_list('author_id', flat=True))
+        self.recipients |= authors
+        self.recipients.update(
+            Follow.objects.filter(
+                following_id__in=authors, following__profile__followers_count__lt=celebrity_threshold(),
+            ).values_list('follower_id', flat=True)
+        )
+
+    def __exit__(self, *exc_info):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.cutoff_table}')
+        if exc_info[0] is None:
+            recipients = sorted(self.recipients)
+            for i in range(0, len(recipients), self.trim_batch_size):
+                trim(recipients[i:i + self.trim_batch_size])
+
+
+def home_timeline(user):
+    """
+    Vrátí queryset tweetů domovské timeline uživatele.
+
+    Předpočítané položky se spojí s tweety sledovaných celebrit (merge on read).
+    """
+    entries = TimelineEntry.objects.filter(user=user).values('tweet_id')
+    condition = Q(pk__in=entries)
+    celebrities = celebrity_followees(user.pk)
+    if celebrities:
+        condition |= Q(author_id__in=celebrities)
+    return Tweet.objects.filter(condition).order_by('-created_at')
@@ -0,0 +1,112 @@
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from .models import Profile, Tweet, Comment, Like, Follow
+
+
+def _table(cursor, model):
+    return cursor.db.ops.quote_name(model._meta.db_table)
+
+
+def _where(cursor, lookup):
+    return ' AND '.join(f'{cursor.db.ops.quote_name(column)} = %s' for column in lookup)
+
+
+def _remove(cursor, model, **lookup):
+    """
+    Smaže řádek podle unikátní dvojice jedním DELETE ... RETURNING, vrátí jeho id nebo None.
+    """
+    cursor.execute(f'DELETE FROM {_table(cursor, model)} WHERE {_where(cursor, lookup)} RETURNING id', list(lookup.values()))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _insert(cursor, model, **values):
+    """
+    Vloží řádek, pokud ho mezitím nevložil souběžný request. Vrátí id nového řádku nebo None.
+    """
+    qn = cursor.db.ops.quote_name
+    values['created_at'] = cursor.db.ops.adapt_datetimefield_value(timezone.now())
+    columns = ', '.join(qn(column) for column in values)
+    placeholders = ', '.join(['%s'] * len(values))
+    cursor.execute(
+        f'INSERT INTO {_table(cursor, model)} ({columns}) VALUES ({placeholders}) ON CONFLICT DO NOTHING RETURNING id',
+        list(values.values()),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _add(cursor, model, field, delta, **lookup):
+    """
+    Přičte `delta` k čítači a vrátí jeho novou hodnotu (UPDATE ... RETURNING).
+    """
+    column = cursor.db.ops.quote_name(field)
+    cursor.execute(
+        f'UPDATE {_table(cursor, model)} SET {column} = {column} + %s WHERE {_where(cursor, lookup)} RETURNING {column}',
+        [delta, *lookup.values()],
+    )
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _read(cursor, model, field, **lookup):
+    column = cursor.db.ops.quote_name(field)
+    cursor.execute(f'SELECT {column} FROM {_table(cursor, model)} WHERE {_where(cursor, lookup)}', list(lookup.values()))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _toggle(model, pair, counters):
+    """
+    Přepne existenci řádku `model` s unikátní dvojicí `pair` ({sloupec: hodnota}).
+
+    Nejdřív DELETE ... RETURNING; když nic nesmazal, INSERT ... ON CONFLICT DO NOTHING.
+    Souběžné požadavky tak nikdy neskončí IntegrityError: když INSERT prohraje
+    se souběžným vložením, výsledkem je stejný stav a čítače se nemění.
+    `counters` je [(model, pole, {sloupec: hodnota})], první z nich se vrací.
+    Signály post_save/post_delete se pošlou s counted=True (čítače jsou už upravené).
+    """
+    alias = router.db_for_write(model)
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        pk = _remove(cursor, model, **pair)
+        created = False
+        if pk is None:
+            pk = _insert(cursor, model, **pair)
+            created = pk is not None
+            if pk is None:
+                # soubezny request radek prave vlozil, stav je "existuje"
+                counter_model, field, lookup = counters[0]
+                return True, _read(cursor, counter_model, field, **lookup)
+        delta = 1 if created else -1
+        values = [_add(cursor, counter_model, field, delta, **lookup) for counter_model, field, lookup in counters]
+
+        instance = model(pk=pk, **pair)
+        if created:
+            post_save.send(model, instance=instance, created=True, update_fields=None, raw=False, using=alias, counted=True)
+        else:
+            post_delete.send(model, instance=instance, origin=instance, using=alias, counted=True)
+    return created, values[0]
+
+
+def toggle_like(user_id, tweet_id=None, comment_id=None):
+    """
+    Přidá nebo odebere lajk tweetu nebo komentáře. Vrací (lajknuto, nový počet lajků).
+    """
+    if tweet_id is not None:
+        return _toggle(Like, {'user_id': user_id, 'tweet_id': tweet_id}, [(Tweet, 'likes_count', {'id': tweet_id})])
+    return _toggle(Like, {'user_id': user_id, 'comment_id': comment_id}, [(Comment, 'likes_count', {'id': comment_id})])
+
+
+def toggle_follow(follower_id, following_id):
+    """
+    Začne nebo přestane sledovat uživatele. Vrací (sleduje, nový počet sledujících).
+    """
+    return _toggle(
+        Follow,
+        {'follower_id': follower_id, 'following_id': following_id},
+        [
+            (Profile, 'followers_count', {'user_id': following_id}),
+            (Profile, 'following_count', {'user_id': follower_id}),
+        ],
+    )
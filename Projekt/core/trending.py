@@ -0,0 +1,159 @@
+import heapq
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from .models import Hashtag, HashtagBucket
+from .counters import increment
+from . import tasks
+
+
+def bucket_seconds():
+    return getattr(settings, 'TRENDING_BUCKET_SECONDS', 3600)
+
+
+def half_life():
+    return getattr(settings, 'TRENDING_HALF_LIFE_SECONDS', 6 * 3600)
+
+
+def window():
+    return timedelta(seconds=getattr(settings, 'TRENDING_WINDOW_SECONDS', 48 * 3600))
+
+
+def top_k():
+    return getattr(settings, 'TRENDING_TOP_K', 10)
+
+
+def refresh_interval():
+    return getattr(settings, 'TRENDING_REFRESH_SECONDS', 60)
+
+
+def bucket_start(moment):
+    """
+    Zaokrouhlí čas dolů na začátek jeho okna.
+    """
+    seconds = bucket_seconds()
+    timestamp = int(moment.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+
+def record(uses, delta=1):
+    """
+    Přičte (nebo při delta=-1 odečte) použití hashtagů v jejich oknech.
+
+    `uses` jsou dvojice (hashtag_id, čas tweetu). Použití starší než okno
+    trendů se ignorují. Jeden INSERT chybějících oken a jeden UPDATE
+    na každou kombinaci okna a přírůstku.
+    """
+    cutoff = timezone.now() - window()
+    counts = Counter((hashtag_id, bucket_start(created_at)) for hashtag_id, created_at in uses if created_at >= cutoff)
+    if not counts:
+        return
+    if delta > 0:
+        HashtagBucket.objects.bulk_create(
+            [HashtagBucket(hashtag_id=hashtag_id, bucket_start=start) for hashtag_id, start in counts],
+            ignore_conflicts=True,
+        )
+        # stara okna maze uloha na pozadi, nejvys jednou za okno (cteni zebricku nezapisuje)
+        tasks.enqueue('trending.prune', key=f'trending.prune:{bucket_start(timezone.now()).isoformat()}')
+    groups = defaultdict(list)
+    for (hashtag_id, start), n in counts.items():
+        groups[start, n].append(hashtag_id)
+    for (start, n), hashtag_ids in groups.items():
+        buckets = HashtagBucket.objects.filter(bucket_start=start, hashtag_id__in=hashtag_ids)
+        if delta < 0:
+            buckets = buckets.filter(count__gte=n)
+        increment(buckets, 'count', n * delta)
+
+
+def forget(tweet):
+    """
+    Odečte hashtagy mazaného tweetu z jeho okna.
+    """
+    if tweet.created_at < timezone.now() - window():
+        return
+    hashtag_ids = Hashtag.objects.filter(tweets=tweet).values_list('pk', flat=True)
+    record(((pk, tweet.created_at) for pk in hashtag_ids), delta=-1)
+
+
+def prune(now=None):
+    """
+    Smaže okna, která už do skóre nepatří (úloha trending.prune).
+    """
+    now = now or timezone.now()
+    return HashtagBucket.objects.filter(bucket_start__lt=now - window()).delete()[0]
+
+
+def scores(now=None):
+    """
+    Vrátí exponenciálně utlumené skóre hashtagů: součet počtů v oknech
+    vážený 2^(-stáří / poločas).
+    """
+    now = now or timezone.now()
+    decay = math.log(2) / half_life()
+    totals = defaultdict(float)
+    buckets = HashtagBucket.objects.filter(bucket_start__gte=now - window()).values_list(
+        'hashtag_id', 'bucket_start', 'count'
+    )
+    for hashtag_id, start, count in buckets.iterator(chunk_size=5000):
+        age = max((now - start).total_seconds(), 0)
+        totals[hashtag_id] += count * math.exp(-decay * age)
+    return totals
+
+
+# Predpocitany zebricek v pameti procesu, obnovuje se po TRENDING_REFRESH_SECONDS
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_top = []
+_expires_at = 0.0
+
+
+def refresh():
+    """
+    Přepočítá žebříček trendů a uloží ho do paměti.
+
+    Jen čte, volá se z GET requestů. Stará okna se nepočítají díky filtru
+    ve scores(), mazání obstarává prune().
+    """
+    global _top, _expires_at
+    now = timezone.now()
+    best = heapq.nlargest(top_k(), scores(now).items(), key=lambda item: (item[1], item[0]))
+    hashtags = Hashtag.objects.in_bulk([hashtag_id for hashtag_id, _ in best])
+    ranked = []
+    for hashtag_id, score in best:
+        hashtag = hashtags.get(hashtag_id)
+        if hashtag is not None and score > 0:
+            hashtag.score = score
+            ranked.append(hashtag)
+    with _lock:
+        _top = ranked
+        _expires_at = time.monotonic() + refresh_interval()
+    return ranked
+
+
+def top(limit=None):
+    """
+    Vrátí trendující hashtagy (s atributem score) z předpočítaného žebříčku.
+
+    Zastaralý žebříček přepočítá jen jedno vlákno, ostatní zatím dostanou starý.
+    """
+    with _lock:
+        ranked, fresh = _top, time.monotonic() < _expires_at
+    if not fresh and _refresh_lock.acquire(blocking=not ranked):
+        try:
+            ranked = refresh()
+        finally:
+            _refresh_lock.release()
+    return ranked[:limit] if limit else ranked
+
+
+def invalidate():
+    """
+    Vynutí přepočet žebříčku při příštím čtení.
+    """
+    global _expires_at
+    with _lock:
+        _expires_at = 0.0
@@ -33,4 +33,7 @@ urlpatterns = [
     
     # Notifikace
     path('notifications/', views.notifications, name='notifications'),
+
+    # Zmensene obrazky bez predgenerovanych variant
+    path('img/<str:kind>/<int:width>/<path:name>', views.resized_image, name='resized_image'),
 ]
\ No newline at end of file
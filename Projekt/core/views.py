@@ -2,10 +2,57 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Count, Q
-from .models import Profile, Tweet, Hashtag, Comment, Like, Follow, Notification
+from django.core.exceptions import BadRequest
+from django.http import Http404
+from django.views.decorators.http import require_safe
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+from .models import Tweet, Hashtag, Comment
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm, TweetForm, CommentForm, SearchForm
+from . import timeline as timeline_store
+from . import search as search_index
+from . import trending
+from . import images
+from . import media
+from . import toggles
+from . import graph
+from . import notifications as notification_store
+from .pagination import keyset_page, InvalidCursor, DEFAULT_LIMIT, MAX_LIMIT
+
+def paginate_tweets(request, tweets):
+    """
+    Vrátí jednu stránku tweetů podle ?before= a ?limit= a odkazy na další stránku.
+    """
+    tweets = tweets.for_display().with_liked_by(request.user)
+    try:
+        page, next_cursor = keyset_page(tweets, request.GET.get('before'), request.GET.get('limit', DEFAULT_LIMIT))
+    except InvalidCursor:
+        raise BadRequest('Neplatný kurzor.')
+
+    context = {'tweets': page, 'next_url': None, 'next_fragment_url': None}
+    if next_cursor:
+        context.update(next_page_urls(request, before=next_cursor))
+    return context
+
+def next_page_urls(request, **params):
+    """
+    Odkaz na další stránku (celá stránka i fragment pro "načíst další").
+    """
+    query = request.GET.copy()
+    query.pop('fragment', None)
+    query.update(params)
+    next_url = f'{request.path}?{query.urlencode()}'
+    query['fragment'] = '1'
+    return {'next_url': next_url, 'next_fragment_url': f'{request.path}?{query.urlencode()}'}
+
+def render_tweets(request, template, context, tweets):
+    """
+    Vykreslí stránku se seznamem tweetů, s ?fragment=1 jen samotný seznam pro "načíst další".
+    """
+    context.update(paginate_tweets(request, tweets))
+    if request.GET.get('fragment'):
+        return render(request, 'core/tweet_list.html', context)
+    return render(request, template, context)
 
 def register(request):
     """
@@ -27,15 +74,8 @@ def timeline(request):
     """
     Hlavní timeline - zobrazuje tweety přihlášeného uživatele a uživatelů, které sleduje.
     """
-    # Získat ID uživatelů, které aktuální uživatel sleduje
-    following_users = request.user.following.values_list('following', flat=True)
-    
-    # Přidat ID aktuálního uživatele
-    user_ids = list(following_users)
-    user_ids.append(request.user.id)
-    
-    # Získat tweety pro timeline
-    tweets = Tweet.objects.filter(author__id__in=user_ids).order_by('-created_at')
+    # Předpočítaná timeline (fan-out on write) + tweety sledovaných celebrit
+    tweets = timeline_store.home_timeline(request.user)
     
     # Formulář pro nový tweet
     if request.method == 'POST':
@@ -52,41 +92,34 @@ def timeline(request):
         form = TweetForm()
     
     context = {
-        'tweets': tweets,
         'form': form,
+        'hashtags': trending.top(),
     }
-    return render(request, 'core/timeline.html', context)
+    return render_tweets(request, 'core/timeline.html', context, tweets)
 
 @login_required
 def profile(request, username):
     """
     Zobrazení profilu uživatele.
     """
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(User.objects.select_related('profile'), username=username)
     tweets = user.tweets.order_by('-created_at')
     
-    # Kontrola, zda přihlášený uživatel sleduje zobrazovaného uživatele
-    is_following = False
-    if request.user.is_authenticated:
-        is_following = request.user.following.filter(following=user).exists()
-    
+    # Vzajemne sledovani z core.graph (serazena pole v cache, bez dotazu)
     context = {
         'profile_user': user,
-        'tweets': tweets,
-        'is_following': is_following
+        'is_following': graph.is_following(request.user.pk, user.pk),
+        'follows_you': graph.is_following(user.pk, request.user.pk),
     }
-    return render(request, 'core/profile.html', context)
+    return render_tweets(request, 'core/profile.html', context, tweets)
 
 @login_required
 def tweet_detail(request, pk):
     """
     Detail tweetu se všemi komentáři.
     """
-    tweet = get_object_or_404(Tweet, pk=pk)
-    comments = tweet.comments.all().order_by('created_at')
-    
-    # Kontrola, zda přihlášený uživatel dal like tomuto tweetu
-    user_liked = tweet.likes.filter(user=request.user).exists() if request.user.is_authenticated else False
+    tweet = get_object_or_404(Tweet.objects.for_display().with_liked_by(request.user), pk=pk)
+    comments = tweet.comments.for_display().with_liked_by(request.user).order_by('created_at')
     
     # Formulář pro nový komentář
     if request.method == 'POST':
@@ -95,18 +128,9 @@ def tweet_detail(request, pk):
             comment = form.save(commit=False)
             comment.author = request.user
             comment.tweet = tweet
+            # Notifikaci pro autora tweetu vytvoří signál
             comment.save()
             
-            # Vytvoření notifikace pro autora tweetu (pokud není přihlášený uživatel)
-            if tweet.author != request.user:
-                Notification.objects.create(
-                    recipient=tweet.author,
-                    sender=request.user,
-                    notification_type='comment',
-                    tweet=tweet,
-                    comment=comment
-                )
-            
             messages.success(request, 'Váš komentář byl přidán!')
             return redirect('tweet_detail', pk=tweet.pk)
     else:
@@ -116,7 +140,6 @@ def tweet_detail(request, pk):
         'tweet': tweet,
         'comments': comments,
         'form': form,
-        'user_liked': user_liked
     }
     return render(request, 'core/tweet_detail.html', context)
 
@@ -176,16 +199,11 @@ def follow_toggle(request, username):
         messages.warning(request, 'Nemůžete sledovat sami sebe!')
         return redirect('profile', username=username)
     
-    follow_obj = Follow.objects.filter(follower=request.user, following=user_to_follow).first()
-    
-    if follow_obj:
-        # Už sleduje - zrušit sledování
-        follow_obj.delete()
-        messages.info(request, f'Přestali jste sledovat {username}.')
-    else:
-        # Ještě nesleduje - začít sledovat
-        Follow.objects.create(follower=request.user, following=user_to_follow)
+    following, _ = toggles.toggle_follow(request.user.pk, user_to_follow.pk)
+    if following:
         messages.success(request, f'Nyní sledujete {username}!')
+    else:
+        messages.info(request, f'Přestali jste sledovat {username}.')
     
     return redirect('profile', username=username)
 
@@ -203,22 +221,11 @@ def like_toggle(request, pk, content_type):
         return redirect(request.META.get('HTTP_REFERER', 'timeline'))
     
     if content_type == 'tweet':
-        obj = get_object_or_404(Tweet, pk=pk)
-        like = Like.objects.filter(user=request.user, tweet=obj).first()
+        get_object_or_404(Tweet.objects.only('pk'), pk=pk)
+        toggles.toggle_like(request.user.pk, tweet_id=pk)
     else:  # comment
-        obj = get_object_or_404(Comment, pk=pk)
-        like = Like.objects.filter(user=request.user, comment=obj).first()
-    
-    if like:
-        # Už má like - odebrat
-        like.delete()
-    else:
-        # Ještě nemá like - přidat
-        if content_type == 'tweet':
-            like = Like(user=request.user, tweet=obj)
-        else:
-            like = Like(user=request.user, comment=obj)
-        like.save()
+        get_object_or_404(Comment.objects.only('pk'), pk=pk)
+        toggles.toggle_like(request.user.pk, comment_id=pk)
     
     return redirect(request.META.get('HTTP_REFERER', 'timeline'))
 
@@ -228,6 +235,7 @@ def search(request):
     """
     results = []
     search_type = 'tweets'  # Výchozí typ vyhledávání
+    context = {}
     
     if request.method == 'GET' and 'query' in request.GET:
         form = SearchForm(request.GET)
@@ -235,28 +243,35 @@ def search(request):
             query = form.cleaned_data['query']
             search_type = form.cleaned_data['search_type']
             
+            # Fulltextový index (core.search), výsledky seřazené podle relevance
             if search_type == 'tweets':
-                results = Tweet.objects.filter(content__icontains=query).order_by('-created_at')
+                try:
+                    page = max(1, int(request.GET.get('page', 1)))
+                except ValueError:
+                    raise BadRequest('Neplatné číslo stránky.')
+                ids = search_index.search_ids('tweets', query, DEFAULT_LIMIT + 1, (page - 1) * DEFAULT_LIMIT)
+                if len(ids) > DEFAULT_LIMIT:
+                    context.update(next_page_urls(request, page=page + 1))
+                tweets = Tweet.objects.for_display().with_liked_by(request.user)
+                results = search_index.in_rank_order(tweets, ids[:DEFAULT_LIMIT])
+                context['tweets'] = results
             elif search_type == 'users':
-                results = User.objects.filter(
-                    Q(username__icontains=query) | 
-                    Q(profile__bio__icontains=query) |
-                    Q(profile__location__icontains=query)
-                )
+                ids = search_index.search_ids('users', query, MAX_LIMIT)
+                results = search_index.in_rank_order(User.objects.select_related('profile'), ids)
             elif search_type == 'hashtags':
-                # Odstranit # ze začátku, pokud existuje
-                if query.startswith('#'):
-                    query = query[1:]
-                results = Hashtag.objects.filter(name__icontains=query)
+                ids = search_index.search_ids('hashtags', query, MAX_LIMIT)
+                results = search_index.in_rank_order(Hashtag.objects.all(), ids)
     else:
         form = SearchForm()
     
-    context = {
+    context.update({
         'form': form,
         'results': results,
         'search_type': search_type,
         'query': request.GET.get('query', '')
-    }
+    })
+    if search_type == 'tweets' and request.GET.get('fragment'):
+        return render(request, 'core/tweet_list.html', context)
     return render(request, 'core/search_results.html', context)
 
 @login_required
@@ -269,27 +284,30 @@ def hashtag_tweets(request, name):
     
     context = {
         'hashtag': hashtag,
-        'tweets': tweets
     }
-    return render(request, 'core/hashtag_tweets.html', context)
+    return render_tweets(request, 'core/hashtag_tweets.html', context, tweets)
 
 @login_required
 def notifications(request):
     """
     Zobrazení notifikací pro přihlášeného uživatele.
     """
-    # Získání všech notifikací pro přihlášeného uživatele
-    notifications = request.user.notifications.order_by('-created_at')
-    
-    # Označení všech notifikací jako přečtené
-    unread_notifications = notifications.filter(is_read=False)
-    for notification in unread_notifications:
-        notification.is_read = True
-        notification.save()
-    
-    context = {
-        'notifications': notifications
-    }
+    # Historie po stránkách (keyset), odesílatel i jeho profil v jednom dotazu
+    history = request.user.notifications.select_related('sender__profile', 'comment')
+    try:
+        page, next_cursor = keyset_page(history, request.GET.get('before'), request.GET.get('limit', DEFAULT_LIMIT))
+    except InvalidCursor:
+        raise BadRequest('Neplatný kurzor.')
+
+    # Označení všech notifikací jako přečtené jedním UPDATE,
+    # načtená stránka si ponechá původní stav kvůli zvýraznění
+    notification_store.mark_all_read(request.user.pk)
+
+    context = {'notifications': page, 'next_url': None, 'next_fragment_url': None}
+    if next_cursor:
+        context.update(next_page_urls(request, before=next_cursor))
+    if request.GET.get('fragment'):
+        return render(request, 'core/notification_list.html', context)
     return render(request, 'core/notifications.html', context)
 
 @login_required
@@ -298,7 +316,7 @@ def following_list(request, username):
     Zobrazení seznamu sledovaných uživatelů.
     """
     user = get_object_or_404(User, username=username)
-    following = user.following.all().select_related('following').order_by('-created_at')
+    following = user.following.all().select_related('following__profile').order_by('-created_at')
     
     context = {
         'profile_user': user,
@@ -312,10 +330,32 @@ def followers_list(request, username):
     Zobrazení seznamu sledujících.
     """
     user = get_object_or_404(User, username=username)
-    followers = user.followers.all().select_related('follower').order_by('-created_at')
+    followers = user.followers.all().select_related('follower__profile').order_by('-created_at')
     
     context = {
         'profile_user': user,
         'followers': [follow.follower for follow in followers]
     }
-    return render(request, 'core/followers_list.html', context)
\ No newline at end of file
+    return render(request, 'core/followers_list.html', context)
+
+@require_safe
+def resized_image(request, kind, width, name):
+    """
+    Zmenšený obrázek pro soubory bez předgenerovaných variant (starší nahrávky, výchozí avatar).
+
+    Výsledek se drží v diskové cache, formát (WebP/JPEG) podle hlavičky Accept.
+    """
+    if kind not in images.KINDS or width not in images.allowed_widths(kind) or not images.is_source(name):
+        raise Http404
+    if not default_storage.exists(name):
+        raise Http404
+    fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    try:
+        path = images.resized(name, kind, width, fmt)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        # poskozeny soubor nebo obrazek s obrovskym rozlisenim se nezpracovava
+        raise Http404
+    # URL neobsahuje hash, kopie se proto overuje pres ETag
+    response = media.serve_file(request, path, name, content_type=images.FORMATS[fmt][1], immutable=False)
+    response['Vary'] = 'Accept'
+    return response
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # prvni, aby merila cely request vcetne ostatnich middleware
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +57,8 @@ ROOT_URLCONF = 'y.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, ktery meri cas vykreslovani pro core.metrics
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.unread_notifications',
             ],
         },
     },
@@ -78,10 +82,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 5,
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # vykreslene karty tweetu a hlavicky profilu (core.cache), LRU omezena poctem polozek
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+# Pri vice WSGI workerech sdilet fragmenty pres disk: Y_FRAGMENT_CACHE=file
+if os.environ.get('Y_FRAGMENT_CACHE') == 'file':
+    CACHES['fragments'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'fragments'),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'CULL_FREQUENCY': 4,
+        },
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -124,10 +163,80 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    # nahravky dostanou v nazvu hash obsahu a cachuji se navzdy (core.media)
+    'default': {'BACKEND': 'core.media.HashedMediaStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Odesilani medii webovym serverem (core.media.serve_file), napr. '/protected-media/'
+# pro nginx location s "internal; alias MEDIA_ROOT"
+MEDIA_X_ACCEL_REDIRECT_PREFIX = None
+MEDIA_X_SENDFILE = False
+
+
+# Obrazky (core.images): zmensene varianty nahravek a disk cache resize endpointu
+IMAGE_WEBP_QUALITY = 80
+IMAGE_JPEG_QUALITY = 82
+IMAGE_RESIZE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'cache', 'resized')
+
+
+# Metriky requestu (core.metrics), /metrics ve formatu Prometheus
+
+# Requesty pomalejsi nez tato doba se zaloguji i s SQL (nejvys METRICS_SLOW_QUERY_LOG_LIMIT dotazu)
+METRICS_SLOW_REQUEST_SECONDS = 0.5
+METRICS_SLOW_QUERY_LOG_LIMIT = 100
+# /metrics smi cist prihlaseny staff nebo scraper s hlavickou "Authorization: Bearer <METRICS_TOKEN>"
+# (bez tokenu jen staff)
+METRICS_TOKEN = os.environ.get('Y_METRICS_TOKEN')
+
 
 LOGIN_REDIRECT_URL = 'timeline'
 LOGIN_URL = 'login'
 
+
+# Timeline (fan-out on write)
+
+# Maximalni pocet predpocitanych polozek v timeline jednoho uzivatele
+TIMELINE_MAX_LENGTH = 800
+# Od kolika sledujicich se tweety nezapisuji, ale primichavaji pri cteni
+TIMELINE_CELEBRITY_THRESHOLD = 10000
+
+
+# Trendy hashtagu
+
+# Delka jednoho okna s pocty pouziti hashtagu
+TRENDING_BUCKET_SECONDS = 3600
+# Za jak dlouho klesne vaha pouziti na polovinu
+TRENDING_HALF_LIFE_SECONDS = 6 * 3600
+# Starsi okna se do skore nepocitaji a mazou se
+TRENDING_WINDOW_SECONDS = 48 * 3600
+# Kolik hashtagu drzi predpocitany zebricek a jak casto se obnovuje
+TRENDING_TOP_K = 10
+TRENDING_REFRESH_SECONDS = 60
+
+
+# Oznameni
+
+# Nove udalosti se slucuji do neprecteneho oznameni stejne skupiny mladsiho nez tato doba
+NOTIFICATION_COALESCE_SECONDS = 24 * 3600
+
+
+# Fronta uloh na pozadi (core.tasks), zpracovava ji manage.py run_workers
+
+# Ulohy se provadeji hned v requestu: pri DEBUG (runserver bez workeru) nebo s Y_TASKS_EAGER=1.
+# Y_TASKS_EAGER=0 zapne frontu i pri vyvoji, pak je nutne spustit manage.py run_workers,
+# jinak se nezapisou timeline sledujicich, hashtagy, oznameni, varianty obrazku ani importy.
+TASKS_ALWAYS_EAGER = os.environ.get('Y_TASKS_EAGER', '1' if DEBUG else '0') == '1'
+# Cekani pred n-tym opakovanim je zhruba TASKS_RETRY_BACKOFF_SECONDS * 2^(n-1)
+TASKS_RETRY_BACKOFF_SECONDS = 2
+# Uloha ve stavu running dele nez tato doba patri spadlemu workeru a spusti se znovu
+TASKS_LOCK_TIMEOUT_SECONDS = 300
+# Jak dlouho se drzi hotove ulohy (a tedy klice idempotence)
+TASKS_RETENTION_SECONDS = 24 * 3600
+# Kam POST /api/tweets/import odklada telo pro ulohu tweets.import (workery musi videt stejny adresar)
+API_IMPORT_SPOOL_DIR = os.environ.get('Y_IMPORT_SPOOL_DIR', os.path.join(BASE_DIR, 'imports'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,126 @@
+"""
+Produkční profil: DJANGO_SETTINGS_MODULE=y.settings_production
+
+Vychází z y.settings a ladí SQLite pro souběžný provoz (WAL, PRAGMA,
+trvalá spojení) a čtení přes samostatné read-only spojení.
+"""
+import os
+
+from .settings import *
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if host]
+
+
+# Database
+
+DATABASE_PATH = os.environ.get('Y_DATABASE_PATH', str(BASE_DIR / 'db.sqlite3'))
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_PATH,
+        # spojeni se drzi mezi requesty, pred pouzitim se overi
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # zapisujici transakce si zamek vezmou hned na zacatku, busy_timeout pak funguje
+            # (BEGIN DEFERRED by pri povyseni zamku skoncil "database is locked" bez cekani)
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
+    },
+    # stejny soubor, ale jen pro cteni (PRAGMA query_only) - ve WAL ctenari neblokuji zapisujiciho
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_PATH,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 5,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['core.db.ReadReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+
+# Nastavuje core.db.apply_sqlite_pragmas na kazdem novem spojeni
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    # zaporna hodnota je v KiB
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+# GET/HEAD requesty ctou pres replica spojeni (vcetne session a uzivatele)
+MIDDLEWARE = ['core.db.ReadOnlyRequestMiddleware', *MIDDLEWARE]
+
+
+# Cache sdilena vsemi workery. LocMemCache z y.settings ma kazdy proces vlastni,
+# invalidace (core.graph, pocty neprectenych, verze fragmentu) by se v ostatnich
+# workerech neprojevila az do vyprseni TTL. Vychozi je soubor na disku (jeden stroj,
+# stejne jako SQLite); Y_REDIS_URL=redis://... prepne obe cache na Redis (balicek redis).
+CACHE_DIR = os.environ.get('Y_CACHE_DIR', str(BASE_DIR / 'cache'))
+REDIS_URL = os.environ.get('Y_REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'y',
+        },
+        'fragments': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'y-fragments',
+            'TIMEOUT': 60 * 60,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'default'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+                'CULL_FREQUENCY': 4,
+            },
+        },
+        'fragments': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'fragments'),
+            'TIMEOUT': 60 * 60,
+            'OPTIONS': {
+                'MAX_ENTRIES': 50000,
+                'CULL_FREQUENCY': 4,
+            },
+        },
+    }
+
+
+# Ulohy na pozadi zpracovava manage.py run_workers, bez nej se nezapisou timeline
+# sledujicich, hashtagy, oznameni ani varianty obrazku
+TASKS_ALWAYS_EAGER = False
+
+
+# Staticke soubory s hashem obsahu v nazvu (manage.py collectstatic vytvori manifest),
+# webovy server je muze posilat s Cache-Control: immutable
+STORAGES = {
+    **STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+}
+
+# Media posila nginx (location /protected-media/ { internal; alias <MEDIA_ROOT>/; })
+MEDIA_X_ACCEL_REDIRECT_PREFIX = os.environ.get('Y_MEDIA_ACCEL_PREFIX', '/protected-media/') or None